@@ -0,0 +1,108 @@
+"""
+Sales analytics benchmark: fold a year of orders, then time the reports.
+
+Seeds a throwaway SQLite file with a year of orders spread over a catalog,
+times the first refresh_rollups() (folding every order), an incremental
+refresh after one more day of orders, and then each report the admin page
+builds for a 365-day range.
+
+Run from the project root:
+
+    python -m benchmarks.analytics_report --orders 50000 --products 200
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from website import create_app, db
+from website.bootstrap import bootstrap
+from website.models import User, Category, Product, Order, OrderItem
+from website.analytics import refresh_rollups, SalesReport, top_products, sales_by_category, orders_by_status
+
+STATUSES = ('pending', 'processing', 'shipped', 'delivered', 'cancelled')
+
+
+def seed_orders(count, product_ids, prices, user_id, first_day, days, start_id):
+    rng = random.Random(start_id)
+    orders = []
+    items = []
+    for order_id in range(start_id, start_id + count):
+        placed = first_day + timedelta(days=rng.randrange(days), seconds=rng.randrange(86400))
+        total = 0.0
+        for product_id in rng.sample(product_ids, rng.randint(1, 4)):
+            quantity = rng.randint(1, 3)
+            items.append({'order_id': order_id, 'product_id': product_id,
+                          'quantity': quantity, 'price': prices[product_id]})
+            total += quantity * prices[product_id]
+        orders.append({'id': order_id, 'order_number': f'BENCH-{order_id}', 'user_id': user_id,
+                       'total_amount': total, 'status': rng.choice(STATUSES),
+                       'shipping_address': 'x', 'billing_address': 'x', 'date_created': placed})
+    db.session.execute(insert(Order.__table__), orders)
+    db.session.execute(insert(OrderItem.__table__), items)
+    db.session.commit()
+
+
+def timed(label, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f'{label:<28} {(time.perf_counter() - start) * 1000:>9.1f} ms')
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--orders', type=int, default=50000)
+    parser.add_argument('--products', type=int, default=200)
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}'})
+        with app.app_context():
+            bootstrap()
+            categories = [category.id for category in Category.query.all()]
+            user = User.query.first()
+            products = [Product(name=f'Item {i}', slug=f'item-{i}', price=float(20 + i % 80),
+                                category_id=categories[i % len(categories)]) for i in range(args.products)]
+            db.session.add_all(products)
+            db.session.commit()
+            product_ids = [product.id for product in products]
+            prices = {product.id: product.price for product in products}
+
+            today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+            year_ago = today - timedelta(days=364)
+            timed(f'seed {args.orders} orders', lambda: seed_orders(
+                args.orders, product_ids, prices, user.id, year_ago, 364, 1))
+            timed('fold full history', refresh_rollups)
+            timed('fold one more day', lambda: (
+                seed_orders(args.orders // 365, product_ids, prices, user.id, today, 1, args.orders + 1),
+                refresh_rollups()))
+
+            end = today.date()
+            start = end - timedelta(days=364)
+            for group in ('day', 'week', 'month'):
+                report = timed(f'365-day series by {group}', lambda: SalesReport(start, end, group))
+            timed('top 10 products', lambda: top_products(start, end))
+            timed('sales by category', lambda: sales_by_category(start, end))
+            timed('orders by status', lambda: orders_by_status(start, end))
+
+            print(f'revenue=${report.total_revenue:,.2f} orders={report.total_orders} '
+                  f'units={report.total_units} aov=${report.average_order_value:.2f}')
+        return 0
+    finally:
+        # WAL mode leaves -wal/-shm files next to the database
+        for leftover in (path, path + '-wal', path + '-shm'):
+            if os.path.exists(leftover):
+                os.unlink(leftover)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+Checkout write-lock benchmark: how long each checkout holds SQLite's lock.
+
+SQLite takes its write lock at a transaction's first write statement and
+keeps it until COMMIT. This script hooks the engine to time that window
+(and count the statements run inside it) for carts of increasing size,
+against a throwaway SQLite file. With batched order items and a set-based
+cart delete the statement count should stay flat as carts grow.
+
+Run from the project root:
+
+    python -m benchmarks.checkout_lock_time --sizes 1 10 50 200 --runs 20
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import event
+
+from website import create_app, db
+from website.bootstrap import bootstrap
+from website.models import User, Category, Product, ProductVariant, CartItem
+from website.checkout import place_order
+
+WRITES = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class LockTimer:
+    """Times first-write-to-commit on every connection of an engine"""
+
+    def __init__(self, engine):
+        self.samples = []
+        event.listen(engine, 'before_cursor_execute', self._before_execute)
+        event.listen(engine, 'commit', self._commit)
+        event.listen(engine, 'rollback', self._rollback)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if 'lock_started' not in conn.info:
+            if not statement.lstrip().upper().startswith(WRITES):
+                return
+            conn.info['lock_started'] = time.perf_counter()
+            conn.info['lock_statements'] = 0
+        conn.info['lock_statements'] += 1
+
+    def _commit(self, conn):
+        started = conn.info.pop('lock_started', None)
+        statements = conn.info.pop('lock_statements', 0)
+        if started is not None:
+            self.samples.append((time.perf_counter() - started, statements))
+
+    def _rollback(self, conn):
+        conn.info.pop('lock_started', None)
+        conn.info.pop('lock_statements', None)
+
+
+def seed(app, size, runs):
+    """`runs` shoppers, each with `size` distinct lines (half with variants)"""
+    with app.app_context():
+        category = Category.query.first()
+        products = []
+        for i in range(size):
+            product = Product(name=f'Tee {i}', slug=f'tee-{i}', price=30.0 + i,
+                              inventory=runs * 10, category_id=category.id)
+            product.variants.append(ProductVariant(name='Size', value='XL', price_adjustment=5.0,
+                                                   inventory=runs * 10))
+            products.append(product)
+        db.session.add_all(products)
+        db.session.flush()
+
+        user_ids = []
+        for run in range(runs):
+            user = User(email=f'size{size}-shopper{run}@example.com', first_name='Shopper',
+                        last_name=str(run), password='not-a-real-hash')
+            db.session.add(user)
+            db.session.flush()
+            for i, product in enumerate(products):
+                variant_id = product.variants[0].id if i % 2 else None
+                db.session.add(CartItem(user_id=user.id, product_id=product.id,
+                                        variant_id=variant_id, quantity=2))
+            user_ids.append(user.id)
+        db.session.commit()
+        return user_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 50, 200])
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f'{"lines":>6} {"median ms":>10} {"p95 ms":>8} {"statements":>11}')
+    for size in args.sizes:
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        try:
+            app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}'})
+            with app.app_context():
+                bootstrap()
+            user_ids = seed(app, size, args.runs)
+            with app.app_context():
+                timer = LockTimer(db.engine)
+                for user_id in user_ids:
+                    place_order(user_id, '1 Test St', '1 Test St', 'credit_card')
+                    db.session.remove()
+
+            held = sorted(seconds * 1000 for seconds, _ in timer.samples)
+            statements = max(count for _, count in timer.samples)
+            p95 = held[min(len(held) - 1, int(len(held) * 0.95))]
+            print(f'{size:>6} {statistics.median(held):>10.2f} {p95:>8.2f} {statements:>11}')
+        finally:
+            # WAL mode leaves -wal/-shm files next to the database
+            for leftover in (path, path + '-wal', path + '-shm'):
+                if os.path.exists(leftover):
+                    os.unlink(leftover)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
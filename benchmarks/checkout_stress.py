@@ -0,0 +1,127 @@
+"""
+Concurrent checkout stress test: proves checkout never oversells.
+
+Hundreds of shoppers each hold the same limited-stock product in their
+cart and check out at once from a thread pool against a throwaway SQLite
+file. Afterwards the script checks that exactly as many orders succeeded
+as there was stock, that inventory never went negative, and that the
+losers' carts were left untouched.
+
+Run from the project root:
+
+    python -m benchmarks.checkout_stress --shoppers 300 --stock 120 --threads 48
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+
+from website import create_app, db
+from website.bootstrap import bootstrap
+from website.models import User, Category, Product, CartItem, Order, OrderItem
+from website.checkout import place_order, CheckoutError
+
+
+def seed(app, shoppers, stock):
+    with app.app_context():
+        category = Category.query.first()
+        product = Product(name='Drop Hoodie', slug='drop-hoodie', price=120.0,
+                          inventory=stock, category_id=category.id)
+        db.session.add(product)
+        db.session.flush()
+        user_ids = []
+        for i in range(shoppers):
+            user = User(email=f'shopper{i}@example.com', first_name='Shopper', last_name=str(i),
+                        password='not-a-real-hash')
+            db.session.add(user)
+            db.session.flush()
+            db.session.add(CartItem(user_id=user.id, product_id=product.id, quantity=1))
+            user_ids.append(user.id)
+        db.session.commit()
+        return product.id, user_ids
+
+
+def checkout(app, user_id):
+    with app.app_context():
+        try:
+            place_order(user_id, '1 Test St', '1 Test St', 'credit_card')
+            return 'ok'
+        except CheckoutError:
+            return 'sold_out'
+        except OperationalError:
+            return 'locked'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--shoppers', type=int, default=300)
+    parser.add_argument('--stock', type=int, default=120)
+    parser.add_argument('--threads', type=int, default=48)
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+            'SQLALCHEMY_ENGINE_OPTIONS': {
+                'pool_size': args.threads,
+                'max_overflow': 0,
+                'connect_args': {'timeout': 2},
+            },
+            'CHECKOUT_LOCK_RETRIES': 20,
+        })
+        with app.app_context():
+            bootstrap()
+        product_id, user_ids = seed(app, args.shoppers, args.stock)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            results = list(pool.map(lambda uid: checkout(app, uid), user_ids))
+        elapsed = time.perf_counter() - start
+
+        with app.app_context():
+            inventory = db.session.get(Product, product_id).inventory
+            sold = db.session.query(func.coalesce(func.sum(OrderItem.quantity), 0)).filter_by(
+                product_id=product_id).scalar()
+            orders = Order.query.count()
+            carts_left = CartItem.query.count()
+
+        ok = results.count('ok')
+        print(f'shoppers={args.shoppers} stock={args.stock} threads={args.threads}')
+        print(f'placed={ok} sold_out={results.count("sold_out")} lock_errors={results.count("locked")}')
+        print(f'orders={orders} units_sold={sold} inventory_left={inventory} carts_left={carts_left}')
+        print(f'elapsed={elapsed:.2f}s ({args.shoppers / elapsed:.0f} checkouts/s)')
+
+        problems = []
+        if inventory < 0:
+            problems.append('inventory went negative')
+        if sold != ok or orders != ok:
+            problems.append('orders do not match successful checkouts')
+        if sold + inventory != args.stock:
+            problems.append('units sold plus inventory left does not equal starting stock')
+        if ok != min(args.shoppers, args.stock) and not results.count('locked'):
+            problems.append('stock was left unsold while shoppers were turned away')
+        if carts_left != args.shoppers - ok:
+            problems.append('carts were cleared for failed checkouts')
+
+        if problems:
+            print('FAIL: ' + '; '.join(problems))
+            return 1
+        print('PASS: no oversell')
+        return 0
+    finally:
+        # WAL mode leaves -wal/-shm files next to the database
+        for leftover in (path, path + '-wal', path + '-shm'):
+            if os.path.exists(leftover):
+                os.unlink(leftover)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""
+Cold-start benchmark: how long a fresh worker process takes to serve.
+
+Each run starts a new interpreter against an already bootstrapped
+throwaway SQLite file and times importing the package, create_app() and
+the first request, and counts the SQL statements issued before that
+request. The `bootstrap` row also runs the bootstrap step in every process,
+which is what create_app() used to do on every boot.
+
+Run from the project root:
+
+    python -m benchmarks.cold_start --runs 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from website import create_app
+from website.bootstrap import bootstrap
+
+# Runs in each child process; prints one JSON line of timings
+CHILD = '''
+import json, sys, time
+start = time.perf_counter()
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+statements = []
+event.listen(Engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+import website
+imported = time.perf_counter()
+app = website.create_app()
+created = time.perf_counter()
+if sys.argv[1] == 'bootstrap':
+    from website.bootstrap import bootstrap
+    with app.app_context():
+        bootstrap(log=lambda message: None)
+booted = time.perf_counter()
+startup_statements = len(statements)
+status = app.test_client().get('/landing').status_code
+served = time.perf_counter()
+print(json.dumps({
+    'import': imported - start,
+    'create_app': created - imported,
+    'bootstrap': booted - created,
+    'first_request': served - booted,
+    'statements': startup_statements,
+    'status': status,
+}))
+'''
+
+STAGES = ('import', 'create_app', 'bootstrap', 'first_request')
+
+
+def run_child(mode, env):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', CHILD, mode], env=env, capture_output=True,
+                            text=True, check=True)
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings['process'] = time.perf_counter() - start
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        uri = f'sqlite:///{path}'
+        app = create_app({'SQLALCHEMY_DATABASE_URI': uri})
+        with app.app_context():
+            bootstrap(log=lambda message: None)
+        env = dict(os.environ, DATABASE_URL=uri)
+
+        print(f'median of {args.runs} runs, ms')
+        print(f'{"mode":<10} ' + ' '.join(f'{stage:>13}' for stage in STAGES + ('process',))
+              + f' {"statements":>10}')
+        for mode in ('lean', 'bootstrap'):
+            runs = [run_child(mode, env) for _ in range(args.runs)]
+            assert all(run['status'] == 200 for run in runs)
+            medians = [statistics.median(run[stage] for run in runs) * 1000 for stage in STAGES + ('process',)]
+            print(f'{mode:<10} ' + ' '.join(f'{value:>13.1f}' for value in medians)
+                  + f' {runs[0]["statements"]:>10}')
+    finally:
+        # WAL mode leaves -wal/-shm files next to the database
+        for leftover in (path, path + '-wal', path + '-shm'):
+            if os.path.exists(leftover):
+                os.unlink(leftover)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
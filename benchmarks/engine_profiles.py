@@ -0,0 +1,139 @@
+"""
+Engine profile benchmark: mixed read/write throughput per profile.
+
+For each profile in website.engine_profile.PROFILES, reader threads page
+through the catalog while writer threads add to carts and adjust stock,
+all against the same throwaway SQLite file for a fixed time. Reports
+operations per second, read latency and how many operations failed with
+`database is locked`.
+
+Run from the project root:
+
+    python -m benchmarks.engine_profiles --readers 8 --writers 4 --seconds 5
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import select, update, func
+from sqlalchemy.exc import OperationalError
+
+from website import create_app, db
+from website.bootstrap import bootstrap
+from website.models import User, Category, Product
+from website.cart import add_cart_item
+from website.engine_profile import PROFILES
+
+
+def seed(app, products, shoppers):
+    with app.app_context():
+        category = Category.query.first()
+        db.session.add_all([
+            Product(name=f'Tee {i}', slug=f'tee-{i}', price=30.0, inventory=1000000,
+                    description=f'Tee number {i}', category_id=category.id)
+            for i in range(products)
+        ])
+        users = [User(email=f'shopper{i}@example.com', first_name='Shopper', last_name=str(i),
+                      password='not-a-real-hash') for i in range(shoppers)]
+        db.session.add_all(users)
+        db.session.commit()
+        return [user.id for user in users]
+
+
+def reader(app, deadline, stats, products):
+    rng = random.Random()
+    with app.app_context():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                db.session.execute(
+                    select(Product).where(Product.is_active == True, Product.id > rng.randrange(products))
+                    .order_by(Product.id).limit(24)
+                ).all()
+                db.session.execute(select(func.count(Product.id))).scalar()
+                stats['read_latency'].append(time.perf_counter() - start)
+            except OperationalError:
+                stats['read_locked'] += 1
+            finally:
+                db.session.remove()
+
+
+def writer(app, deadline, stats, products, user_ids):
+    rng = random.Random()
+    with app.app_context():
+        while time.perf_counter() < deadline:
+            try:
+                if rng.random() < 0.5:
+                    add_cart_item(rng.choice(user_ids), rng.randrange(1, products + 1))
+                else:
+                    db.session.execute(update(Product).where(Product.id == rng.randrange(1, products + 1))
+                                       .values(inventory=Product.inventory - 1))
+                db.session.commit()
+                stats['writes'] += 1
+            except OperationalError:
+                db.session.rollback()
+                stats['write_locked'] += 1
+            finally:
+                db.session.remove()
+
+
+def run(profile, args):
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+            'DATABASE_PROFILE': profile,
+            'DATABASE_POOL_SIZE': args.readers + args.writers,
+            'DATABASE_MAX_OVERFLOW': 0,
+        })
+        with app.app_context():
+            bootstrap()
+        user_ids = seed(app, args.products, 200)
+        stats = {'read_latency': [], 'read_locked': 0, 'writes': 0, 'write_locked': 0}
+        deadline = time.perf_counter() + args.seconds
+        threads = [threading.Thread(target=reader, args=(app, deadline, stats, args.products))
+                   for _ in range(args.readers)]
+        threads += [threading.Thread(target=writer, args=(app, deadline, stats, args.products, user_ids))
+                    for _ in range(args.writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        latency = sorted(stats['read_latency'])
+        p95 = latency[int(len(latency) * 0.95)] * 1000 if latency else 0.0
+        median = statistics.median(latency) * 1000 if latency else 0.0
+        print(f'{profile:<11} {len(latency) / args.seconds:>9.0f} {stats["writes"] / args.seconds:>9.0f} '
+              f'{median:>9.2f} {p95:>9.2f} {stats["read_locked"]:>8} {stats["write_locked"]:>8}')
+    finally:
+        # WAL mode leaves -wal/-shm files next to the database
+        for leftover in (path, path + '-wal', path + '-shm'):
+            if os.path.exists(leftover):
+                os.unlink(leftover)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--products', type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f'readers={args.readers} writers={args.writers} seconds={args.seconds}')
+    print(f'{"profile":<11} {"reads/s":>9} {"writes/s":>9} {"read p50":>9} {"read p95":>9} '
+          f'{"r locked":>8} {"w locked":>8}')
+    for profile in PROFILES:
+        run(profile, args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
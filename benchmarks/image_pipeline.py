@@ -0,0 +1,144 @@
+"""
+Image benchmark: upload latency and listing page weight with derivatives.
+
+Uploads --products synthetic photos (smooth shapes with grain, so they
+compress roughly like real photos) through the same path as the admin
+forms, into an upload folder made under the static folder for this run.
+Reports the time spent on the request thread against the time the
+background pool takes to finish all derivatives. Then it fetches /products
+and adds up the image bytes a browser would download for the grid:
+- the originals (what the grid served before)
+- the JPEG derivatives at 1x and 2x
+- the WebP derivatives at 1x and 2x
+
+Run from the project root:
+
+    python -m benchmarks.image_pipeline --products 24 --width 2400 --height 3000
+"""
+
+import argparse
+import io
+import os
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+from website import create_app, db
+from website.bootstrap import bootstrap
+from website.models import Category, Product
+
+PICTURE_RE = re.compile(r'<picture>(.*?)</picture>', re.S)
+SRCSET_RE = re.compile(r'srcset="([^"]+)"')
+SRC_RE = re.compile(r' src="([^"]+)"')
+
+
+def photo(index, width, height):
+    """A JPEG that compresses like a photo: smooth shapes, a gradient and a little grain"""
+    gradient = Image.linear_gradient('L').resize((width, height))
+    shapes = Image.effect_noise((width // 32, height // 32), 60 + index % 20).resize((width, height), Image.BICUBIC)
+    grain = Image.effect_noise((width, height), 8)
+    image = Image.merge('RGB', (gradient, shapes, Image.blend(shapes, grain, 0.3)))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def candidates(srcset):
+    """{'1x': url, '2x': url} from a srcset attribute"""
+    urls = {}
+    for candidate in srcset.split(','):
+        url, _, density = candidate.strip().partition(' ')
+        urls[density or '1x'] = url
+    return urls
+
+
+def static_size(app, url):
+    return os.path.getsize(os.path.join(app.static_folder, url[len(app.static_url_path) + 1:]))
+
+
+def page_weight(app, html, originals):
+    weights = dict.fromkeys(('originals', 'jpeg 1x', 'jpeg 2x', 'webp 1x', 'webp 2x'), 0)
+    pictures = PICTURE_RE.findall(html)
+    for picture in pictures:
+        source, img = SRCSET_RE.findall(picture)
+        webp, jpeg = candidates(source), candidates(img)
+        src = SRC_RE.search(picture).group(1)
+        weights['originals'] += static_size(app, originals[src.rsplit('/', 1)[1].split('-')[0]])
+        for label, urls in (('jpeg', jpeg), ('webp', webp)):
+            weights[f'{label} 1x'] += static_size(app, urls['1x'])
+            weights[f'{label} 2x'] += static_size(app, urls.get('2x', urls['1x']))
+    return len(pictures), weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--products', type=int, default=24)
+    parser.add_argument('--width', type=int, default=2400)
+    parser.add_argument('--height', type=int, default=3000)
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    static_images = os.path.join(os.path.dirname(__file__), os.pardir, 'website', 'static', 'images')
+    folder = tempfile.mkdtemp(prefix='bench-', dir=static_images)
+    try:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+            'UPLOAD_FOLDER': os.path.abspath(folder),
+            'PRODUCTS_PER_PAGE': args.products,
+            'RATE_LIMIT_STORAGE': 'memory://',
+        })
+        with app.app_context():
+            bootstrap(log=lambda message: None)
+        store = app.extensions['uploads']
+
+        images = [photo(i, args.width, args.height) for i in range(args.products)]
+        request_times = []
+        originals = {}
+        start = time.perf_counter()
+        with app.test_request_context():
+            category_id = Category.query.first().id
+            for i, data in enumerate(images):
+                began = time.perf_counter()
+                url, _, _ = store.save(FileStorage(io.BytesIO(data), filename=f'photo{i}.jpg'))
+                request_times.append(time.perf_counter() - began)
+                originals[url.rsplit('/', 1)[1].split('.')[0]] = url
+                db.session.add(Product(name=f'Photo {i}', slug=f'photo-{i}', price=25.0,
+                                       category_id=category_id, image_url=url))
+            db.session.commit()
+        for future in list(store._pending.values()):
+            future.result()
+        pool_time = time.perf_counter() - start
+
+        client = app.test_client()
+        client.post('/landing', data={'access_code': 'STAT2024'})
+        html = client.get('/products').get_data(as_text=True)
+        count, weights = page_weight(app, html, originals)
+
+        print(f'{args.products} uploads of {args.width}x{args.height}, '
+              f'{statistics.mean(len(data) for data in images) / 1024:.0f} KB each')
+        print(f'request thread per upload: median {statistics.median(request_times) * 1000:.1f} ms, '
+              f'max {max(request_times) * 1000:.1f} ms')
+        print(f'all derivatives ready after {pool_time:.2f} s on {app.config["IMAGE_WORKERS"]} workers')
+        print()
+        print(f'/products grid, {count} images')
+        print(f'{"served":<12} {"KB":>9} {"vs originals":>13}')
+        for label, size in weights.items():
+            print(f'{label:<12} {size / 1024:>9.0f} {size / weights["originals"]:>12.1%}')
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+        # WAL mode leaves -wal/-shm files next to the database
+        for leftover in (path, path + '-wal', path + '-shm'):
+            if os.path.exists(leftover):
+                os.unlink(leftover)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
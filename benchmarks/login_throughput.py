@@ -0,0 +1,140 @@
+"""
+Login benchmark: legitimate sign-ins during a credential-stuffing run.
+
+Attacker threads post wrong passwords for many accounts from a handful of
+IPs at a fixed total rate. Meanwhile a few legitimate users, each from
+their own IP, sign in every few seconds. The run is repeated with the
+login throttle off and on, against a throwaway SQLite file. It reports how
+many attacker attempts were hashed, throttled (429, before any hashing)
+or turned away by the full hashing pool (503), and the legitimate users'
+success rate and latency.
+
+Run from the project root:
+
+    python -m benchmarks.login_throughput --attackers 16 --seconds 10
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import insert
+
+from website import create_app, db
+from website.bootstrap import bootstrap
+from website.models import User
+from website.passwords import hash_password
+
+PASSWORD = 'correct horse battery'
+
+
+def seed(app, accounts):
+    with app.app_context():
+        pwhash = hash_password(PASSWORD)  # one salt for every account keeps seeding fast
+        db.session.execute(insert(User), [
+            {'email': f'user{i}@example.com', 'first_name': 'User', 'last_name': str(i), 'password': pwhash}
+            for i in range(accounts)
+        ])
+        db.session.commit()
+
+
+def attacker(app, deadline, stats, ips, accounts, legit, pause):
+    rng = random.Random()
+    client = app.test_client()
+    while time.perf_counter() < deadline:
+        time.sleep(pause)
+        email = f'user{rng.randrange(legit, accounts)}@example.com'
+        response = client.post('/login', data={'email': email, 'password': 'hunter2'},
+                               environ_base={'REMOTE_ADDR': rng.choice(ips)})
+        stats[response.status_code] = stats.get(response.status_code, 0) + 1
+
+
+def legit_user(app, deadline, stats, index, interval):
+    while time.perf_counter() < deadline:
+        client = app.test_client()
+        start = time.perf_counter()
+        response = client.post('/login', data={'email': f'user{index}@example.com', 'password': PASSWORD},
+                               environ_base={'REMOTE_ADDR': f'10.1.0.{index}'})
+        elapsed = time.perf_counter() - start
+        if response.status_code == 302:
+            stats['latency'].append(elapsed)
+        else:
+            stats['failed'].append(response.status_code)
+        time.sleep(max(0.0, interval - elapsed))
+
+
+def run(throttled, args):
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+            'PASSWORD_HASH_METHOD': f'pbkdf2:sha256:{args.iterations}',
+            'LOGIN_THROTTLE_ENABLED': throttled,
+            'RATE_LIMIT_STORAGE': 'memory://',  # a fresh set of buckets for each run
+        })
+        with app.app_context():
+            bootstrap(log=lambda message: None)
+        seed(app, args.accounts)
+
+        attack = {}
+        legit = {'latency': [], 'failed': []}
+        ips = [f'203.0.113.{i}' for i in range(args.ips)]
+        deadline = time.perf_counter() + args.seconds
+        pause = args.attackers / args.rate
+        threads = [threading.Thread(target=attacker,
+                                    args=(app, deadline, attack, ips, args.accounts, args.legit, pause))
+                   for _ in range(args.attackers)]
+        threads += [threading.Thread(target=legit_user, args=(app, deadline, legit, i, args.interval))
+                    for i in range(args.legit)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        attempts = sum(attack.values())
+        hashed = attack.get(200, 0)
+        throttled_out = attack.get(429, 0)
+        busy = attack.get(503, 0)
+        latency = sorted(legit['latency'])
+        ok = len(latency)
+        p50 = statistics.median(latency) * 1000 if latency else 0.0
+        p95 = latency[int(len(latency) * 0.95)] * 1000 if latency else 0.0
+        label = 'throttled' if throttled else 'unthrottled'
+        print(f'{label:<12} {attempts / args.seconds:>10.0f} {hashed:>7} {throttled_out:>7} {busy:>7} '
+              f'{ok:>5}/{ok + len(legit["failed"]):<5} {p50:>9.0f} {p95:>9.0f}')
+    finally:
+        # WAL mode leaves -wal/-shm files next to the database
+        for leftover in (path, path + '-wal', path + '-shm'):
+            if os.path.exists(leftover):
+                os.unlink(leftover)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--attackers', type=int, default=16)
+    parser.add_argument('--rate', type=float, default=200, help='attacker attempts per second, in total')
+    parser.add_argument('--ips', type=int, default=4, help='distinct attacker IPs')
+    parser.add_argument('--legit', type=int, default=4, help='legitimate users')
+    parser.add_argument('--interval', type=float, default=3.0, help='seconds between legitimate sign-ins')
+    parser.add_argument('--accounts', type=int, default=500)
+    parser.add_argument('--iterations', type=int, default=600000, help='pbkdf2 iterations')
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    print(f'attackers={args.attackers} rate={args.rate:.0f}/s ips={args.ips} legit={args.legit} '
+          f'iterations={args.iterations} seconds={args.seconds}')
+    print(f'{"mode":<12} {"attempts/s":>10} {"hashed":>7} {"429":>7} {"503":>7} {"legit ok":>11} '
+          f'{"p50 ms":>9} {"p95 ms":>9}')
+    for throttled in (False, True):
+        run(throttled, args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""
+Bulk product import benchmark: rows per minute for CSV and JSON lines.
+
+Generates a catalog file (every product with a few size variants, plus a
+sprinkling of bad rows), then times a dry run and a real import of it
+against a throwaway SQLite file.
+
+Run from the project root:
+
+    python -m benchmarks.product_import --products 20000 --variants 3
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+from website import create_app, db
+from website.bootstrap import bootstrap
+from website.models import Product, ProductVariant
+from website.imports import import_products
+
+SIZES = ('XS', 'S', 'M', 'L', 'XL', 'XXL')
+COLUMNS = ('name', 'slug', 'category_slug', 'description', 'price', 'sku', 'inventory',
+           'colorway', 'fabric_type', 'variant_name', 'variant_value', 'price_adjustment',
+           'variant_inventory', 'variant_sku')
+
+
+def catalog(products, variants, category_slug):
+    """Product records with nested variants; every 500th has a bad price"""
+    for i in range(products):
+        yield {
+            'name': f'Collection Tee {i}',
+            'slug': f'collection-tee-{i}',
+            'category_slug': category_slug,
+            'description': f'Heavyweight cotton tee number {i} from the new collection',
+            'price': 'n/a' if i % 500 == 499 else f'{25 + i % 40}.00',
+            'sku': f'TEE-{i:06d}',
+            'inventory': 100,
+            'colorway': 'Washed Black',
+            'fabric_type': '100% cotton',
+            'variants': [
+                {'variant_name': 'Size', 'variant_value': size, 'price_adjustment': 0,
+                 'variant_inventory': 20, 'variant_sku': f'TEE-{i:06d}-{size}'}
+                for size in SIZES[:variants]
+            ],
+        }
+
+
+def as_csv(records):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, COLUMNS, extrasaction='ignore')
+    writer.writeheader()
+    for record in records:
+        for variant in record['variants'] or [{}]:
+            writer.writerow(dict(record, **variant))
+    return buffer.getvalue()
+
+
+def as_jsonl(records):
+    return ''.join(json.dumps(record) + '\n' for record in records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--variants', type=int, default=3)
+    args = parser.parse_args()
+
+    for fmt, render in (('csv', as_csv), ('jsonl', as_jsonl)):
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        try:
+            app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}'})
+            with app.app_context():
+                bootstrap()
+                data = render(catalog(args.products, args.variants, 'mensware-shirts'))
+                rows = data.count('\n') - (1 if fmt == 'csv' else 0)
+
+                for dry_run in (True, False):
+                    start = time.perf_counter()
+                    result = import_products(io.StringIO(data, newline=''), fmt, dry_run=dry_run)
+                    elapsed = time.perf_counter() - start
+                    label = 'dry run' if dry_run else 'import'
+                    print(f'{fmt:<5} {label:<7} {rows} rows in {elapsed:.2f}s '
+                          f'({rows / elapsed * 60:,.0f} rows/min): {result.products} products, '
+                          f'{result.variants} variants, {result.error_count} rejected')
+
+                stored = (Product.query.count(), ProductVariant.query.count())
+                print(f'{fmt:<5} stored  {stored[0]} products, {stored[1]} variants')
+        finally:
+            # WAL mode leaves -wal/-shm files next to the database
+            for leftover in (path, path + '-wal', path + '-shm'):
+                if os.path.exists(leftover):
+                    os.unlink(leftover)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""
+Rate limit benchmark: per-request overhead and limits across processes.
+
+Times TokenBucketStore.take() (memory://) and SQLiteBucketStore.take()
+(the shared sqlite:/// store) on their own, then the before_request hook for
+an unlimited GET, a view with one policy and a view with two policies,
+in microseconds per call. Last, several worker processes hammer one bucket
+at once: with the shared store exactly `burst` attempts get through in
+total, while per-process memory stores let `burst` through in every worker.
+
+Run from the project root:
+
+    python -m benchmarks.rate_limit_overhead --calls 20000 --processes 4
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from flask import Blueprint
+
+from website import create_app
+from website.ratelimit import TokenBucketStore, SQLiteBucketStore, rate_limit
+
+# Large enough that no benchmark call is ever limited
+UNLIMITED = 10 ** 9
+
+
+def per_call(fn, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        fn(i)
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def bench_stores(path, args):
+    stores = {
+        'memory://': TokenBucketStore(args.keys),
+        'sqlite:///': SQLiteBucketStore(path, 3600),
+    }
+    for name, store in stores.items():
+        keys = [f'bench:ip:10.0.{i // 256}.{i % 256}' for i in range(args.keys)]
+        store.take(keys[0], UNLIMITED, UNLIMITED)  # open the connection outside the timing
+        us = per_call(lambda i: store.take(keys[i % len(keys)], UNLIMITED, UNLIMITED), args.calls)
+        print(f'{"take() " + name:<28} {us:>10.1f}')
+
+
+def bench_hook(path, args):
+    bench = Blueprint('bench', __name__)
+
+    @bench.route('/unlimited')
+    def unlimited():
+        return ''
+
+    @bench.route('/one', methods=['POST'])
+    @rate_limit(burst=UNLIMITED, per_minute=UNLIMITED)
+    def one():
+        return ''
+
+    @bench.route('/two', methods=['POST'])
+    @rate_limit(burst=UNLIMITED, per_minute=UNLIMITED)
+    @rate_limit(burst=UNLIMITED, per_minute=UNLIMITED, key='session')
+    def two():
+        return ''
+
+    for storage in ('memory://', f'sqlite:///{path}'):
+        app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'RATE_LIMIT_STORAGE': storage})
+        app.register_blueprint(bench)
+        label = storage.split('/')[0] + '//'
+        for route, method in (('/unlimited', 'GET'), ('/one', 'POST'), ('/two', 'POST')):
+            with app.test_request_context(route, method=method, environ_base={'REMOTE_ADDR': '10.9.8.7'}):
+                app.preprocess_request()  # the first call opens the SQLite connection
+                check = app.extensions['rate_limiter'].check
+                us = per_call(lambda i: check(), args.calls)
+            print(f'{"hook " + method + " " + route + " " + label:<28} {us:>10.1f}')
+
+
+def hammer(storage, path, burst, attempts, start, results):
+    store = SQLiteBucketStore(path, 3600) if storage == 'sqlite' else TokenBucketStore(1000)
+    while time.time() < start:
+        pass
+    allowed = sum(1 for _ in range(attempts) if store.take('flood:ip:203.0.113.9', burst, 0.001) == 0)
+    results.put(allowed)
+
+
+def bench_processes(path, args):
+    for storage in ('memory', 'sqlite'):
+        results = multiprocessing.Queue()
+        start = time.time() + 0.5
+        workers = [multiprocessing.Process(target=hammer,
+                                           args=(storage, path, args.burst, args.attempts, start, results))
+                   for _ in range(args.processes)]
+        for worker in workers:
+            worker.start()
+        allowed = sum(results.get() for _ in workers)
+        for worker in workers:
+            worker.join()
+        print(f'{storage:<10} {args.processes:>9} {args.processes * args.attempts:>9} {allowed:>8} '
+              f'{args.burst:>6}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--calls', type=int, default=20000, help='timed calls per row')
+    parser.add_argument('--keys', type=int, default=1000, help='distinct buckets cycled through')
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--attempts', type=int, default=500, help='attempts per process on one bucket')
+    parser.add_argument('--burst', type=int, default=100)
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        print(f'calls={args.calls} keys={args.keys}')
+        print(f'{"operation":<28} {"us/call":>10}')
+        bench_stores(path, args)
+        bench_hook(path, args)
+
+        os.unlink(path)
+        print()
+        print(f'one bucket, burst={args.burst}, {args.attempts} attempts per process')
+        print(f'{"store":<10} {"processes":>9} {"attempts":>9} {"allowed":>8} {"burst":>6}')
+        bench_processes(path, args)
+    finally:
+        # WAL mode leaves -wal/-shm files next to the database
+        for leftover in (path, path + '-wal', path + '-shm'):
+            if os.path.exists(leftover):
+                os.unlink(leftover)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
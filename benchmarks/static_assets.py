@@ -0,0 +1,121 @@
+"""
+Static asset benchmark: bytes and requests for stylesheets per visitor.
+
+Copies website/static to a temporary folder and builds fingerprinted,
+precompressed assets there. Then it replays a browser that loads the
+landing and home pages once and comes back for --views more page views,
+with the plain static route and with the fingerprinted one. The browser
+sends Accept-Encoding (br, gzip), revalidates cached files marked no-cache
+with If-None-Match, and skips the network entirely for files that are
+still fresh.
+
+Run from the project root:
+
+    python -m benchmarks.static_assets --views 20
+"""
+
+import argparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+from website import create_app
+from website.bootstrap import bootstrap
+from website.assets import AssetManifest, build_assets
+
+STYLESHEET_RE = re.compile(r'<link rel="stylesheet" href="(/static/[^"]+)"')
+PAGES = ('/landing', '/')
+
+
+class Browser:
+    """Just enough of an HTTP cache to count what crosses the network"""
+
+    def __init__(self, client, encoding):
+        self.client = client
+        self.encoding = encoding
+        self.cache = {}
+        self.requests = 0
+        self.bytes = 0
+        self.not_modified = 0
+
+    def fetch(self, url):
+        cached = self.cache.get(url)
+        headers = {'Accept-Encoding': self.encoding}
+        if cached is not None:
+            if cached['fresh_until'] > time.time():
+                return
+            headers['If-None-Match'] = cached['etag']
+        response = self.client.get(url, headers=headers)
+        self.requests += 1
+        self.bytes += len(response.get_data())
+        if response.status_code == 304:
+            self.not_modified += 1
+        cache_control = response.cache_control
+        fresh_for = 0 if cache_control.no_cache else (cache_control.max_age or 0)
+        self.cache[url] = {'etag': response.headers.get('ETag'), 'fresh_until': time.time() + fresh_for}
+        response.close()
+
+    def view(self, page):
+        response = self.client.get(page)
+        for url in STYLESHEET_RE.findall(response.get_data(as_text=True)):
+            self.fetch(url)
+
+
+def run(label, app, args):
+    client = app.test_client()
+    client.post('/landing', data={'access_code': 'STAT2024'})
+    for encoding in ('br, gzip', 'gzip'):
+        browser = Browser(client, encoding)
+        for page in PAGES:
+            browser.view(page)
+        first = (browser.requests, browser.bytes)
+        for i in range(args.views):
+            browser.view(PAGES[i % len(PAGES)])
+        print(f'{label:<14} {encoding:<9} {first[0]:>9} {first[1] / 1024:>9.1f} '
+              f'{browser.requests - first[0]:>10} {browser.not_modified:>6} {(browser.bytes - first[1]) / 1024:>9.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--views', type=int, default=20, help='page views after the first visit')
+    args = parser.parse_args()
+
+    source = os.path.join(os.path.dirname(__file__), os.pardir, 'website', 'static')
+    static = tempfile.mkdtemp(prefix='static-')
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        shutil.copytree(source, static, dirs_exist_ok=True,
+                        ignore=shutil.ignore_patterns('products', 'assets.json', '*.??????????.*'))
+        for fingerprinted in (False, True):
+            app = create_app({
+                'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+                'RATE_LIMIT_STORAGE': 'memory://',
+                'ASSET_FINGERPRINTS_ENABLED': fingerprinted,
+            })
+            app.static_folder = static
+            with app.app_context():
+                bootstrap(log=lambda message: None)
+            if fingerprinted:
+                manifest = os.path.join(static, app.config['ASSET_MANIFEST'])
+                build_assets(static, manifest)
+                app.extensions['assets'] = AssetManifest.load(manifest)
+            else:
+                print(f'first visit: {" + ".join(PAGES)}, then {args.views} page views; stylesheets only')
+                print(f'{"static route":<14} {"encoding":<9} {"first req":>9} {"first KB":>9} '
+                      f'{"later req":>10} {"304s":>6} {"later KB":>9}')
+            run('fingerprinted' if fingerprinted else 'plain', app, args)
+    finally:
+        shutil.rmtree(static, ignore_errors=True)
+        # WAL mode leaves -wal/-shm files next to the database
+        for leftover in (path, path + '-wal', path + '-shm'):
+            if os.path.exists(leftover):
+                os.unlink(leftover)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
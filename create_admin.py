@@ -5,7 +5,8 @@ You can either create a new admin account or promote an existing user.
 
 from website import create_app, db
 from website.models import User
-from werkzeug.security import generate_password_hash
+from website.store_stats import adjust
+from website.passwords import hash_password
 
 def create_admin():
     app = create_app()
@@ -57,11 +58,12 @@ def create_admin():
                 email=email,
                 first_name=first_name,
                 last_name=last_name,
-                password=generate_password_hash(password, method='pbkdf2:sha256'),
+                password=hash_password(password),
                 is_admin=True
             )
             
             db.session.add(new_admin)
+            adjust(total_users=1)
             db.session.commit()
             
             print()
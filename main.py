@@ -3,4 +3,9 @@ from website import create_app
 app = create_app()
 
 if __name__ == '__main__':
+    # Development server: set up a fresh database on the way in. Deployed
+    # workers skip this; run `flask --app main bootstrap` once per deploy.
+    from website.bootstrap import bootstrap
+    with app.app_context():
+        bootstrap()
     app.run(debug=True)
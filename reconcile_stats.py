@@ -0,0 +1,20 @@
+"""
+Recount the admin dashboard totals from the source tables.
+Schedule this periodically (e.g. nightly from cron) to correct any drift
+caused by writes made outside the app.
+"""
+
+from website import create_app
+from website.store_stats import reconcile
+
+def reconcile_stats():
+    app = create_app()
+    
+    with app.app_context():
+        drift = reconcile()
+        for name, delta in drift.items():
+            print(f"{name}: {delta:+d}")
+        print("OK: Dashboard totals reconciled")
+
+if __name__ == '__main__':
+    reconcile_stats()
@@ -0,0 +1,77 @@
+import pytest
+
+from website import create_app, db, ADMIN_EMAIL, ADMIN_PASSWORD
+from website.bootstrap import bootstrap
+from website.models import Category, Product, ProductVariant, User
+from website.passwords import hash_password
+
+PASSWORD = 'password1'
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "test.db"}',
+        'TESTING': True,
+        'RATE_LIMIT_STORAGE': 'memory://',
+    })
+    with app.app_context():
+        bootstrap(log=lambda message: None)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+@pytest.fixture
+def make_product(app):
+    """Create a product (and variants from `variants`: [(value, price_adjustment, inventory)])"""
+    def make(name, price=10.0, inventory=5, category=None, variants=(), **fields):
+        with app.app_context():
+            category_id = Category.query.filter_by(name=category).one().id if category \
+                else Category.query.first().id
+            slug = name.lower().replace(' ', '-')
+            product = Product(name=name, slug=slug, price=price, inventory=inventory,
+                              category_id=category_id, **fields)
+            db.session.add(product)
+            db.session.flush()
+            for value, adjustment, stock in variants:
+                db.session.add(ProductVariant(product_id=product.id, name='Size', value=value,
+                                              price_adjustment=adjustment, inventory=stock))
+            db.session.commit()
+            return product.id
+    return make
+
+
+@pytest.fixture
+def make_user(app):
+    def make(email='shopper@example.com'):
+        with app.app_context():
+            user = User(email=email, first_name='Test', last_name='Shopper', password=hash_password(PASSWORD))
+            db.session.add(user)
+            db.session.commit()
+            return user.id
+    return make
+
+
+@pytest.fixture
+def client(app):
+    """A client past the landing page"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['has_landing_access'] = True
+    return client
+
+
+@pytest.fixture
+def shopper(client, make_user):
+    make_user('shopper@example.com')
+    client.post('/login', data={'email': 'shopper@example.com', 'password': PASSWORD})
+    return client
+
+
+@pytest.fixture
+def admin(client):
+    client.post('/login', data={'email': ADMIN_EMAIL, 'password': ADMIN_PASSWORD})
+    return client
@@ -0,0 +1,41 @@
+from sqlalchemy import text
+
+from website import db
+from website.models import Category, Product
+from website.search import FTS_TABLE, rebuild_search_index
+from website.store_stats import get_stats, reconcile
+
+
+def test_delete_category_counts_cascaded_products(app, admin, make_product):
+    with app.app_context():
+        doomed, kept = [category.name for category in Category.query.order_by(Category.id).limit(2)]
+    for i in range(3):
+        make_product(f'Tee {i}', category=doomed)
+    make_product('Hoodie', category=kept)
+    with app.app_context():
+        reconcile()
+        category_id = Category.query.filter_by(name=doomed).one().id
+
+    admin.get(f'/admin/categories/delete/{category_id}')
+
+    with app.app_context():
+        assert Product.query.count() == 1
+        assert get_stats().total_products == 1
+
+
+def test_delete_category_removes_products_from_search(app, admin, make_product):
+    with app.app_context():
+        doomed, kept = [category.name for category in Category.query.order_by(Category.id).limit(2)]
+    make_product('Cotton Tee', category=doomed)
+    make_product('Cotton Hoodie', category=kept)
+    with app.app_context():
+        rebuild_search_index()
+        db.session.commit()
+        category_id = Category.query.filter_by(name=doomed).one().id
+
+    admin.get(f'/admin/categories/delete/{category_id}')
+
+    with app.app_context():
+        indexed = db.session.execute(text(f'SELECT rowid FROM {FTS_TABLE}')).scalars().all()
+        assert indexed == [Product.query.filter_by(name='Cotton Hoodie').one().id]
+    assert b'Cotton Hoodie' in admin.get('/products?search=cotton').data
@@ -0,0 +1,45 @@
+from website import db
+from website.models import CartItem
+
+
+def cart_lines(app):
+    with app.app_context():
+        return [(line.product_id, line.variant_id, line.quantity) for line in CartItem.query.all()]
+
+
+def test_add_to_cart_with_own_variant(app, shopper, make_product):
+    product_id = make_product('Hoodie', variants=[('M', 5.0, 3)])
+    with app.app_context():
+        variant_id = db.session.execute(db.text('SELECT id FROM product_variant')).scalar()
+
+    response = shopper.post('/api/cart', json={'product_id': product_id, 'variant_id': variant_id, 'quantity': 2})
+
+    assert response.status_code == 200
+    assert cart_lines(app) == [(product_id, variant_id, 2)]
+
+
+def test_add_to_cart_rejects_another_products_variant(app, shopper, make_product):
+    product_id = make_product('Jacket', price=100.0)
+    other_id = make_product('Cap', variants=[('Discount', -4.0, 3)])
+    with app.app_context():
+        variant_id = db.session.execute(db.text('SELECT id FROM product_variant WHERE product_id = :id'),
+                                        {'id': other_id}).scalar()
+
+    form = shopper.post('/add-to-cart', data={'product_id': product_id, 'variant_id': variant_id})
+    api = shopper.post('/api/cart', json={'product_id': product_id, 'variant_id': variant_id})
+
+    assert form.status_code == 404
+    assert api.status_code == 404
+    assert api.get_json()['success'] is False
+    assert cart_lines(app) == []
+
+
+def test_add_to_cart_rejects_missing_variant(app, shopper, make_product):
+    product_id = make_product('Jacket')
+
+    form = shopper.post('/add-to-cart', data={'product_id': product_id, 'variant_id': 9999})
+    api = shopper.post('/api/cart', json={'product_id': product_id, 'variant_id': 9999})
+
+    assert form.status_code == 404
+    assert api.status_code == 404
+    assert cart_lines(app) == []
@@ -0,0 +1,110 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import func
+
+from benchmarks.checkout_stress import seed, checkout
+from website import create_app, db
+from website.bootstrap import bootstrap
+from website.models import CartItem, Order, OrderItem, Product, ProductVariant
+from website.checkout import place_order, CheckoutError
+
+
+def variant_of(product_id):
+    return ProductVariant.query.filter_by(product_id=product_id).one()
+
+
+def test_checkout_prices_own_variant(app, make_product, make_user):
+    user_id = make_user()
+    product_id = make_product('Hoodie', price=100.0, variants=[('XL', 5.0, 3)])
+    with app.app_context():
+        variant = variant_of(product_id)
+        db.session.add(CartItem(user_id=user_id, product_id=product_id, variant_id=variant.id, quantity=2))
+        db.session.commit()
+
+        order = place_order(user_id, '1 Test St', '1 Test St', 'credit_card')
+
+        assert order.total_amount == 210.0
+        assert variant_of(product_id).inventory == 1
+
+
+def test_checkout_rejects_another_products_variant(app, make_product, make_user):
+    user_id = make_user()
+    product_id = make_product('Jacket', price=100.0)
+    other_id = make_product('Cap', variants=[('Discount', -4.0, 3)])
+    with app.app_context():
+        # A line written before add-to-cart checked the variant (or by the migration)
+        variant_id = variant_of(other_id).id
+        db.session.add(CartItem(user_id=user_id, product_id=product_id, variant_id=variant_id, quantity=1))
+        db.session.commit()
+
+        with pytest.raises(CheckoutError) as error:
+            place_order(user_id, '1 Test St', '1 Test St', 'credit_card')
+
+        assert [failure.product_name for failure in error.value.failures] == ['Jacket']
+        assert Order.query.count() == 0
+        assert db.session.get(Product, product_id).inventory == 5
+        assert variant_of(other_id).inventory == 3
+
+
+def test_each_short_line_is_reported(app, make_product, make_user):
+    user_id = make_user()
+    lines = {name: make_product(name, inventory=stock) for name, stock in
+             (('Hoodie', 5), ('Cap', 1), ('Scarf', 0))}
+    with app.app_context():
+        for product_id in lines.values():
+            db.session.add(CartItem(user_id=user_id, product_id=product_id, quantity=2))
+        db.session.commit()
+
+        with pytest.raises(CheckoutError) as error:
+            place_order(user_id, '1 Test St', '1 Test St', 'credit_card')
+
+        messages = {failure.product_name: failure.message for failure in error.value.failures}
+        assert messages == {
+            'Cap': 'Only 1 of Cap left (you asked for 2).',
+            'Scarf': 'Scarf is out of stock.',
+        }
+        assert CartItem.query.filter_by(user_id=user_id).count() == 3
+        assert db.session.get(Product, lines['Hoodie']).inventory == 5
+
+
+STRESS_THREADS = 8
+
+
+@pytest.fixture
+def stress_app(tmp_path):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "stress.db"}',
+        'SQLALCHEMY_ENGINE_OPTIONS': {'pool_size': STRESS_THREADS, 'max_overflow': 0, 'connect_args': {'timeout': 2}},
+        'RATE_LIMIT_STORAGE': 'memory://',
+        'CHECKOUT_LOCK_RETRIES': 20,
+        'TESTING': True,
+    })
+    with app.app_context():
+        bootstrap(log=lambda message: None)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def test_concurrent_checkout_never_oversells(stress_app):
+    """A smaller run of benchmarks/checkout_stress.py"""
+    app = stress_app
+    shoppers, stock = 40, 15
+    product_id, user_ids = seed(app, shoppers, stock)
+
+    with ThreadPoolExecutor(max_workers=STRESS_THREADS) as pool:
+        results = list(pool.map(lambda user_id: checkout(app, user_id), user_ids))
+
+    with app.app_context():
+        inventory = db.session.get(Product, product_id).inventory
+        sold = db.session.query(func.coalesce(func.sum(OrderItem.quantity), 0)).filter_by(
+            product_id=product_id).scalar()
+        assert Order.query.count() == results.count('ok')
+        assert CartItem.query.count() == shoppers - results.count('ok')
+    assert inventory >= 0
+    assert results.count('ok') + results.count('sold_out') == shoppers
+    assert results.count('ok') == sold == stock
+    assert sold + inventory == stock
@@ -0,0 +1,90 @@
+import gzip
+
+import pytest
+
+from website.assets import AssetManifest
+
+
+@pytest.fixture
+def product(make_product):
+    make_product('Hoodie', is_featured=True)
+    return 'hoodie'
+
+
+def text(response):
+    data = response.get_data()
+    return (gzip.decompress(data) if response.content_encoding == 'gzip' else data).decode('utf-8')
+
+
+def flash_then_revisit(shopper, url):
+    """Load `url`, add to cart from it (which flashes and redirects back), then load it twice more"""
+    # Streamed pages hold their request context until the body is read
+    shopper.get(url).get_data()  # Shows the login flash
+    cached = shopper.get(url)
+    cached.get_data()
+    assert cached.status_code == 200 and cached.headers.get('ETag')
+
+    shopper.post('/add-to-cart', data={'product_id': 1}, headers={'Referer': url})
+    flashed = shopper.get(url, headers={'If-None-Match': cached.headers['ETag']})
+    flashed_body = text(flashed)
+
+    # A browser revalidates with whatever validator the flashed page came with
+    headers = {'If-None-Match': flashed.headers['ETag']} if 'ETag' in flashed.headers else {}
+    after = shopper.get(url, headers=headers)
+    return flashed, flashed_body, after, text(after)
+
+
+@pytest.mark.parametrize('url', ['/', '/product/hoodie'])
+def test_page_with_flash_is_never_revalidated(app, shopper, product, url):
+    flashed, body, after, after_body = flash_then_revisit(shopper, url)
+
+    assert flashed.status_code == 200
+    assert 'Item added to cart!' in body
+    assert 'ETag' not in flashed.headers
+    assert 'Last-Modified' not in flashed.headers
+    assert flashed.cache_control.no_store
+    assert after.status_code == 200
+    assert 'Item added to cart!' not in after_body
+
+
+@pytest.mark.parametrize('encoding', [None, 'gzip'])
+def test_streamed_page_with_flash_is_never_revalidated(app, shopper, product, encoding):
+    if encoding:
+        shopper.environ_base['HTTP_ACCEPT_ENCODING'] = encoding
+
+    flashed, body, after, after_body = flash_then_revisit(shopper, '/products')
+
+    assert flashed.status_code == 200
+    assert flashed.content_encoding == encoding
+    assert 'Item added to cart!' in body
+    assert 'ETag' not in flashed.headers
+    assert flashed.cache_control.no_store
+    assert after.status_code == 200
+    assert 'Item added to cart!' not in after_body
+
+
+def test_new_build_changes_the_etag(app, client, product):
+    first = client.get('/')
+    etag = first.headers['ETag']
+    assert client.get('/', headers={'If-None-Match': etag}).status_code == 304
+
+    app.extensions['assets'] = AssetManifest({'css/styles.css': {'file': 'css/styles.0123456789.css',
+                                                                 'encodings': []}})
+    rebuilt = client.get('/', headers={'If-None-Match': etag})
+    assert rebuilt.status_code == 200
+    assert rebuilt.headers['ETag'] != etag
+
+    app.config['APP_VERSION'] = 'next-deploy'
+    assert client.get('/', headers={'If-None-Match': rebuilt.headers['ETag']}).status_code == 200
+
+
+@pytest.mark.parametrize('url', ['/', '/products', '/product/hoodie'])
+def test_if_modified_since_alone_is_not_enough(app, client, product, url):
+    first = client.get(url)
+    first.get_data()
+    assert first.last_modified is not None
+
+    again = client.get(url, headers={'If-Modified-Since': first.headers['Last-Modified']})
+    again.get_data()
+
+    assert again.status_code == 200
@@ -0,0 +1,54 @@
+import io
+
+import pytest
+
+from website.models import Category, Product
+from website.imports import import_products
+
+HEADER = 'name,slug,category_slug,price,inventory,variant_name,variant_value,price_adjustment\n'
+
+
+def run_import(app, text, fmt='csv'):
+    with app.test_request_context():
+        return import_products(io.StringIO(text), fmt)
+
+
+@pytest.mark.parametrize('price', ['nan', 'inf', '-inf', 'NaN', 'Infinity'])
+def test_csv_rejects_non_finite_prices(app, price):
+    with app.app_context():
+        category = Category.query.first().slug
+    text = HEADER + f'Good,good,{category},10,1,,,\nBad,bad,{category},{price},1,,,\n'
+
+    result = run_import(app, text)
+
+    assert result.products == 1
+    assert [(error.line, error.slug) for error in result.errors] == [(3, 'bad')]
+    assert 'finite' in result.errors[0].message
+    with app.app_context():
+        assert [product.slug for product in Product.query.all()] == ['good']
+
+
+@pytest.mark.parametrize('fields', [
+    '"price": NaN', '"price": Infinity', '"price": 10, "inventory": Infinity', '"price": 10, "inventory": NaN',
+])
+def test_jsonl_rejects_non_finite_numbers(app, fields):
+    with app.app_context():
+        category = Category.query.first().slug
+    # json.loads accepts these bare literals
+    line = f'{{"name": "Bad", "slug": "bad", "category_slug": "{category}", {fields}}}\n'
+
+    result = run_import(app, line, fmt='jsonl')
+
+    assert result.products == 0
+    assert [error.slug for error in result.errors] == ['bad']
+
+
+def test_csv_rejects_non_finite_variant_adjustment(app):
+    with app.app_context():
+        category = Category.query.first().slug
+    text = HEADER + f'Bad,bad,{category},10,1,Size,M,nan\n'
+
+    result = run_import(app, text)
+
+    assert result.products == 0
+    assert 'price_adjustment' in result.errors[0].message
@@ -0,0 +1,40 @@
+import json
+
+from sqlalchemy import text
+
+from website import db
+from website.migrations import _product_images
+from website.models import ProductImage
+
+
+def test_product_images_migration_accepts_legacy_shapes(app, make_product):
+    legacy = {
+        'Dicts': [{'url': '/a.jpg', 'type': 'on_body'}, {'type': 'flat'}],
+        'Strings': ['/b.jpg', '', '/c.jpg'],
+        'Mixed': ['/d.jpg', 7, None, {'url': '/e.jpg'}],
+        'Object': {'url': '/f.jpg'},
+        'Broken': '[{"url": ',
+    }
+    ids = {name: make_product(name, images=images if isinstance(images, str) else json.dumps(images))
+           for name, images in legacy.items()}
+    with app.app_context():
+        db.session.execute(text('DELETE FROM product_image'))
+        db.session.commit()
+
+        messages = []
+        with db.engine.begin() as conn:
+            _product_images(conn, messages.append)
+
+        rows = ProductImage.query.order_by(ProductImage.product_id, ProductImage.sort_order).all()
+        migrated = {}
+        for row in rows:
+            migrated.setdefault(row.product_id, []).append((row.url, row.image_type))
+    assert migrated == {
+        ids['Dicts']: [('/a.jpg', 'on_body')],
+        ids['Strings']: [('/b.jpg', 'additional'), ('/c.jpg', 'additional')],
+        ids['Mixed']: [('/d.jpg', 'additional'), ('/e.jpg', 'additional')],
+    }
+    assert messages == [
+        f'Warning: Skipping images JSON that is not a list on product {ids["Object"]}',
+        f'Warning: Skipping unreadable images JSON on product {ids["Broken"]}',
+    ]
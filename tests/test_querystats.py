@@ -0,0 +1,60 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from flask_login import current_user
+
+from website import db
+from website.models import Category, Product
+from website.querystats import query_budget, QueryBudgetExceeded
+from website.streaming import stream_template, RowStream
+
+
+@pytest.fixture
+def catalog(make_product):
+    # Enough products for every listing, related-products strip and snippet
+    for i in range(30):
+        make_product(f'Cotton Hoodie {i}', is_featured=i % 3 == 0, description='Heavy cotton')
+
+
+@pytest.mark.parametrize('url', [
+    '/', '/products', '/products?sort=price_low', '/products?search=cotton', '/product/cotton-hoodie-3',
+])
+def test_storefront_stays_within_budget(app, client, catalog, url):
+    # Over-budget requests raise QueryBudgetExceeded while testing; streamed
+    # pages check their budget once the body has been read
+    for _ in range(2):  # Cold, then warm caches
+        response = client.get(url)
+        assert response.status_code == 200
+        assert response.get_data()
+
+
+def test_over_budget_view_raises(app, client):
+    @app.route('/test/over-budget')
+    @query_budget(1)
+    def over_budget():
+        Category.query.all()
+        Product.query.all()
+        return 'ok'
+
+    with pytest.raises(QueryBudgetExceeded):
+        client.get('/test/over-budget')
+
+
+def test_over_budget_streamed_view_raises(app, client):
+    @app.route('/test/over-budget-streamed')
+    @query_budget(1)
+    def over_budget_streamed():
+        Category.query.all()
+        return stream_template('admin/orders.html', orders=RowStream(Product.query), user=current_user)
+
+    # Checked once the body has been sent, i.e. when the client reads it
+    response = client.get('/test/over-budget-streamed')
+    with pytest.raises(QueryBudgetExceeded):
+        response.get_data()
+
+
+def test_failed_statement_leaves_no_start_time(app):
+    with app.app_context(), db.engine.connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.exec_driver_sql('SELECT * FROM no_such_table')
+        assert not conn.info.get('query_start_time')
@@ -0,0 +1,20 @@
+def test_flash_is_shown_once_on_streamed_page(app, admin, make_product):
+    product_id = make_product('Hoodie')
+
+    response = admin.get(f'/admin/products/delete/{product_id}', follow_redirects=True)
+
+    assert b'Product deleted successfully!' in response.data
+    assert b'Product deleted successfully!' not in admin.get('/admin/').data
+
+
+def test_streamed_page_matches_buffered(app, admin, make_product):
+    for i in range(5):
+        make_product(f'Hoodie {i}')
+    admin.get('/admin/')  # Shows (and clears) the login flash
+
+    streamed = admin.get('/admin/products').data
+    app.config['STREAMING_ENABLED'] = False
+    buffered = admin.get('/admin/products').data
+
+    assert streamed == buffered
+    assert streamed.count(b'Hoodie') >= 5
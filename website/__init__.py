@@ -1,9 +1,11 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
-from werkzeug.security import generate_password_hash
+import os
 
-db = SQLAlchemy()
+from .routing import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 DB_NAME = "stat_global.db"
 
 # Default admin credentials
@@ -15,14 +17,140 @@ ADMIN_LAST_NAME = "GLOBAL"
 # Landing page access code (change this to your desired password)
 LANDING_ACCESS_CODE = "STAT2024"
 
-def create_app():
+def create_app(test_config=None):
+    from .engine_profile import database_uri, engine_options, read_only_binds, init_engine_profile
+    
     app = Flask(__name__)
     app.config['SECRET_KEY'] = 'stat-global-secret-key-2024'
-    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_NAME}'
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri(f'sqlite:///{DB_NAME}')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['UPLOAD_FOLDER'] = 'website/static/images/products'
+    app.config['PRODUCTS_PER_PAGE'] = 24
+    app.config['PRODUCTS_MAX_PER_PAGE'] = 96
+    
+    # Engine profile: PRAGMAs run on every SQLite connection plus pool sizing
+    # (see engine_profile.py); DATABASE_PRAGMAS overrides single pragmas
+    app.config['DATABASE_PROFILE'] = os.environ.get('DATABASE_PROFILE', 'production')
+    app.config['DATABASE_PRAGMAS'] = {}
+    app.config['DATABASE_POOL_SIZE'] = 10
+    app.config['DATABASE_MAX_OVERFLOW'] = 20
+    app.config['DATABASE_POOL_TIMEOUT'] = 30
+    app.config['DATABASE_POOL_RECYCLE'] = 1800
+    
+    # Views marked @read_only query a separate bind (see routing.py): a
+    # replica when DATABASE_READ_URL is set, else a query_only pool on the file
+    app.config['READ_ONLY_ROUTING_ENABLED'] = True
+    app.config['READ_ONLY_DATABASE_URI'] = os.environ.get('DATABASE_READ_URL')
+    
+    # SQL instrumentation: per-endpoint statement counts, N+1 detection and
+    # query budgets (budgets always raise when app.testing is set)
+    app.config['QUERY_STATS_ENABLED'] = True
+    app.config['QUERY_STATS_HEADERS'] = False
+    app.config['QUERY_NPLUSONE_THRESHOLD'] = 5
+    app.config['QUERY_BUDGET_STRICT'] = False
+    
+    # Seconds between checks of the shared category generation counter
+    app.config['CATEGORY_CACHE_CHECK_INTERVAL'] = 5
+    
+    # Rendered-fragment LRU for the home and product detail pages
+    app.config['PAGE_CACHE_ENABLED'] = True
+    app.config['PAGE_CACHE_MAX_ENTRIES'] = 512
+    app.config['PAGE_CACHE_MAX_BYTES'] = 32 * 1024 * 1024
+    app.config['CONDITIONAL_GET_ENABLED'] = True
+    # Part of every page ETag; set per deploy (e.g. the git SHA) so template
+    # changes aren't answered with a 304 for the old HTML
+    app.config['APP_VERSION'] = os.environ.get('APP_VERSION', '')
+    
+    # Password hashing runs on a bounded pool; login/sign-up attempts are
+    # throttled per IP and per email before any hashing (see passwords.py).
+    # Changing the method re-hashes each user's password at their next login.
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:600000'
+    app.config['PASSWORD_HASH_WORKERS'] = min(4, os.cpu_count() or 1)
+    app.config['PASSWORD_HASH_QUEUE'] = 4 * app.config['PASSWORD_HASH_WORKERS']
+    app.config['PASSWORD_HASH_TIMEOUT'] = 10
+    app.config['LOGIN_THROTTLE_ENABLED'] = True
+    app.config['LOGIN_IP_BURST'] = 10
+    app.config['LOGIN_IP_PER_MINUTE'] = 10
+    app.config['LOGIN_EMAIL_BURST'] = 5
+    app.config['LOGIN_EMAIL_PER_MINUTE'] = 3
+    
+    # Token-bucket limits declared on views and blueprints (see ratelimit.py).
+    # The default SQLite store is shared by every worker process on the host;
+    # memory:// keeps buckets per process (bounded by RATE_LIMIT_MAX_KEYS)
+    app.config['RATE_LIMIT_ENABLED'] = True
+    app.config['RATE_LIMIT_STORAGE'] = os.environ.get('RATE_LIMIT_STORAGE', 'sqlite:///ratelimit.db')
+    app.config['RATE_LIMIT_MAX_KEYS'] = 100000
+    app.config['RATE_LIMIT_MAX_IDLE'] = 3600
+    
+    # Logged-in user snapshots served to Flask-Login without a query
+    app.config['USER_CACHE_ENABLED'] = True
+    app.config['USER_CACHE_MAX_ENTRIES'] = 10000
+    app.config['USER_CACHE_TTL'] = 300
+    app.config['USER_CACHE_CHECK_INTERVAL'] = 5
     
+    # Static files are served under content-hashed names with immutable caching
+    # once `flask --app main build-assets` has written the manifest (see assets.py)
+    app.config['ASSET_FINGERPRINTS_ENABLED'] = True
+    app.config['ASSET_MANIFEST'] = 'assets.json'
+    
+    # Uploaded product images: content-hashed originals in UPLOAD_FOLDER plus
+    # a JPEG/PNG and WebP per size (max width in px), resized in the
+    # background (see uploads.py)
+    app.config['IMAGE_SIZES'] = {'thumb': 160, 'grid': 600, 'detail': 1200}
+    app.config['IMAGE_QUALITY'] = 82
+    app.config['IMAGE_WORKERS'] = min(2, os.cpu_count() or 1)
+    app.config['IMAGE_MAX_BYTES'] = 20 * 1024 * 1024
+    app.config['IMAGE_MAX_PIXELS'] = 50000000
+    
+    # Checkout retries when another writer holds the SQLite lock
+    app.config['CHECKOUT_LOCK_RETRIES'] = 5
+    app.config['CHECKOUT_RETRY_DELAY'] = 0.05
+    
+    # Long listings (shop grid, admin products and orders) are rendered as they
+    # are sent: output goes out in STREAM_CHUNK_BYTES pieces while rows are
+    # fetched STREAM_QUERY_CHUNK at a time, gzipped on the fly when the client
+    # accepts it (see streaming.py)
+    app.config['STREAMING_ENABLED'] = True
+    app.config['STREAM_CHUNK_BYTES'] = 16384
+    app.config['STREAM_QUERY_CHUNK'] = 200
+    app.config['STREAM_GZIP'] = True
+    app.config['STREAM_GZIP_LEVEL'] = 6
+    
+    # Rows fetched per round trip by the streaming admin exports
+    app.config['EXPORT_CHUNK_SIZE'] = 1000
+    
+    # Bulk product import: products validated and committed per chunk
+    app.config['IMPORT_CHUNK_SIZE'] = 500
+    app.config['IMPORT_MAX_REPORTED_ERRORS'] = 1000
+    
+    if test_config is not None:
+        app.config.update(test_config)
+    
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+    app.config['SQLALCHEMY_BINDS'] = read_only_binds(app.config)
     db.init_app(app)
+    init_engine_profile(app)
+    
+    from .querystats import init_query_stats
+    from .routing import init_read_only_routing
+    from .category_cache import init_category_cache
+    from .page_cache import init_page_cache
+    from .user_cache import init_user_cache, load_user_snapshot
+    from .passwords import init_passwords
+    from .ratelimit import init_rate_limits
+    from .uploads import init_uploads
+    from .assets import init_assets
+    from .streaming import init_streaming
+    init_query_stats(app)
+    init_category_cache(app)
+    init_page_cache(app)
+    init_user_cache(app)
+    init_passwords(app)
+    init_rate_limits(app)
+    init_uploads(app)
+    init_assets(app)
+    init_streaming(app)
+    init_read_only_routing(app)
     
     login_manager = LoginManager()
     login_manager.login_view = 'auth.login'
@@ -30,14 +158,12 @@ def create_app():
     login_manager.login_message_category = 'info'
     login_manager.init_app(app)
     
-    from .models import User
-    
     @login_manager.user_loader
     def load_user(id):
         if id is None:
             return None
         try:
-            return User.query.get(int(id))
+            return load_user_snapshot(int(id))
         except (ValueError, TypeError):
             return None
     
@@ -50,64 +176,10 @@ def create_app():
     app.register_blueprint(auth, url_prefix='/')
     app.register_blueprint(admin, url_prefix='/admin')
     
-    # Create database tables and default admin account
-    with app.app_context():
-        from .models import Category
-        
-        db.create_all()
-        
-        # Create default admin account if it doesn't exist
-        admin_user = User.query.filter_by(email=ADMIN_EMAIL).first()
-        if not admin_user:
-            admin_user = User(
-                email=ADMIN_EMAIL,
-                first_name=ADMIN_FIRST_NAME,
-                last_name=ADMIN_LAST_NAME,
-                password=generate_password_hash(ADMIN_PASSWORD, method='pbkdf2:sha256'),
-                is_admin=True
-            )
-            db.session.add(admin_user)
-            db.session.commit()
-            print(f"✓ Default admin account created: {ADMIN_EMAIL}")
-        
-        # Create default categories structure
-        try:
-            categories_structure = {
-                'Mensware': ['Shirts', 'Hoodies', 'Hats', 'Artwork', 'Exclusive Catalog'],
-                'Womensware': ['Shirts', 'Hoodies', 'Hats', 'Artwork', 'Exclusive Catalog'],
-                'Global Babies/Kids': ['Shirts', 'Hoodies', 'Hats', 'Artwork', 'Exclusive Catalog']
-            }
-            
-            for parent_name, subcategories in categories_structure.items():
-                parent_category = Category.query.filter_by(name=parent_name).first()
-                if not parent_category:
-                    parent_slug = parent_name.lower().replace(' ', '-').replace('/', '-')
-                    parent_category = Category(
-                        name=parent_name,
-                        slug=parent_slug,
-                        description=f"{parent_name} collection"
-                    )
-                    db.session.add(parent_category)
-                    db.session.flush()  # Get the ID
-                
-                # Create subcategories
-                for subcat_name in subcategories:
-                    subcat_slug = f"{parent_category.slug}-{subcat_name.lower().replace(' ', '-')}"
-                    existing_subcat = Category.query.filter_by(slug=subcat_slug).first()
-                    if not existing_subcat:
-                        subcategory = Category(
-                            name=f"{parent_name} - {subcat_name}",
-                            slug=subcat_slug,
-                            description=f"{subcat_name} in {parent_name}",
-                            parent_id=parent_category.id
-                        )
-                        db.session.add(subcategory)
-            
-            db.session.commit()
-            print("OK: Default categories structure created")
-        except Exception as e:
-            print(f"Warning: Could not create default categories. Error: {e}")
-            db.session.rollback()
+    # Schema creation and seeding run once per deploy, not per worker:
+    # `flask --app main bootstrap` (see bootstrap.py)
+    from .bootstrap import init_cli
+    init_cli(app)
     
     return app
 
@@ -1,10 +1,24 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, current_app, abort, Response, stream_with_context
 from flask_login import login_required, current_user
 from . import db
-from .models import Product, Category, Order, User, ProductVariant
-from werkzeug.utils import secure_filename
+from .models import Product, Category, Order, OrderItem
+from .search import index_product, remove_product, remove_products
+from .querystats import query_budget
+from .streaming import stream_template, RowStream
+from .category_cache import get_categories, invalidate_categories
+from .images import gallery_from_form, UPLOAD_FIELDS
+from .uploads import form_uploads, UploadError
+from .store_stats import get_stats, adjust, order_status_changed, reconcile
+from .analytics import (refresh_rollups, move_order_status, SalesReport, top_products,
+                        sales_by_category, orders_by_status, GROUPINGS)
+from .exports import EXPORTS, EXPORT_FORMATS, export_lines
+from .imports import import_products, IMPORT_FORMATS
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload, selectinload
+from datetime import datetime, timedelta
+import csv
+import io
 import os
-import json
 
 admin = Blueprint('admin', __name__)
 
@@ -21,33 +35,108 @@ def admin_required(f):
 
 @admin.route('/')
 @admin_required
+@query_budget(3)
 def dashboard():
-    total_products = Product.query.count()
-    total_orders = Order.query.count()
-    total_users = User.query.count()
-    pending_orders = Order.query.filter_by(status='pending').count()
+    # Totals are maintained incrementally in one row instead of COUNT(*) scans
+    stats = get_stats()
     
-    recent_orders = Order.query.order_by(Order.date_created.desc()).limit(10).all()
+    recent_orders = Order.query.options(joinedload(Order.user)).order_by(Order.date_created.desc()).limit(10).all()
     
     return render_template('admin/dashboard.html',
-                         total_products=total_products,
-                         total_orders=total_orders,
-                         total_users=total_users,
-                         pending_orders=pending_orders,
+                         total_products=stats.total_products,
+                         total_orders=stats.total_orders,
+                         total_users=stats.total_users,
+                         pending_orders=stats.pending_orders,
+                         date_reconciled=stats.date_reconciled,
                          recent_orders=recent_orders,
                          user=current_user)
 
+@admin.route('/stats/reconcile', methods=['POST'])
+@admin_required
+def reconcile_stats():
+    """Recount the dashboard totals from the source tables"""
+    drift = {name: delta for name, delta in reconcile().items() if delta}
+    if drift:
+        details = ', '.join(f'{name.replace("_", " ")} {delta:+d}' for name, delta in drift.items())
+        flash(f'Dashboard totals corrected: {details}', category='info')
+    else:
+        flash('Dashboard totals were already accurate.', category='success')
+    return redirect(url_for('admin.dashboard'))
+
+REPORT_RANGES = (7, 30, 90, 365)
+
+@admin.route('/reports')
+@admin_required
+@query_budget(13)
+def reports():
+    days = request.args.get('days', 30, type=int)
+    if days not in REPORT_RANGES:
+        days = 30
+    group = request.args.get('group', 'day')
+    if group not in GROUPINGS:
+        group = 'day'
+    
+    # Fold in orders placed since the last look before reading the rollups
+    refresh_rollups()
+    
+    end = datetime.utcnow().date()
+    start = end - timedelta(days=days - 1)
+    return render_template('admin/reports.html',
+                         report=SalesReport(start, end, group),
+                         top_products=top_products(start, end),
+                         categories=sales_by_category(start, end),
+                         statuses=orders_by_status(start, end),
+                         days=days,
+                         group=group,
+                         report_ranges=REPORT_RANGES,
+                         groupings=GROUPINGS,
+                         user=current_user)
+
+@admin.route('/export/<name>.<fmt>')
+@admin_required
+def export(name, fmt):
+    """Stream orders, products or the waitlist as CSV or JSON lines"""
+    if name not in EXPORTS or fmt not in EXPORT_FORMATS:
+        abort(404)
+    filename = f'stat-global-{name}-{datetime.utcnow():%Y%m%d-%H%M%S}.{fmt}'
+    return Response(
+        stream_with_context(export_lines(name, fmt)),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@admin.route('/query-stats')
+@admin_required
+def query_stats():
+    """Per-endpoint SQL statement counts, DB time and repeated statements"""
+    return jsonify(current_app.extensions['query_stats'].snapshot())
+
+@admin.route('/cache-stats')
+@admin_required
+def cache_stats():
+    """Hit/miss counters and size of the rendered-page fragment cache"""
+    return jsonify(current_app.extensions['page_cache'].stats())
+
 @admin.route('/products')
 @admin_required
+@query_budget(4)
 def products():
-    products = Product.query.order_by(Product.date_created.desc()).all()
-    categories = Category.query.all()
-    return render_template('admin/products.html', products=products, categories=categories, user=current_user)
+    # Rows are fetched in chunks while the page streams out
+    products = RowStream(Product.query.options(joinedload(Product.category)).order_by(Product.date_created.desc()))
+    categories = get_categories()
+    return stream_template('admin/products.html', products=products, categories=categories, user=current_user)
 
 @admin.route('/products/add', methods=['GET', 'POST'])
 @admin_required
 def add_product():
     if request.method == 'POST':
+        # Originals are saved here; resizing happens on the derivative pool
+        try:
+            uploads = form_uploads(request.files, UPLOAD_FIELDS)
+        except UploadError as e:
+            flash(str(e), category='error')
+            return redirect(url_for('admin.add_product'))
+        
         name = request.form.get('name')
         slug = request.form.get('slug') or name.lower().replace(' ', '-')
         description = request.form.get('description')
@@ -56,7 +145,7 @@ def add_product():
         sku = request.form.get('sku')
         inventory = int(request.form.get('inventory', 0))
         category_id = int(request.form.get('category_id'))
-        image_url = request.form.get('image_url')
+        image_url = uploads['image_file'][0] if 'image_file' in uploads else request.form.get('image_url')
         is_featured = request.form.get('is_featured') == 'on'
         
         # New product detail fields
@@ -67,24 +156,6 @@ def add_product():
         fabric_type = request.form.get('fabric_type')
         product_details = request.form.get('product_details')
         
-        # Handle multiple images (on body, on ground, photoshoot)
-        images_list = []
-        on_body_image = request.form.get('on_body_image', '').strip()
-        on_ground_image = request.form.get('on_ground_image', '').strip()
-        photoshoot_image = request.form.get('photoshoot_image', '').strip()
-        additional_image = request.form.get('additional_image', '').strip()
-        
-        if on_body_image:
-            images_list.append({'type': 'on_body', 'url': on_body_image})
-        if on_ground_image:
-            images_list.append({'type': 'on_ground', 'url': on_ground_image})
-        if photoshoot_image:
-            images_list.append({'type': 'photoshoot', 'url': photoshoot_image})
-        if additional_image:
-            images_list.append({'type': 'additional', 'url': additional_image})
-        
-        images_json = json.dumps(images_list) if images_list else None
-        
         product = Product(
             name=name,
             slug=slug,
@@ -95,7 +166,7 @@ def add_product():
             inventory=inventory,
             category_id=category_id,
             image_url=image_url,
-            images=images_json,
+            gallery=gallery_from_form(request.form, uploads),
             is_featured=is_featured,
             shipping_details=shipping_details if shipping_details else None,
             size_chart=size_chart if size_chart else None,
@@ -106,11 +177,14 @@ def add_product():
         )
         
         db.session.add(product)
+        db.session.flush()
+        index_product(product)
+        adjust(total_products=1)
         db.session.commit()
         flash('Product added successfully!', category='success')
         return redirect(url_for('admin.products'))
     
-    categories = Category.query.all()
+    categories = get_categories()
     return render_template('admin/add_product.html', categories=categories, user=current_user)
 
 @admin.route('/products/edit/<int:product_id>', methods=['GET', 'POST'])
@@ -119,6 +193,12 @@ def edit_product(product_id):
     product = Product.query.get_or_404(product_id)
     
     if request.method == 'POST':
+        try:
+            uploads = form_uploads(request.files, UPLOAD_FIELDS)
+        except UploadError as e:
+            flash(str(e), category='error')
+            return redirect(url_for('admin.edit_product', product_id=product.id))
+        
         product.name = request.form.get('name')
         product.slug = request.form.get('slug')
         product.description = request.form.get('description')
@@ -128,7 +208,7 @@ def edit_product(product_id):
         product.sku = request.form.get('sku')
         product.inventory = int(request.form.get('inventory', 0))
         product.category_id = int(request.form.get('category_id'))
-        product.image_url = request.form.get('image_url')
+        product.image_url = uploads['image_file'][0] if 'image_file' in uploads else request.form.get('image_url')
         product.is_featured = request.form.get('is_featured') == 'on'
         product.is_active = request.form.get('is_active') == 'on'
         
@@ -140,52 +220,63 @@ def edit_product(product_id):
         product.fabric_type = request.form.get('fabric_type') or None
         product.product_details = request.form.get('product_details') or None
         
-        # Handle multiple images
-        images_list = []
-        on_body_image = request.form.get('on_body_image', '').strip()
-        on_ground_image = request.form.get('on_ground_image', '').strip()
-        photoshoot_image = request.form.get('photoshoot_image', '').strip()
-        additional_image = request.form.get('additional_image', '').strip()
-        
-        if on_body_image:
-            images_list.append({'type': 'on_body', 'url': on_body_image})
-        if on_ground_image:
-            images_list.append({'type': 'on_ground', 'url': on_ground_image})
-        if photoshoot_image:
-            images_list.append({'type': 'photoshoot', 'url': photoshoot_image})
-        if additional_image:
-            images_list.append({'type': 'additional', 'url': additional_image})
-        
-        product.images = json.dumps(images_list) if images_list else None
+        # Replace the gallery; orphaned ProductImage rows are deleted
+        product.gallery = gallery_from_form(request.form, uploads)
+        # Gallery edits don't touch product columns, so bump the timestamp the
+        # page caches and ETags key on explicitly
+        product.date_updated = datetime.utcnow()
         
+        index_product(product)
         db.session.commit()
         flash('Product updated successfully!', category='success')
         return redirect(url_for('admin.products'))
     
-    # Parse existing images for editing
-    product_images = []
-    if product.images:
+    categories = get_categories()
+    return render_template('admin/edit_product.html', product=product, categories=categories, product_images=product.gallery, user=current_user)
+
+@admin.route('/products/import', methods=['GET', 'POST'])
+@admin_required
+def import_products_view():
+    result = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        fmt = os.path.splitext(upload.filename)[1].lstrip('.').lower() if upload and upload.filename else ''
+        if fmt in ('json', 'ndjson'):
+            fmt = 'jsonl'
+        if fmt not in IMPORT_FORMATS:
+            flash('Please upload a .csv or .jsonl file.', category='error')
+            return redirect(url_for('admin.import_products_view'))
+        
+        dry_run = request.form.get('dry_run') == 'on'
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
         try:
-            product_images = json.loads(product.images)
-        except:
-            product_images = []
+            result = import_products(stream, fmt, dry_run=dry_run)
+        except (csv.Error, UnicodeDecodeError) as e:
+            flash(f'Could not read the file: {e}', category='error')
+            return redirect(url_for('admin.import_products_view'))
     
-    categories = Category.query.all()
-    return render_template('admin/edit_product.html', product=product, categories=categories, product_images=product_images, user=current_user)
+    return render_template('admin/import_products.html', result=result, user=current_user)
 
 @admin.route('/products/delete/<int:product_id>')
 @admin_required
 def delete_product(product_id):
     product = Product.query.get_or_404(product_id)
+    remove_product(product.id)
     db.session.delete(product)
+    adjust(total_products=-1)
     db.session.commit()
     flash('Product deleted successfully!', category='success')
     return redirect(url_for('admin.products'))
 
 @admin.route('/categories')
 @admin_required
+@query_budget(4)
 def categories():
-    all_categories = Category.query.all()
+    all_categories = get_categories()
+    # Count products per category in one grouped query instead of loading them
+    product_counts = dict(
+        db.session.query(Product.category_id, func.count(Product.id)).group_by(Product.category_id).all()
+    )
     # Separate parent and child categories
     parent_categories = [c for c in all_categories if c.parent_id is None]
     child_categories = [c for c in all_categories if c.parent_id is not None]
@@ -193,6 +284,7 @@ def categories():
                          categories=all_categories,
                          parent_categories=parent_categories,
                          child_categories=child_categories,
+                         product_counts=product_counts,
                          user=current_user)
 
 @admin.route('/categories/add', methods=['POST'])
@@ -207,6 +299,7 @@ def add_category():
     category = Category(name=name, slug=slug, description=description, image_url=image_url, parent_id=parent_id if parent_id else None)
     db.session.add(category)
     db.session.commit()
+    invalidate_categories()
     flash('Category added successfully!', category='success')
     return redirect(url_for('admin.categories'))
 
@@ -214,27 +307,41 @@ def add_category():
 @admin_required
 def delete_category(category_id):
     category = Category.query.get_or_404(category_id)
+    # The products relationship cascades; drop them from the search index
+    # and the dashboard totals too
+    product_ids = [product_id for (product_id,) in
+                   db.session.query(Product.id).filter(Product.category_id == category.id)]
+    remove_products(product_ids)
     db.session.delete(category)
+    adjust(total_products=-len(product_ids))
     db.session.commit()
+    invalidate_categories()
     flash('Category deleted successfully!', category='success')
     return redirect(url_for('admin.categories'))
 
 @admin.route('/orders')
 @admin_required
+@query_budget(3)
 def orders():
-    orders = Order.query.order_by(Order.date_created.desc()).all()
-    return render_template('admin/orders.html', orders=orders, user=current_user)
+    orders = RowStream(Order.query.options(joinedload(Order.user)).order_by(Order.date_created.desc()))
+    return stream_template('admin/orders.html', orders=orders, user=current_user)
 
 @admin.route('/orders/<int:order_id>')
 @admin_required
+@query_budget(4)
 def order_detail(order_id):
-    order = Order.query.get_or_404(order_id)
+    order = Order.query.options(
+        joinedload(Order.user),
+        selectinload(Order.items).joinedload(OrderItem.product)
+    ).get_or_404(order_id)
     return render_template('admin/order_detail.html', order=order, user=current_user)
 
 @admin.route('/orders/<int:order_id>/update-status', methods=['POST'])
 @admin_required
 def update_order_status(order_id):
     order = Order.query.get_or_404(order_id)
+    order_status_changed(order.status, request.form.get('status'))
+    move_order_status(order, order.status, request.form.get('status'))
     order.status = request.form.get('status')
     order.payment_status = request.form.get('payment_status')
     db.session.commit()
@@ -0,0 +1,221 @@
+"""
+Sales analytics over precomputed daily rollups.
+
+Reporting straight off Order/OrderItem would scan every order ever placed.
+Instead refresh_rollups() folds the orders placed since its last run into
+two small tables, one row per day and status (orders, units, revenue) and one per
+day, product and status (units, revenue), using set-based INSERT ... SELECT
+... ON CONFLICT statements. When an admin changes an order's status its
+totals are moved between status rows. Reports read the rollups as plain
+column tuples, scatter them into one array per measure (a slot per day)
+and sum contiguous slices for weekly or monthly buckets, so a year of
+history is a few hundred rows however many orders it holds.
+"""
+
+from array import array
+from datetime import timedelta
+
+from sqlalchemy import select, update, func, desc
+
+from . import db
+from .models import Order, OrderItem, Product, SalesDaily, SalesDailyProduct, RollupWatermark
+from .cart import upsert_insert
+from .category_cache import get_category_tree
+
+ROLLUP = 'sales'
+# Cancelled orders are kept in the rollups but left out of revenue reports
+REVENUE_STATUSES = ('pending', 'processing', 'shipped', 'delivered')
+GROUPINGS = ('day', 'week', 'month')
+
+
+def _watermark():
+    return db.session.query(RollupWatermark.last_id).filter_by(name=ROLLUP).scalar() or 0
+
+
+def _claim(start, end):
+    """Advance the watermark from start to end; False if another worker already has"""
+    table = RollupWatermark.__table__
+    db.session.execute(
+        upsert_insert(table).values(name=ROLLUP, last_id=0).on_conflict_do_nothing(index_elements=[table.c.name])
+    )
+    claimed = db.session.execute(
+        update(table).where(table.c.name == ROLLUP, table.c.last_id == start).values(last_id=end)
+    ).rowcount
+    return claimed == 1
+
+
+def _fold(table, key, measures, rows):
+    """INSERT the grouped rows, adding measures onto rows that already exist"""
+    stmt = upsert_insert(table).from_select(key + list(measures), rows)
+    set_ = {name: table.c[name] + stmt.excluded[name] for name in measures}
+    if 'category_id' in measures:
+        set_['category_id'] = stmt.excluded.category_id
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[table.c[name] for name in key], set_=set_
+    ))
+
+
+def refresh_rollups():
+    """Fold orders placed since the last refresh into the daily rollups and commit"""
+    start = _watermark()
+    end = db.session.query(func.max(Order.id)).scalar() or 0
+    if end <= start:
+        return
+    # Claiming the range first makes concurrent refreshes fold each order once
+    if not _claim(start, end):
+        db.session.rollback()
+        return
+
+    window = (Order.id > start, Order.id <= end)
+    day = func.date(Order.date_created)
+    _fold(
+        SalesDaily.__table__, ['day', 'status'], ('orders', 'revenue'),
+        select(day, Order.status, func.count(Order.id), func.sum(Order.total_amount))
+        .where(*window).group_by(day, Order.status)
+    )
+    # Units come from the item rows, so they are folded in a second pass
+    _fold(
+        SalesDaily.__table__, ['day', 'status'], ('units',),
+        select(day, Order.status, func.sum(OrderItem.quantity))
+        .select_from(OrderItem).join(Order, OrderItem.order_id == Order.id)
+        .where(*window).group_by(day, Order.status)
+    )
+    _fold(
+        SalesDailyProduct.__table__, ['day', 'product_id', 'status'], ('category_id', 'units', 'revenue'),
+        select(
+            day, OrderItem.product_id, Order.status, Product.category_id,
+            func.sum(OrderItem.quantity), func.sum(OrderItem.quantity * OrderItem.price)
+        )
+        .select_from(OrderItem).join(Order, OrderItem.order_id == Order.id)
+        .outerjoin(Product, OrderItem.product_id == Product.id)
+        .where(*window).group_by(day, OrderItem.product_id, Order.status, Product.category_id)
+    )
+    db.session.commit()
+
+
+def _add(model, key, deltas, **values):
+    table = model.__table__
+    stmt = upsert_insert(table).values(**key, **deltas, **values)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[table.c[name] for name in key],
+        set_={name: table.c[name] + stmt.excluded[name] for name in deltas}
+    ))
+
+
+def move_order_status(order, old_status, new_status):
+    """Move an already folded order's totals to its new status row (caller commits)"""
+    if old_status == new_status or order.id > _watermark():
+        return
+    day = order.date_created.date()
+    lines = db.session.query(
+        OrderItem.product_id, Product.category_id,
+        func.sum(OrderItem.quantity), func.sum(OrderItem.quantity * OrderItem.price)
+    ).outerjoin(Product, OrderItem.product_id == Product.id).filter(
+        OrderItem.order_id == order.id
+    ).group_by(OrderItem.product_id, Product.category_id).all()
+    order_units = sum(units for _, _, units, _ in lines)
+
+    for status, sign in ((old_status, -1), (new_status, 1)):
+        _add(SalesDaily, {'day': day, 'status': status},
+             {'orders': sign, 'units': sign * order_units, 'revenue': sign * order.total_amount})
+    for product_id, category_id, units, revenue in lines:
+        for status, sign in ((old_status, -1), (new_status, 1)):
+            _add(SalesDailyProduct, {'day': day, 'product_id': product_id, 'status': status},
+                 {'units': sign * units, 'revenue': sign * revenue}, category_id=category_id)
+
+
+def _buckets(start, end, group):
+    """(first day, start offset, end offset) of each day/week/month bucket in the range"""
+    buckets = []
+    day = start
+    while day <= end:
+        if group == 'week':
+            next_day = day + timedelta(days=7 - day.weekday())
+        elif group == 'month':
+            next_day = (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+        else:
+            next_day = day + timedelta(days=1)
+        next_day = min(next_day, end + timedelta(days=1))
+        buckets.append((day, (day - start).days, (next_day - start).days))
+        day = next_day
+    return buckets
+
+
+def _daily_columns(model, measures, start, end, statuses):
+    """One array per measure with a slot for every day in the range"""
+    days = (end - start).days + 1
+    columns = [array('d', bytes(8 * days)) for _ in measures]
+    rows = db.session.execute(
+        select(model.day, *(func.sum(measure) for measure in measures))
+        .where(model.day.between(start, end), model.status.in_(statuses))
+        .group_by(model.day)
+    ).all()
+    for day, *values in rows:
+        offset = (day - start).days
+        for column, value in zip(columns, values):
+            column[offset] = value or 0
+    return columns
+
+
+class SalesReport:
+    """Revenue, units, order count and average order value per bucket"""
+
+    def __init__(self, start, end, group='day', statuses=REVENUE_STATUSES):
+        self.start = start
+        self.end = end
+        self.group = group
+        orders, units, revenue = _daily_columns(
+            SalesDaily, (SalesDaily.orders, SalesDaily.units, SalesDaily.revenue), start, end, statuses
+        )
+
+        buckets = _buckets(start, end, group)
+        self.labels = [day for day, _, _ in buckets]
+        self.orders = array('d', (sum(orders[a:b]) for _, a, b in buckets))
+        self.revenue = array('d', (sum(revenue[a:b]) for _, a, b in buckets))
+        self.units = array('d', (sum(units[a:b]) for _, a, b in buckets))
+        self.aov = array('d', (r / o if o else 0.0 for r, o in zip(self.revenue, self.orders)))
+
+        self.total_orders = int(sum(orders))
+        self.total_revenue = sum(revenue)
+        self.total_units = int(sum(units))
+        self.average_order_value = self.total_revenue / self.total_orders if self.total_orders else 0.0
+        self.peak_revenue = max(self.revenue, default=0.0)
+
+    def rows(self):
+        return zip(self.labels, self.revenue, self.units, self.orders, self.aov)
+
+
+def top_products(start, end, limit=10, statuses=REVENUE_STATUSES):
+    """Best-selling products by revenue; name is None for deleted products"""
+    units = func.sum(SalesDailyProduct.units).label('units')
+    revenue = func.sum(SalesDailyProduct.revenue).label('revenue')
+    return db.session.query(
+        SalesDailyProduct.product_id, Product.name, units, revenue
+    ).outerjoin(Product, SalesDailyProduct.product_id == Product.id).filter(
+        SalesDailyProduct.day.between(start, end), SalesDailyProduct.status.in_(statuses)
+    ).group_by(SalesDailyProduct.product_id, Product.name).having(units > 0).order_by(
+        desc('revenue')
+    ).limit(limit).all()
+
+
+def sales_by_category(start, end, statuses=REVENUE_STATUSES):
+    """[(category name, units, revenue)] sorted by revenue"""
+    tree = get_category_tree()
+    rows = db.session.query(
+        SalesDailyProduct.category_id,
+        func.sum(SalesDailyProduct.units), func.sum(SalesDailyProduct.revenue)
+    ).filter(
+        SalesDailyProduct.day.between(start, end), SalesDailyProduct.status.in_(statuses)
+    ).group_by(SalesDailyProduct.category_id).all()
+    named = []
+    for category_id, units, revenue in rows:
+        category = tree.get(category_id) if category_id is not None else None
+        named.append((category.name if category else 'Uncategorized', units, revenue))
+    return sorted(named, key=lambda row: row[2], reverse=True)
+
+
+def orders_by_status(start, end):
+    """[(status, orders, revenue)] over every status, cancelled included"""
+    return db.session.query(
+        SalesDaily.status, func.sum(SalesDaily.orders), func.sum(SalesDaily.revenue)
+    ).filter(SalesDaily.day.between(start, end)).group_by(SalesDaily.status).order_by(SalesDaily.status).all()
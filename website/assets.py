@@ -0,0 +1,246 @@
+"""
+Fingerprinted, precompressed static assets.
+
+`flask --app main build-assets` does the following for every asset under
+the static folder:
+- copies it next to itself with a content hash in the name
+  (css/styles.css -> css/styles.1a2b3c4d5e.css)
+- writes .gz and, when the optional `brotli` package is installed, .br
+  siblings for text formats when compression helps
+- records the mapping in ASSET_MANIFEST
+
+CSS url() references to other fingerprinted assets are rewritten first.
+Uploaded product images (UPLOAD_FOLDER) are already content-hashed and
+are skipped.
+
+The manifest is read once when the app starts. url_for('static', ...) then
+returns the fingerprinted name, and the static route serves those names
+with a one-year immutable Cache-Control. It picks the .br or .gz sibling
+the client accepts. Any edit produces a new name, so nothing needs
+revalidating. Without a manifest, static files are served as before. The
+same layout works with nginx's gzip_static/brotli_static when a front-end
+server takes over /static.
+
+Rebuild after changing anything under website/static. Add --clean to delete
+fingerprinted files from older builds once no cached page refers to them.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+
+import click
+from flask import current_app, request, send_from_directory
+from flask.cli import with_appcontext
+
+try:
+    import brotli
+except ImportError:  # Optional: .br siblings are skipped without it
+    brotli = None
+
+log = logging.getLogger(__name__)
+
+ASSET_EXTENSIONS = {'.css', '.js', '.svg', '.png', '.jpg', '.jpeg', '.gif', '.webp', '.ico',
+                    '.woff', '.woff2', '.ttf', '.otf', '.json', '.txt', '.map'}
+# Formats worth precompressing; images and web fonts are compressed already
+COMPRESSIBLE = {'.css', '.js', '.svg', '.ico', '.ttf', '.otf', '.json', '.txt', '.map'}
+# Smallest file worth compressing, and the least saving worth a sibling
+MIN_COMPRESS_BYTES = 256
+MIN_SAVING = 0.9
+
+# Content-Encoding -> sibling suffix, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+_FINGERPRINT_RE = re.compile(r'\.[0-9a-f]{10}\.[^./]+$')
+_CSS_URL_RE = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+def fingerprinted_name(name, data):
+    base, ext = os.path.splitext(name)
+    return f'{base}.{hashlib.sha256(data).hexdigest()[:10]}{ext}'
+
+
+def _rewrite_css(source, data, manifest):
+    """Point url() references at the fingerprinted names already in `manifest`"""
+    directory = os.path.dirname(source)
+
+    def replace(match):
+        quote, url = match.groups()
+        if url.startswith(('data:', 'http:', 'https:', '//', '#')):
+            return match.group(0)
+        path, sep, suffix = url.partition('?')
+        if path.startswith('/'):
+            return match.group(0)  # Root-relative URLs can't be resolved against the static folder
+        target = os.path.normpath(os.path.join(directory, path)).replace(os.sep, '/')
+        if target not in manifest:
+            return match.group(0)
+        rewritten = os.path.relpath(manifest[target], directory or '.').replace(os.sep, '/')
+        return f'url({quote}{rewritten}{sep}{suffix}{quote})'
+
+    return _CSS_URL_RE.sub(replace, data.decode('utf-8')).encode('utf-8')
+
+
+def _write_if_changed(path, data):
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return
+    except OSError:
+        pass
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _compress(path, data):
+    """Write .gz/.br siblings that are worth it; returns the encodings written"""
+    if len(data) < MIN_COMPRESS_BYTES:
+        return []
+    written = []
+    # mtime=0 keeps rebuilds byte-identical
+    candidates = [('gzip', '.gz', gzip.compress(data, 9, mtime=0))]
+    if brotli is not None:
+        candidates.insert(0, ('br', '.br', brotli.compress(data, quality=11)))
+    for encoding, suffix, compressed in candidates:
+        if len(compressed) <= len(data) * MIN_SAVING:
+            _write_if_changed(path + suffix, compressed)
+            written.append(encoding)
+    return written
+
+
+def source_assets(static_folder, skip=()):
+    """Asset paths relative to the static folder, leaving out build output and `skip` paths"""
+    found = []
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) not in skip)
+        for name in sorted(files):
+            ext = os.path.splitext(name)[1].lower()
+            if (ext in ASSET_EXTENSIONS and not _FINGERPRINT_RE.search(name)
+                    and os.path.join(root, name) not in skip):
+                found.append(os.path.relpath(os.path.join(root, name), static_folder).replace(os.sep, '/'))
+    return found
+
+
+def build_assets(static_folder, manifest_path, skip=(), clean=False):
+    """
+    Fingerprint and precompress every asset and write the manifest.
+
+    Returns the manifest: {source name: {'file': fingerprinted name,
+    'encodings': [...]}}.
+    """
+    skip = {os.path.abspath(path) for path in skip} | {os.path.abspath(manifest_path)}
+    static_folder = os.path.abspath(static_folder)
+    sources = source_assets(static_folder, skip)
+    # CSS last, so its url() references can point at fingerprinted files
+    sources.sort(key=lambda name: name.endswith('.css'))
+
+    names = {}
+    manifest = {}
+    for source in sources:
+        with open(os.path.join(static_folder, source), 'rb') as f:
+            data = f.read()
+        if source.endswith('.css'):
+            data = _rewrite_css(source, data, names)
+        target = fingerprinted_name(source, data)
+        path = os.path.join(static_folder, target)
+        _write_if_changed(path, data)
+        encodings = _compress(path, data) if os.path.splitext(source)[1].lower() in COMPRESSIBLE else []
+        names[source] = target
+        manifest[source] = {'file': target, 'encodings': encodings}
+
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    if clean:
+        keep = {entry['file'] for entry in manifest.values()}
+        for root, dirs, files in os.walk(static_folder):
+            dirs[:] = [d for d in dirs if os.path.join(root, d) not in skip]
+            for name in files:
+                stem = name[:-3] if name.endswith(('.gz', '.br')) else name
+                relative = os.path.relpath(os.path.join(root, stem), static_folder).replace(os.sep, '/')
+                if _FINGERPRINT_RE.search(stem) and relative not in keep:
+                    os.unlink(os.path.join(root, name))
+    return manifest
+
+
+class AssetManifest:
+    """Source name -> fingerprinted name, plus the encodings on disk for each"""
+
+    def __init__(self, entries):
+        self.files = {source: entry['file'] for source, entry in entries.items()}
+        self.encodings = {entry['file']: frozenset(entry['encodings']) for entry in entries.values()}
+        # Changes with every build that renames a file; pages' ETags include it
+        self.version = hashlib.sha1(json.dumps(self.files, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path) as f:
+                return cls(json.load(f))
+        except FileNotFoundError:
+            return cls({})
+        except ValueError:
+            log.warning('Ignoring unreadable asset manifest %s', path)
+            return cls({})
+
+
+def manifest_path(app):
+    return os.path.join(app.static_folder, app.config['ASSET_MANIFEST'])
+
+
+def _fingerprint_url(endpoint, values):
+    if endpoint == 'static':
+        filename = values.get('filename')
+        if filename is not None:
+            values['filename'] = current_app.extensions['assets'].files.get(filename, filename)
+
+
+def serve_static(filename):
+    """The static route, with immutable caching and precompressed variants for fingerprinted files"""
+    app = current_app
+    encodings = app.extensions['assets'].encodings.get(filename)
+    if encodings is None:
+        return app.send_static_file(filename)
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    for encoding, suffix in ENCODINGS:
+        if encoding in encodings and request.accept_encodings[encoding]:
+            response = send_from_directory(app.static_folder, filename + suffix, mimetype=mimetype,
+                                           max_age=IMMUTABLE_MAX_AGE)
+            response.content_encoding = encoding
+            break
+    else:
+        response = send_from_directory(app.static_folder, filename, max_age=IMMUTABLE_MAX_AGE)
+    if encodings:
+        response.vary.add('Accept-Encoding')
+    response.cache_control.immutable = True
+    return response
+
+
+def init_assets(app):
+    app.extensions['assets'] = AssetManifest.load(manifest_path(app)) \
+        if app.config['ASSET_FINGERPRINTS_ENABLED'] else AssetManifest({})
+    app.url_defaults(_fingerprint_url)
+    if app.has_static_folder:
+        app.view_functions['static'] = serve_static
+    app.cli.add_command(build_assets_command)
+
+
+@click.command('build-assets')
+@click.option('--clean', is_flag=True, help='Delete fingerprinted files left over from older builds.')
+@with_appcontext
+def build_assets_command(clean):
+    """Fingerprint and precompress static assets and write the manifest."""
+    app = current_app
+    # Uploaded product images are content-hashed already
+    skip = {app.extensions['uploads'].folder} if 'uploads' in app.extensions else set()
+    manifest = build_assets(app.static_folder, manifest_path(app), skip=skip, clean=clean)
+    compressed = sum(1 for entry in manifest.values() if entry['encodings'])
+    click.echo(f'OK: Fingerprinted {len(manifest)} assets ({compressed} precompressed)'
+               + ('' if brotli else '; install brotli for .br files'))
+    click.echo('Restart the app to pick up the new manifest')
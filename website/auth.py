@@ -1,20 +1,43 @@
+import math
+
 from flask import Blueprint, render_template, request, flash, redirect, url_for
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import login_user, login_required, logout_user, current_user
 from . import db
 from .models import User
+from .store_stats import adjust
+from .passwords import hash_password, verify_password, auth_retry_after, HashingBusy
 
 auth = Blueprint('auth', __name__)
 
+def throttled(template, retry_after):
+    """429 response asking the client to wait before trying again"""
+    seconds = math.ceil(retry_after)
+    flash(f'Too many attempts. Please try again in {seconds} seconds.', category='error')
+    return render_template(template, user=current_user), 429, {'Retry-After': str(seconds)}
+
+def hashing_busy(template):
+    flash('We\'re handling a lot of sign-ins right now. Please try again in a moment.', category='error')
+    return render_template(template, user=current_user), 503, {'Retry-After': '5'}
+
 @auth.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         email = request.form.get('email')
         password = request.form.get('password')
         
+        # Throttle before any lookup or hash work
+        retry_after = auth_retry_after(email)
+        if retry_after:
+            return throttled('auth/login.html', retry_after)
+        
         user = User.query.filter_by(email=email).first()
         if user:
-            if check_password_hash(user.password, password):
+            try:
+                verified = verify_password(user, password)
+            except HashingBusy:
+                return hashing_busy('auth/login.html')
+            if verified:
+                db.session.commit()  # Saves the upgraded hash, if any
                 flash('Logged in successfully!', category='success')
                 login_user(user, remember=True)
                 return redirect(url_for('views.home'))
@@ -40,6 +63,10 @@ def sign_up():
         password1 = request.form.get('password1')
         password2 = request.form.get('password2')
         
+        retry_after = auth_retry_after()
+        if retry_after:
+            return throttled('auth/signup.html', retry_after)
+        
         user = User.query.filter_by(email=email).first()
         if user:
             flash('Email already exists.', category='error')
@@ -52,13 +79,18 @@ def sign_up():
         elif len(password1) < 7:
             flash('Password must be at least 7 characters.', category='error')
         else:
+            try:
+                password = hash_password(password1)
+            except HashingBusy:
+                return hashing_busy('auth/signup.html')
             new_user = User(
                 email=email,
                 first_name=first_name,
                 last_name=last_name,
-                password=generate_password_hash(password1, method='pbkdf2:sha256')
+                password=password
             )
             db.session.add(new_user)
+            adjust(total_users=1)
             db.session.commit()
             login_user(new_user, remember=True)
             flash('Account created!', category='success')
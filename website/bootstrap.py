@@ -0,0 +1,119 @@
+"""
+Database bootstrap and seeding, kept out of create_app().
+
+create_app() does no database I/O, so worker processes and scripts start
+without touching the schema. The schema, pending migrations, the search
+index, the dashboard totals row, the default admin and the default
+categories are set up once per deploy with:
+
+    flask --app main bootstrap
+
+Every step is idempotent, so running it again only fills in what is missing.
+"""
+
+import click
+from flask.cli import with_appcontext
+
+from . import db, ADMIN_EMAIL, ADMIN_PASSWORD, ADMIN_FIRST_NAME, ADMIN_LAST_NAME
+from .models import User, Category
+from .passwords import hash_password
+
+# Parent category -> subcategories created by seed_categories()
+DEFAULT_CATEGORIES = {
+    'Mensware': ['Shirts', 'Hoodies', 'Hats', 'Artwork', 'Exclusive Catalog'],
+    'Womensware': ['Shirts', 'Hoodies', 'Hats', 'Artwork', 'Exclusive Catalog'],
+    'Global Babies/Kids': ['Shirts', 'Hoodies', 'Hats', 'Artwork', 'Exclusive Catalog'],
+}
+
+
+def create_schema(log=print):
+    """Create missing tables, apply pending migrations and the search/stats tables"""
+    from .migrations import run_migrations
+    from .search import ensure_search_index
+    from .store_stats import ensure_store_stats
+
+    db.create_all()
+    run_migrations(db.engine, log=log)
+    ensure_search_index()
+    ensure_store_stats()
+
+
+def seed_default_admin(log=print):
+    """Create the default admin account if it doesn't exist"""
+    if db.session.query(User.id).filter_by(email=ADMIN_EMAIL).first():
+        return False
+    db.session.add(User(
+        email=ADMIN_EMAIL,
+        first_name=ADMIN_FIRST_NAME,
+        last_name=ADMIN_LAST_NAME,
+        password=hash_password(ADMIN_PASSWORD),
+        is_admin=True
+    ))
+    from .store_stats import adjust
+    adjust(total_users=1)
+    db.session.commit()
+    log(f"✓ Default admin account created: {ADMIN_EMAIL}")
+    return True
+
+
+def seed_categories(log=print):
+    """Create any missing default categories: one SELECT and at most two INSERT batches"""
+    existing = db.session.query(Category.id, Category.name, Category.slug).all()
+    parent_ids = {name: id for id, name, _ in existing}
+    slugs = {slug for _, _, slug in existing}
+
+    parents = {}
+    for parent_name in DEFAULT_CATEGORIES:
+        if parent_name not in parent_ids:
+            parents[parent_name] = Category(
+                name=parent_name,
+                slug=parent_name.lower().replace(' ', '-').replace('/', '-'),
+                description=f"{parent_name} collection"
+            )
+    db.session.add_all(parents.values())
+    db.session.flush()  # Get the IDs
+    parent_ids.update((name, category.id) for name, category in parents.items())
+    parent_slugs = {id: slug for id, _, slug in existing}
+    parent_slugs.update((category.id, category.slug) for category in parents.values())
+
+    created = len(parents)
+    for parent_name, subcategories in DEFAULT_CATEGORIES.items():
+        parent_id = parent_ids[parent_name]
+        for subcat_name in subcategories:
+            subcat_slug = f"{parent_slugs[parent_id]}-{subcat_name.lower().replace(' ', '-')}"
+            if subcat_slug not in slugs:
+                db.session.add(Category(
+                    name=f"{parent_name} - {subcat_name}",
+                    slug=subcat_slug,
+                    description=f"{subcat_name} in {parent_name}",
+                    parent_id=parent_id
+                ))
+                created += 1
+    db.session.commit()
+
+    if created:
+        from .category_cache import invalidate_categories
+        invalidate_categories()
+        log(f"OK: Created {created} default categories")
+    return created
+
+
+def bootstrap(seed=True, log=print):
+    """Everything a fresh database needs before the app can serve it (call in an app context)"""
+    create_schema(log=log)
+    if seed:
+        seed_default_admin(log=log)
+        seed_categories(log=log)
+
+
+@click.command('bootstrap')
+@click.option('--no-seed', is_flag=True, help='Only create and migrate the schema.')
+@with_appcontext
+def bootstrap_command(no_seed):
+    """Create and migrate the schema, then seed the default admin and categories."""
+    bootstrap(seed=not no_seed, log=click.echo)
+    click.echo('OK: Database ready')
+
+
+def init_cli(app):
+    app.cli.add_command(bootstrap_command)
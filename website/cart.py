@@ -0,0 +1,91 @@
+"""
+Single-statement cart and wishlist writes.
+
+Adding to the cart used to look up the product, look up an existing cart
+line and then insert or increment it: three round trips and a race between
+two tabs adding the same item. Both paths are now one INSERT ... SELECT ...
+ON CONFLICT statement against the unique (user, product, variant) index,
+which also checks in the same statement that the product exists and is
+active, and that the variant (if any) belongs to it.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import select, literal, literal_column, func
+from sqlalchemy.dialects import sqlite
+
+from . import db
+from .models import Product, ProductVariant, CartItem, WishlistItem
+
+
+def upsert_insert(table):
+    """Dialect-specific INSERT that supports ON CONFLICT"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        # Imported here: the PostgreSQL dialect is slow to import and unused on SQLite
+        from sqlalchemy.dialects import postgresql
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+
+def _active_product(product_id, *columns):
+    product = Product.__table__
+    return select(*columns).where(product.c.id == product_id, product.c.is_active == True)
+
+
+def add_cart_item(user_id, product_id, quantity=1, variant_id=None):
+    """
+    Add `quantity` of a product to the user's cart, merging with any
+    existing line for the same product and variant.
+
+    Returns the line's new quantity, or None if the product doesn't exist
+    or isn't active, or `variant_id` isn't one of its variants. The caller
+    commits.
+    """
+    cart = CartItem.__table__
+    product = Product.__table__
+    if variant_id is None:
+        rows = _active_product(
+            product_id,
+            literal(user_id), product.c.id, literal(None), literal(quantity), literal(datetime.utcnow())
+        )
+    else:
+        # Only a variant of this product: anything else selects no row
+        variant = ProductVariant.__table__
+        rows = _active_product(
+            product_id,
+            literal(user_id), product.c.id, variant.c.id, literal(quantity), literal(datetime.utcnow())
+        ).join_from(product, variant, (variant.c.id == variant_id) & (variant.c.product_id == product.c.id))
+    stmt = upsert_insert(cart).from_select(
+        ['user_id', 'product_id', 'variant_id', 'quantity', 'date_added'], rows
+    )
+    stmt = stmt.on_conflict_do_update(
+        # The target must match the index expression exactly, so the 0 is
+        # rendered inline rather than bound as a parameter
+        index_elements=[cart.c.user_id, cart.c.product_id, func.coalesce(cart.c.variant_id, literal_column('0'))],
+        set_={'quantity': cart.c.quantity + stmt.excluded.quantity}
+    ).returning(cart.c.quantity)
+    return db.session.execute(stmt).scalar()
+
+
+def add_wishlist_item(user_id, product_id):
+    """
+    Add a product to the user's wishlist.
+
+    Returns True if it was added, False if it was already there and None if
+    the product doesn't exist or isn't active. The caller commits.
+    """
+    wishlist = WishlistItem.__table__
+    product = Product.__table__
+    rows = _active_product(product_id, literal(user_id), product.c.id, literal(datetime.utcnow()))
+    stmt = upsert_insert(wishlist).from_select(['user_id', 'product_id', 'date_added'], rows)
+    stmt = stmt.on_conflict_do_nothing(index_elements=[wishlist.c.user_id, wishlist.c.product_id])
+    if db.session.execute(stmt).rowcount:
+        return True
+    # Nothing inserted: tell "already saved" apart from "no such product"
+    exists = WishlistItem.query.filter_by(user_id=user_id, product_id=product_id).first()
+    return False if exists else None
+
+
+def cart_count(user_id):
+    """Total units in the user's cart"""
+    return db.session.query(func.coalesce(func.sum(CartItem.quantity), 0)).filter_by(user_id=user_id).scalar()
@@ -0,0 +1,123 @@
+"""
+In-process cache of the category tree.
+
+Categories change a few times a year but are listed on most storefront and
+admin pages. The whole tree is built from one query into plain objects with
+parent/children links already resolved, so templates never trigger lazy
+loads. A generation counter in the cache_version table lets every worker
+notice admin edits made by another process; it is re-checked at most every
+CATEGORY_CACHE_CHECK_INTERVAL seconds.
+"""
+
+import threading
+import time
+
+from flask import current_app
+
+from . import db
+from .models import Category, CacheVersion
+
+CACHE_KEY = 'categories'
+
+
+class CachedCategory:
+    """Read-only snapshot of a Category row with its tree links"""
+
+    __slots__ = ('id', 'name', 'slug', 'description', 'image_url', 'parent_id', 'parent', 'children')
+
+    def __init__(self, row):
+        self.id = row.id
+        self.name = row.name
+        self.slug = row.slug
+        self.description = row.description
+        self.image_url = row.image_url
+        self.parent_id = row.parent_id
+        self.parent = None
+        self.children = []
+
+
+class CategoryTree:
+    """All categories, indexed by id and slug, with parents and children linked"""
+
+    def __init__(self, rows, generation):
+        self.generation = generation
+        self.categories = [CachedCategory(row) for row in rows]
+        self.by_id = {category.id: category for category in self.categories}
+        self.by_slug = {category.slug: category for category in self.categories}
+        for category in self.categories:
+            parent = self.by_id.get(category.parent_id)
+            if parent is not None:
+                category.parent = parent
+                parent.children.append(category)
+        self.roots = [category for category in self.categories if category.parent is None]
+
+    def get(self, category_id):
+        return self.by_id.get(category_id)
+
+    def descendant_ids(self, category_id):
+        """Ids of a category and everything below it"""
+        category = self.by_id.get(category_id)
+        if category is None:
+            return []
+        ids = []
+        stack = [category]
+        while stack:
+            node = stack.pop()
+            ids.append(node.id)
+            stack.extend(node.children)
+        return ids
+
+
+class CategoryCache:
+    def __init__(self, check_interval):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._tree = None
+        self._checked_at = 0.0
+
+    def get(self):
+        now = time.monotonic()
+        tree = self._tree
+        if tree is not None and now - self._checked_at < self.check_interval:
+            return tree
+
+        with self._lock:
+            generation = CacheVersion.current(CACHE_KEY)
+            if self._tree is None or self._tree.generation != generation:
+                rows = db.session.query(
+                    Category.id, Category.name, Category.slug, Category.description,
+                    Category.image_url, Category.parent_id
+                ).order_by(Category.id).all()
+                self._tree = CategoryTree(rows, generation)
+            self._checked_at = now
+            return self._tree
+
+    def clear(self):
+        with self._lock:
+            self._tree = None
+            self._checked_at = 0.0
+
+
+def init_category_cache(app):
+    app.extensions['category_cache'] = CategoryCache(app.config['CATEGORY_CACHE_CHECK_INTERVAL'])
+
+
+def get_category_tree():
+    return current_app.extensions['category_cache'].get()
+
+
+def get_categories():
+    """All categories in id order, served from memory"""
+    return get_category_tree().categories
+
+
+def invalidate_categories():
+    """
+    Mark the category tree stale in every worker.
+
+    Call after committing a category change: bumps the shared generation
+    and drops this process's copy so the next read rebuilds it.
+    """
+    CacheVersion.bump(CACHE_KEY)
+    db.session.commit()
+    current_app.extensions['category_cache'].clear()
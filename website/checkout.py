@@ -0,0 +1,199 @@
+"""
+Order placement with inventory reservation.
+
+Stock is reserved by conditional UPDATEs (`inventory >= requested`) that
+run as the first statements of a short write transaction, so SQLite takes
+its write lock immediately instead of upgrading from a read lock halfway
+through. Either every cart line is reserved and the order is written in
+the same transaction, or nothing changes and the shopper is told which
+lines are short. Writers that hit `database is locked` back off and retry.
+
+While the lock is held the work is kept to a fixed number of statements
+whatever the cart size: prices are snapshotted from the same read that
+checks the reservation, order items go in as one executemany and the cart
+is emptied with one set-based DELETE.
+"""
+
+import random
+import time
+import uuid
+from collections import defaultdict
+
+from flask import current_app
+from sqlalchemy import select, update, insert, delete, func
+from sqlalchemy.exc import OperationalError
+
+from . import db
+from .models import Product, ProductVariant, CartItem, Order, OrderItem
+from .store_stats import adjust
+
+
+class LineFailure:
+    """A cart line that could not be reserved"""
+
+    def __init__(self, cart_item_id, product_name, requested, available):
+        self.cart_item_id = cart_item_id
+        self.product_name = product_name
+        self.requested = requested
+        self.available = available
+
+    @property
+    def message(self):
+        if self.available <= 0:
+            return f'{self.product_name} is out of stock.'
+        return f'Only {self.available} of {self.product_name} left (you asked for {self.requested}).'
+
+
+class CheckoutError(Exception):
+    """Raised when the cart is empty or some lines can't be reserved"""
+
+    def __init__(self, message, failures=None):
+        super().__init__(message)
+        self.failures = failures or []
+
+
+def _is_locked(error):
+    return 'database is locked' in str(error.orig if hasattr(error, 'orig') else error)
+
+
+def _reserve_stock(user_id):
+    """
+    Decrement stock for every product and variant in the user's cart.
+
+    Returns (products_reserved, variants_reserved) row counts; a count lower
+    than the number of distinct products/variants in the cart means some
+    line didn't have enough stock and the transaction must be rolled back.
+    """
+    cart = CartItem.__table__
+    product = Product.__table__
+    variant = ProductVariant.__table__
+
+    wanted = select(func.sum(cart.c.quantity)).where(
+        cart.c.user_id == user_id, cart.c.product_id == product.c.id
+    ).scalar_subquery()
+    products_reserved = db.session.execute(
+        update(product)
+        .where(product.c.id.in_(select(cart.c.product_id).where(cart.c.user_id == user_id)))
+        .where(product.c.inventory >= wanted)
+        .values(inventory=product.c.inventory - wanted)
+    ).rowcount
+
+    # Only variants of the line's own product; a line pointing anywhere else
+    # reserves nothing, so the counts don't match and checkout fails
+    wanted = select(func.sum(cart.c.quantity)).where(
+        cart.c.user_id == user_id, cart.c.variant_id == variant.c.id, cart.c.product_id == variant.c.product_id
+    ).scalar_subquery()
+    variants_reserved = db.session.execute(
+        update(variant)
+        .where(variant.c.id.in_(select(cart.c.variant_id).where(
+            cart.c.user_id == user_id, cart.c.product_id == variant.c.product_id
+        )))
+        .where(variant.c.inventory >= wanted)
+        .values(inventory=variant.c.inventory - wanted)
+    ).rowcount
+
+    return products_reserved, variants_reserved
+
+
+def _cart_lines(user_id):
+    return db.session.query(
+        CartItem.id, CartItem.product_id, CartItem.variant_id, CartItem.quantity,
+        Product.name, Product.price, Product.inventory,
+        ProductVariant.inventory.label('variant_inventory'),
+        (Product.price + func.coalesce(ProductVariant.price_adjustment, 0)).label('unit_price')
+    ).join(Product, CartItem.product_id == Product.id).outerjoin(
+        ProductVariant,
+        (CartItem.variant_id == ProductVariant.id) & (ProductVariant.product_id == CartItem.product_id)
+    ).filter(CartItem.user_id == user_id).order_by(CartItem.id).all()
+
+
+def _stock_failures(lines):
+    """Work out which cart lines are short, from a fresh (unreserved) read"""
+    product_wanted = defaultdict(int)
+    variant_wanted = defaultdict(int)
+    for line in lines:
+        product_wanted[line.product_id] += line.quantity
+        if line.variant_id:
+            variant_wanted[line.variant_id] += line.quantity
+
+    failures = []
+    for line in lines:
+        available = line.inventory or 0
+        short = product_wanted[line.product_id] > available
+        if line.variant_id:
+            # None when the variant is gone or belongs to another product
+            variant_available = line.variant_inventory or 0
+            if variant_wanted[line.variant_id] > variant_available:
+                short = True
+                available = min(available, variant_available)
+        if short:
+            failures.append(LineFailure(line.id, line.name, line.quantity, available))
+    return failures
+
+
+def _place_order(user_id, shipping_address, billing_address, payment_method):
+    products_reserved, variants_reserved = _reserve_stock(user_id)
+    lines = _cart_lines(user_id)
+
+    if not lines:
+        db.session.rollback()
+        raise CheckoutError('Your cart is empty.')
+
+    expected_products = len({line.product_id for line in lines})
+    expected_variants = len({line.variant_id for line in lines if line.variant_id})
+    if products_reserved != expected_products or variants_reserved != expected_variants:
+        db.session.rollback()
+        failures = _stock_failures(_cart_lines(user_id))
+        raise CheckoutError('Some items in your cart are no longer available.', failures)
+
+    total_amount = sum(line.unit_price * line.quantity for line in lines)
+    order = Order(
+        order_number=f"STAT-{uuid.uuid4().hex[:8].upper()}",
+        user_id=user_id,
+        total_amount=total_amount,
+        shipping_address=shipping_address,
+        billing_address=billing_address,
+        payment_method=payment_method,
+        status='pending',
+        payment_status='pending'
+    )
+    db.session.add(order)
+    db.session.flush()
+
+    db.session.execute(insert(OrderItem.__table__), [
+        {
+            'order_id': order.id,
+            'product_id': line.product_id,
+            'quantity': line.quantity,
+            'price': line.unit_price,
+            'variant_id': line.variant_id,
+        }
+        for line in lines
+    ])
+    # The write lock has been held since _reserve_stock, so nothing can have
+    # been added to the cart since `lines` was read
+    db.session.execute(delete(CartItem.__table__).where(CartItem.__table__.c.user_id == user_id))
+    adjust(total_orders=1, pending_orders=1)
+
+    db.session.commit()
+    return order
+
+
+def place_order(user_id, shipping_address, billing_address, payment_method):
+    """
+    Reserve stock for the user's cart and turn it into an Order.
+
+    Raises CheckoutError (with per-line failures when stock ran out) and
+    leaves the database untouched if the order can't be placed.
+    """
+    attempts = current_app.config['CHECKOUT_LOCK_RETRIES'] + 1
+    delay = current_app.config['CHECKOUT_RETRY_DELAY']
+    for attempt in range(attempts):
+        try:
+            return _place_order(user_id, shipping_address, billing_address, payment_method)
+        except OperationalError as e:
+            db.session.rollback()
+            if not _is_locked(e) or attempt == attempts - 1:
+                raise
+            # Exponential backoff with jitter so retrying writers spread out
+            time.sleep(delay * (2 ** attempt) * (0.5 + random.random()))
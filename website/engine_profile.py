@@ -0,0 +1,135 @@
+"""
+Database engine profiles: connection pragmas and pool settings.
+
+SQLite's defaults suit a single desktop process, not a web app. With the
+rollback journal, every write blocks all readers, and foreign keys are not
+enforced. A profile is a named set of PRAGMAs that is run on every new
+DBAPI connection, together with pool sizing. `production` switches to WAL,
+so readers carry on while one writer commits. It also relaxes fsyncs to
+once per checkpoint, memory-maps the file, enlarges the page cache, waits
+out short lock contention instead of failing, and turns foreign keys on.
+
+The URI comes from DATABASE_URL when set, so a server database can be
+used without code changes. Pragmas only apply to SQLite; server databases
+get pre-ping and connection recycling instead. The read-only bind used by
+website.routing gets the same profile plus `query_only`.
+"""
+
+import os
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from . import db
+from .routing import READ_ONLY_BIND
+
+PROFILES = {
+    # SQLite's built-in behaviour: rollback journal, FULL sync, 2 MB cache
+    'default': {},
+    'production': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,  # negative means KiB, so 64 MB
+        'busy_timeout': 5000,
+        'foreign_keys': 'ON',
+        'temp_store': 'MEMORY',
+    },
+}
+
+
+def database_uri(default):
+    """DATABASE_URL from the environment, else `default`"""
+    uri = os.environ.get('DATABASE_URL', default)
+    # Heroku-style URLs use a scheme SQLAlchemy no longer accepts
+    if uri.startswith('postgres://'):
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+
+def _in_memory(url):
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def engine_options(config, uri=None):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured URI, keeping explicit overrides"""
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    url = make_url(uri or config['SQLALCHEMY_DATABASE_URI'])
+    sqlite = url.get_backend_name() == 'sqlite'
+    if _in_memory(url):
+        # In-memory SQLite uses a one-connection-per-thread pool with no sizing
+        return options
+    options.setdefault('pool_size', config['DATABASE_POOL_SIZE'])
+    options.setdefault('max_overflow', config['DATABASE_MAX_OVERFLOW'])
+    options.setdefault('pool_timeout', config['DATABASE_POOL_TIMEOUT'])
+    if not sqlite:
+        # Drop connections the server closed while they sat idle in the pool
+        options.setdefault('pool_pre_ping', True)
+        options.setdefault('pool_recycle', config['DATABASE_POOL_RECYCLE'])
+    return options
+
+
+def read_only_uri(config):
+    """
+    URI for the read-only bind, or None to send every query to the primary.
+
+    READ_ONLY_DATABASE_URI (a replica) wins; otherwise an on-disk database
+    gets a second pool of its own. In-memory SQLite can't be shared that way.
+    """
+    if not config['READ_ONLY_ROUTING_ENABLED']:
+        return None
+    if config.get('READ_ONLY_DATABASE_URI'):
+        return config['READ_ONLY_DATABASE_URI']
+    uri = config['SQLALCHEMY_DATABASE_URI']
+    return None if _in_memory(make_url(uri)) else uri
+
+
+def read_only_binds(config):
+    """SQLALCHEMY_BINDS with the read-only bind added when one applies"""
+    binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+    uri = read_only_uri(config)
+    if uri is not None:
+        binds.setdefault(READ_ONLY_BIND, dict(engine_options(config, uri), url=uri))
+    return binds
+
+
+def profile_pragmas(config):
+    """The profile's PRAGMAs with any DATABASE_PRAGMAS overrides applied"""
+    profile = config['DATABASE_PROFILE']
+    if profile not in PROFILES:
+        raise ValueError(f'Unknown DATABASE_PROFILE {profile!r} (expected one of {", ".join(PROFILES)})')
+    pragmas = dict(PROFILES[profile])
+    pragmas.update(config.get('DATABASE_PRAGMAS') or {})
+    return pragmas
+
+
+def _attach_pragmas(engine, pragmas):
+    if engine.url.database in (None, '', ':memory:'):
+        # WAL and mmap don't apply to in-memory databases
+        pragmas.pop('journal_mode', None)
+        pragmas.pop('mmap_size', None)
+    statements = [f'PRAGMA {name} = {value}' for name, value in pragmas.items()]
+
+    @event.listens_for(engine, 'connect')
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+
+def init_engine_profile(app):
+    """Run the profile's PRAGMAs on every new connection (call after db.init_app)"""
+    pragmas = profile_pragmas(app.config)
+    with app.app_context():
+        engines = dict(db.engines)
+    for key, engine in engines.items():
+        if engine.dialect.name != 'sqlite':
+            continue
+        if key == READ_ONLY_BIND:
+            # Last, so journal_mode can still be switched on a fresh file
+            _attach_pragmas(engine, dict(pragmas, query_only='ON'))
+        elif pragmas:
+            _attach_pragmas(engine, dict(pragmas))
@@ -0,0 +1,145 @@
+"""
+Streaming CSV and JSON-lines exports for the admin.
+
+Each export is a single flat SELECT (an order joined to its items, a
+product joined to its variants) run with `yield_per`, so rows arrive from
+a server-side cursor in fixed-size chunks and are written out as they
+come. Memory stays constant however many rows there are, and the first
+bytes go out before the query has finished. CSV keeps one row per child
+(order item, variant); JSON lines regroups consecutive rows into one
+object per parent with the children nested in a list.
+"""
+
+import csv
+import io
+import json
+from datetime import date
+from itertools import groupby
+
+from flask import current_app
+from sqlalchemy import select
+
+from . import db
+from .models import Order, OrderItem, Product, ProductVariant, Category, User, Waitlist
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+class Export:
+    """A flat SELECT plus, for nested exports, which columns belong to the child rows"""
+
+    def __init__(self, build, children=None, child_columns=()):
+        self.build = build
+        self.children = children
+        self.child_columns = child_columns
+
+
+def _orders():
+    return select(
+        Order.id.label('order_id'), Order.order_number, User.email.label('customer_email'),
+        Order.status, Order.payment_status, Order.payment_method, Order.total_amount,
+        Order.shipping_address, Order.billing_address, Order.date_created,
+        OrderItem.id.label('item_id'), OrderItem.product_id, Product.name.label('product_name'),
+        OrderItem.variant_id, OrderItem.quantity, OrderItem.price
+    ).select_from(Order).join(User, Order.user_id == User.id).outerjoin(
+        OrderItem, OrderItem.order_id == Order.id
+    ).outerjoin(Product, OrderItem.product_id == Product.id).order_by(Order.id, OrderItem.id)
+
+
+def _products():
+    return select(
+        Product.id, Product.name, Product.slug, Category.slug.label('category_slug'),
+        Product.description, Product.price, Product.compare_at_price, Product.sku,
+        Product.inventory, Product.image_url, Product.is_active, Product.is_featured,
+        Product.shipping_details, Product.size_chart, Product.colorway, Product.model_details,
+        Product.fabric_type, Product.product_details, Product.date_created, Product.date_updated,
+        ProductVariant.id.label('variant_id'), ProductVariant.name.label('variant_name'),
+        ProductVariant.value.label('variant_value'), ProductVariant.price_adjustment,
+        ProductVariant.inventory.label('variant_inventory'), ProductVariant.sku.label('variant_sku')
+    ).select_from(Product).join(Category, Product.category_id == Category.id).outerjoin(
+        ProductVariant, ProductVariant.product_id == Product.id
+    ).order_by(Product.id, ProductVariant.id)
+
+
+def _waitlist():
+    return select(
+        Waitlist.id, Waitlist.name, Waitlist.email, Waitlist.phone,
+        Waitlist.preferred_size, Waitlist.date_joined, Waitlist.access_granted
+    ).order_by(Waitlist.id)
+
+
+EXPORTS = {
+    'orders': Export(_orders, 'items', (
+        'item_id', 'product_id', 'product_name', 'variant_id', 'quantity', 'price'
+    )),
+    'products': Export(_products, 'variants', (
+        'variant_id', 'variant_name', 'variant_value', 'price_adjustment', 'variant_inventory', 'variant_sku'
+    )),
+    'waitlist': Export(_waitlist),
+}
+
+
+def _value(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def _chunks(stmt):
+    """Result rows as dicts, fetched from a server-side cursor in fixed-size chunks"""
+    chunk_size = current_app.config['EXPORT_CHUNK_SIZE']
+    result = db.session.execute(stmt, execution_options={'yield_per': chunk_size})
+    for partition in result.mappings().partitions():
+        yield [{key: _value(value) for key, value in row.items()} for row in partition]
+
+
+def _csv(stmt):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column.name for column in stmt.selected_columns])
+    yield buffer.getvalue()
+    for rows in _chunks(stmt):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(row.values() for row in rows)
+        yield buffer.getvalue()
+
+
+def _nest(rows, key, children, child_columns):
+    """Group consecutive flat rows by `key` into one record with a list of children"""
+    for _, group in groupby(rows, key=lambda row: row[key]):
+        group = list(group)
+        record = {name: value for name, value in group[0].items() if name not in child_columns}
+        record[children] = [
+            {name: row[name] for name in child_columns}
+            for row in group if row[child_columns[0]] is not None
+        ]
+        yield record
+
+
+def _jsonl(stmt, export):
+    chunk_size = current_app.config['EXPORT_CHUNK_SIZE']
+    rows = (row for rows in _chunks(stmt) for row in rows)
+    if export.children:
+        key = stmt.selected_columns[0].name
+        rows = _nest(rows, key, export.children, export.child_columns)
+    lines = []
+    for record in rows:
+        lines.append(json.dumps(record))
+        if len(lines) >= chunk_size:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def export_lines(name, fmt):
+    """Generator of text chunks for the `name` export in `fmt` ('csv' or 'jsonl')"""
+    export = EXPORTS[name]
+    stmt = export.build()
+    if fmt == 'csv':
+        return _csv(stmt)
+    return _jsonl(stmt, export)
@@ -0,0 +1,75 @@
+"""
+HTTP conditional GET support (ETag / Last-Modified) for catalog pages.
+
+Views build a Validators object from the versions of the data a page shows
+before doing any rendering. If the browser (or CDN) already holds that
+version the view returns 304 straight away; otherwise the rendered response
+is stamped with the same validators.
+
+The ETag also covers the build (APP_VERSION and the asset manifest), so
+after a deploy, or a `build-assets --clean` and restart, no browser is kept
+on cached HTML that links to stylesheets that are gone. Last-Modified is sent for information only.
+The newest date_updated can't see deleted products or category changes, so
+If-Modified-Since on its own never produces a 304.
+"""
+
+import hashlib
+from datetime import timezone
+
+from flask import request, session, make_response, current_app
+from flask_login import current_user
+
+
+def _visitor_state():
+    """The parts of the viewer that change shared page chrome (nav links)"""
+    if not current_user.is_authenticated:
+        return 'anon'
+    return 'admin' if current_user.is_admin else 'user'
+
+
+class Validators:
+    """ETag and Last-Modified for one response"""
+
+    def __init__(self, last_modified, *parts):
+        if last_modified is not None:
+            # HTTP dates have one-second resolution
+            last_modified = last_modified.replace(microsecond=0, tzinfo=timezone.utc)
+        self.last_modified = last_modified
+        build = (current_app.config['APP_VERSION'], current_app.extensions['assets'].version)
+        key = repr((request.full_path, _visitor_state(), build) + parts).encode('utf-8')
+        self.etag = hashlib.sha1(key).hexdigest()
+        # Read now: rendering pops the flashes before apply() runs
+        self.flashed = bool(session.get('_flashes'))
+
+    @property
+    def enabled(self):
+        # A page carrying flashed messages must never be revalidated later,
+        # or the browser would replay the old message from its cache
+        return current_app.config['CONDITIONAL_GET_ENABLED'] and not self.flashed
+
+    def is_fresh(self):
+        """True if the client's cached copy matches these validators"""
+        if not self.enabled:
+            return False
+        if request.if_none_match:
+            return request.if_none_match.contains_weak(self.etag)
+        return False
+
+    def not_modified(self):
+        return self.apply(make_response('', 304))
+
+    def apply(self, response):
+        """Attach the validators to a rendered page"""
+        response = make_response(response)
+        if self.flashed:
+            response.cache_control.no_store = True
+        if not self.enabled:
+            return response
+        response.set_etag(self.etag, weak=True)
+        if self.last_modified is not None:
+            response.last_modified = self.last_modified
+        # Pages depend on the session (access code, login), so shared caches
+        # must key on the cookie and everyone must revalidate before reuse
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.vary.add('Cookie')
+        return response
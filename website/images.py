@@ -0,0 +1,49 @@
+"""
+Helpers for product gallery images (the ProductImage table).
+
+Each gallery slot takes either a URL or an uploaded file (see uploads.py).
+"""
+
+from .models import ProductImage
+
+# Gallery slots offered by the admin product forms, in display order
+IMAGE_TYPES = ('on_body', 'on_ground', 'photoshoot', 'additional')
+
+
+# Admin form file inputs: the main image, then one per gallery slot
+UPLOAD_FIELDS = ('image_file',) + tuple(f'{image_type}_image_file' for image_type in IMAGE_TYPES)
+
+
+def gallery_from_form(form, uploads=None):
+    """
+    Build ProductImage rows from the admin form's per-slot fields.
+
+    `uploads` maps file fields to the (url, width, height) of saved uploads,
+    which take precedence over the slot's URL field.
+    """
+    uploads = uploads or {}
+    gallery = []
+    for image_type in IMAGE_TYPES:
+        url, width, height = form.get(f'{image_type}_image', '').strip(), None, None
+        if f'{image_type}_image_file' in uploads:
+            url, width, height = uploads[f'{image_type}_image_file']
+        if url:
+            gallery.append(ProductImage(image_type=image_type, url=url, sort_order=len(gallery),
+                                        width=width, height=height))
+    return gallery
+
+
+def listing_images(product_ids):
+    """
+    First gallery image for each product, in one query.
+
+    Listing grids show Product.image_url as the primary image and swap to
+    this secondary image on hover.
+    """
+    if not product_ids:
+        return {}
+    rows = ProductImage.query.with_entities(ProductImage.product_id, ProductImage.url).filter(
+        ProductImage.product_id.in_(product_ids),
+        ProductImage.sort_order == 0
+    ).all()
+    return dict(rows)
@@ -0,0 +1,307 @@
+"""
+Bulk product import from CSV or JSON lines.
+
+The layout is the one the products export writes. In CSV, each row is a
+product plus at most one variant, and consecutive rows sharing a slug are
+one product with several variants. In JSON lines, each line is one
+product with its variants nested in a `variants` list. Unknown columns
+(id, dates, variant_id) are ignored.
+
+The upload is read as a stream and handled IMPORT_CHUNK_SIZE products at
+a time. Each chunk is validated first: category slugs are checked against
+the cached category map, and slugs and SKUs against the file so far and
+one IN query per chunk. The chunk is then written as one executemany for
+products and one for variants, and committed on its own, so one bad
+chunk never undoes the others. Every rejected row is reported with its
+line number. A dry run validates without writing anything.
+"""
+
+import csv
+import json
+import math
+from itertools import groupby
+
+from flask import current_app
+from sqlalchemy import select, insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from . import db
+from .models import Product, ProductVariant
+from .category_cache import get_category_tree
+from .search import index_products
+from .store_stats import adjust
+
+IMPORT_FORMATS = ('csv', 'jsonl')
+
+TEXT_FIELDS = ('description', 'image_url', 'shipping_details', 'size_chart', 'colorway',
+               'model_details', 'fabric_type', 'product_details')
+VARIANT_FIELDS = ('variant_name', 'variant_value', 'price_adjustment', 'variant_inventory', 'variant_sku')
+
+_TRUE = ('1', 'true', 'yes', 'y', 'on')
+_FALSE = ('0', 'false', 'no', 'n', 'off')
+
+
+class RowError:
+    """One rejected row in the import report"""
+
+    def __init__(self, line, slug, message):
+        self.line = line
+        self.slug = slug
+        self.message = message
+
+
+class ImportResult:
+    """Counts and row-level errors for one import run"""
+
+    def __init__(self, dry_run, max_errors):
+        self.dry_run = dry_run
+        self.max_errors = max_errors
+        self.products = 0
+        self.variants = 0
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, line, slug, message):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append(RowError(line, slug, message))
+
+    @property
+    def truncated(self):
+        return self.error_count > len(self.errors)
+
+
+class Candidate:
+    """A product read from the file, not yet validated"""
+
+    def __init__(self, line, fields, variants, problem=None):
+        self.line = line
+        self.fields = fields
+        self.variants = variants
+        self.problem = problem
+        self.slug = _slug(fields)
+
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _slug(fields):
+    slug = fields.get('slug')
+    if _blank(slug):
+        name = fields.get('name')
+        # Same fallback as the single-product admin form
+        slug = name.lower().replace(' ', '-') if isinstance(name, str) else ''
+    return str(slug).strip()
+
+
+def _csv_candidates(stream):
+    reader = csv.DictReader(stream)
+    rows = ((reader.line_num, row) for row in reader)
+    for _, group in groupby(rows, key=lambda item: _slug(item[1])):
+        group = list(group)
+        line, fields = group[0]
+        variants = [
+            {name: row.get(name) for name in VARIANT_FIELDS}
+            for _, row in group
+            if any(not _blank(row.get(name)) for name in VARIANT_FIELDS)
+        ]
+        yield Candidate(line, fields, variants)
+
+
+def _jsonl_candidates(stream):
+    for line, text in enumerate(stream, 1):
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+        except ValueError:
+            yield Candidate(line, {}, [], 'Not valid JSON')
+            continue
+        if not isinstance(record, dict):
+            yield Candidate(line, {}, [], 'Expected a JSON object')
+            continue
+        variants = record.pop('variants', None) or []
+        if not isinstance(variants, list) or not all(isinstance(v, dict) for v in variants):
+            yield Candidate(line, record, [], '"variants" must be a list of objects')
+            continue
+        yield Candidate(line, record, variants)
+
+
+def _text(value):
+    return None if _blank(value) else str(value).strip()
+
+
+def _number(value, kind, field, default=None, required=False, minimum=0):
+    if _blank(value):
+        if required:
+            raise ValueError(f'{field} is required')
+        return default
+    try:
+        number = kind(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f'{field} must be a number, got {value!r}')
+    # float() accepts 'nan' and 'inf', which pass any minimum
+    if not math.isfinite(number):
+        raise ValueError(f'{field} must be a finite number, got {value!r}')
+    if minimum is not None and number < minimum:
+        raise ValueError(f'{field} can\'t be negative')
+    return number
+
+
+def _flag(value, field, default):
+    if _blank(value):
+        return default
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in _TRUE:
+        return True
+    if text in _FALSE:
+        return False
+    raise ValueError(f'{field} must be true or false, got {value!r}')
+
+
+def _product_values(candidate, categories):
+    fields = candidate.fields
+    name = _text(fields.get('name'))
+    if not name:
+        raise ValueError('name is required')
+    if not candidate.slug:
+        raise ValueError('slug is required')
+    category_slug = _text(fields.get('category_slug'))
+    if not category_slug:
+        raise ValueError('category_slug is required')
+    category = categories.get(category_slug)
+    if category is None:
+        raise ValueError(f'unknown category {category_slug!r}')
+
+    values = {
+        'name': name,
+        'slug': candidate.slug,
+        'category_id': category.id,
+        'price': _number(fields.get('price'), float, 'price', required=True),
+        'compare_at_price': _number(fields.get('compare_at_price'), float, 'compare_at_price'),
+        'sku': _text(fields.get('sku')),
+        'inventory': _number(fields.get('inventory'), int, 'inventory', default=0),
+        'is_active': _flag(fields.get('is_active'), 'is_active', True),
+        'is_featured': _flag(fields.get('is_featured'), 'is_featured', False),
+    }
+    for field in TEXT_FIELDS:
+        values[field] = _text(fields.get(field))
+    return values
+
+
+def _variant_values(variant):
+    name = _text(variant.get('variant_name'))
+    value = _text(variant.get('variant_value'))
+    if not name or not value:
+        raise ValueError('variants need both variant_name and variant_value')
+    return {
+        'name': name,
+        'value': value,
+        'price_adjustment': _number(variant.get('price_adjustment'), float, 'price_adjustment',
+                                    default=0.0, minimum=None),
+        'inventory': _number(variant.get('variant_inventory'), int, 'variant_inventory', default=0),
+        'sku': _text(variant.get('variant_sku')),
+    }
+
+
+def _validate(chunk, categories, seen_slugs, seen_skus, result):
+    """(product values, variant values list, candidate) for every valid product in the chunk"""
+    slugs = [candidate.slug for candidate in chunk if candidate.slug]
+    skus = [_text(candidate.fields.get('sku')) for candidate in chunk]
+    existing_slugs = set(db.session.scalars(select(Product.slug).where(Product.slug.in_(slugs))))
+    existing_skus = set(db.session.scalars(select(Product.sku).where(Product.sku.in_([s for s in skus if s]))))
+
+    valid = []
+    for candidate in chunk:
+        if candidate.problem:
+            result.error(candidate.line, candidate.slug, candidate.problem)
+            continue
+        try:
+            values = _product_values(candidate, categories)
+            variants = [_variant_values(variant) for variant in candidate.variants]
+        except ValueError as e:
+            result.error(candidate.line, candidate.slug, str(e))
+            continue
+        if values['slug'] in existing_slugs:
+            result.error(candidate.line, values['slug'], 'a product with this slug already exists')
+            continue
+        if values['slug'] in seen_slugs:
+            result.error(candidate.line, values['slug'], 'slug appears earlier in the file')
+            continue
+        if values['sku'] and (values['sku'] in existing_skus or values['sku'] in seen_skus):
+            result.error(candidate.line, values['slug'], f'SKU {values["sku"]!r} is already in use')
+            continue
+        seen_slugs.add(values['slug'])
+        if values['sku']:
+            seen_skus.add(values['sku'])
+        valid.append((values, variants, candidate))
+    return valid
+
+
+def _write(valid):
+    """Insert one validated chunk and commit it"""
+    ids = dict(db.session.execute(
+        insert(Product).returning(Product.slug, Product.id),
+        [values for values, _, _ in valid]
+    ).all())
+    variant_rows = [
+        dict(variant, product_id=ids[values['slug']])
+        for values, variants, _ in valid
+        for variant in variants
+    ]
+    if variant_rows:
+        db.session.execute(insert(ProductVariant), variant_rows)
+    index_products(ids.values())
+    adjust(total_products=len(ids))
+    db.session.commit()
+    return len(ids), len(variant_rows)
+
+
+def _chunked(candidates, size):
+    chunk = []
+    for candidate in candidates:
+        chunk.append(candidate)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_products(stream, fmt, dry_run=False):
+    """
+    Import products from a text stream in `fmt` ('csv' or 'jsonl').
+
+    Returns an ImportResult. Valid chunks are committed as they go, so a
+    failure part way through keeps everything before it.
+    """
+    config = current_app.config
+    result = ImportResult(dry_run, config['IMPORT_MAX_REPORTED_ERRORS'])
+    categories = get_category_tree().by_slug
+    candidates = _csv_candidates(stream) if fmt == 'csv' else _jsonl_candidates(stream)
+    seen_slugs = set()
+    seen_skus = set()
+
+    for chunk in _chunked(candidates, config['IMPORT_CHUNK_SIZE']):
+        valid = _validate(chunk, categories, seen_slugs, seen_skus, result)
+        if not valid:
+            continue
+        if dry_run:
+            result.products += len(valid)
+            result.variants += sum(len(variants) for _, variants, _ in valid)
+            continue
+        try:
+            products, variants = _write(valid)
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            for _, _, candidate in valid:
+                result.error(candidate.line, candidate.slug, f'not saved, the chunk failed: {e}')
+            continue
+        result.products += products
+        result.variants += variants
+    # Release the read transaction left open by a dry run's lookups
+    db.session.rollback()
+    return result
@@ -0,0 +1,176 @@
+"""
+Versioned schema migrations.
+
+Each migration is a function registered with @migration(version,
+description) that receives a Connection inside its own transaction, plus
+the caller's `log` callback for warnings. The versions that have run are
+recorded in `schema_migration`, so run_migrations() only applies the
+pending ones, in version order. Every migration checks the schema before
+changing it, because databases created by db.create_all() already have the
+latest tables and indexes and only need their versions recorded.
+
+Run with `python migrate_database.py`, which also checks the storefront
+and admin query plans (see query_plans.py).
+"""
+
+import json
+
+from sqlalchemy import inspect, select, insert, text
+
+from .models import (SchemaMigration, Category, Product, ProductImage, ProductVariant, CartItem,
+                     Order, OrderItem, WishlistItem)
+
+MIGRATIONS = []
+
+
+class Migration:
+    def __init__(self, version, description, upgrade):
+        self.version = version
+        self.description = description
+        self.upgrade = upgrade
+
+
+def migration(version, description):
+    """Register an upgrade function under a new version number"""
+    def decorator(f):
+        if any(existing.version == version for existing in MIGRATIONS):
+            raise ValueError(f'Duplicate migration version {version}')
+        MIGRATIONS.append(Migration(version, description, f))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return f
+    return decorator
+
+
+def _add_columns(conn, model, names):
+    table = model.__table__
+    existing = {column['name'] for column in inspect(conn).get_columns(table.name)}
+    for name in names:
+        if name not in existing:
+            column_type = table.c[name].type.compile(conn.dialect)
+            conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {name} {column_type}'))
+
+
+def _has_index(conn, index):
+    if conn.dialect.name == 'sqlite':
+        # Reflection skips expression indexes such as the cart line one
+        return conn.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = :name"),
+                            {'name': index.name}).first() is not None
+    return index.name in {i['name'] for i in inspect(conn).get_indexes(index.table.name)}
+
+
+def _create_indexes(conn, *indexes):
+    for index in indexes:
+        if not _has_index(conn, index):
+            index.create(conn)
+
+
+def _index(model, name):
+    return next(index for index in model.__table__.indexes if index.name == name)
+
+
+@migration(1, 'Add category.parent_id for nested categories')
+def _category_parent(conn, log):
+    _add_columns(conn, Category, ['parent_id'])
+
+
+@migration(2, 'Add product detail columns')
+def _product_details(conn, log):
+    _add_columns(conn, Product, ['shipping_details', 'size_chart', 'colorway', 'model_details',
+                                 'fabric_type', 'product_details'])
+
+
+@migration(3, 'Create wishlist_item')
+def _wishlist(conn, log):
+    WishlistItem.__table__.create(conn, checkfirst=True)
+
+
+@migration(4, 'Create product_image and move legacy JSON image lists into it')
+def _product_images(conn, log):
+    ProductImage.__table__.create(conn, checkfirst=True)
+    # Only products without rows yet, so a partial earlier run is safe
+    rows = conn.execute(text("""
+        SELECT id, images FROM product
+        WHERE images IS NOT NULL AND images != ''
+          AND id NOT IN (SELECT product_id FROM product_image)
+    """)).all()
+    for product_id, images_json in rows:
+        try:
+            images = json.loads(images_json)
+        except ValueError:
+            log(f'Warning: Skipping unreadable images JSON on product {product_id}')
+            continue
+        if not isinstance(images, list):
+            log(f'Warning: Skipping images JSON that is not a list on product {product_id}')
+            continue
+        # Entries are {'url': ..., 'type': ...}; some older rows hold bare URL strings
+        images = [{'url': image} if isinstance(image, str) else image for image in images]
+        images = [image for image in images if isinstance(image, dict) and image.get('url')]
+        if images:
+            conn.execute(insert(ProductImage.__table__), [
+                {'product_id': product_id, 'image_type': image.get('type') or 'additional',
+                 'url': image['url'], 'sort_order': sort_order}
+                for sort_order, image in enumerate(images)
+            ])
+
+
+@migration(5, 'Merge duplicate cart lines and make them unique per user/product/variant')
+def _unique_cart_lines(conn, log):
+    index = _index(CartItem, 'unique_user_product_variant_cart')
+    if _has_index(conn, index):
+        return
+    conn.execute(text("""
+        UPDATE cart_item SET quantity = (
+            SELECT SUM(other.quantity) FROM cart_item AS other
+            WHERE other.user_id = cart_item.user_id
+              AND other.product_id = cart_item.product_id
+              AND COALESCE(other.variant_id, 0) = COALESCE(cart_item.variant_id, 0)
+        )
+        WHERE id IN (
+            SELECT MIN(id) FROM cart_item
+            GROUP BY user_id, product_id, COALESCE(variant_id, 0)
+            HAVING COUNT(*) > 1
+        )
+    """))
+    conn.execute(text("""
+        DELETE FROM cart_item WHERE id NOT IN (
+            SELECT MIN(id) FROM cart_item
+            GROUP BY user_id, product_id, COALESCE(variant_id, 0)
+        )
+    """))
+    index.create(conn)
+
+
+@migration(6, 'Index the storefront, cart, order and wishlist filter columns')
+def _hot_filter_indexes(conn, log):
+    _create_indexes(
+        conn,
+        *Product.__table__.indexes,
+        *ProductVariant.__table__.indexes,
+        *Order.__table__.indexes,
+        *OrderItem.__table__.indexes,
+        _index(WishlistItem, 'ix_wishlist_item_user_added'),
+    )
+
+
+def applied_versions(engine):
+    with engine.begin() as conn:
+        SchemaMigration.__table__.create(conn, checkfirst=True)
+        return set(conn.scalars(select(SchemaMigration.version)))
+
+
+def pending_migrations(engine):
+    applied = applied_versions(engine)
+    return [m for m in MIGRATIONS if m.version not in applied]
+
+
+def run_migrations(engine, log=print):
+    """Apply every pending migration, each in its own transaction; returns those applied"""
+    applied = []
+    for m in pending_migrations(engine):
+        log(f'Applying {m.version}: {m.description}')
+        with engine.begin() as conn:
+            m.upgrade(conn, log)
+            conn.execute(insert(SchemaMigration.__table__).values(
+                version=m.version, description=m.description))
+        applied.append(m)
+    return applied
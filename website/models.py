@@ -39,11 +39,11 @@ class Product(db.Model):
     sku = db.Column(db.String(100), unique=True)
     inventory = db.Column(db.Integer, default=0)
     image_url = db.Column(db.String(500))  # Main/primary image
-    images = db.Column(db.Text)  # JSON string of multiple images (on body, on ground, photoshoot)
+    images = db.Column(db.Text)  # Legacy JSON image list, migrated into ProductImage rows
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
     is_active = db.Column(db.Boolean, default=True)
     is_featured = db.Column(db.Boolean, default=False)
-    date_created = db.Column(db.DateTime, default=datetime.utcnow)
+    date_created = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     date_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Additional product details
@@ -62,10 +62,35 @@ class Product(db.Model):
     
     # Variants (size, color, etc.)
     variants = relationship('ProductVariant', back_populates='product', cascade='all, delete-orphan')
+    
+    # Gallery images (on body, on ground, photoshoot), in display order
+    gallery = relationship('ProductImage', back_populates='product', cascade='all, delete-orphan',
+                           order_by='ProductImage.sort_order')
+    
+    # One index per storefront listing shape (filter columns first, then the
+    # sort column) so pages are read in order without a sort step
+    __table_args__ = (
+        db.Index('ix_product_active_created', is_active, date_created),
+        db.Index('ix_product_active_price', is_active, price),
+        db.Index('ix_product_active_name', is_active, name),
+        db.Index('ix_product_category_active_created', category_id, is_active, date_created),
+        db.Index('ix_product_featured_active', is_featured, is_active),
+    )
+
+class ProductImage(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
+    image_type = db.Column(db.String(50), nullable=False)  # on_body, on_ground, photoshoot, additional
+    url = db.Column(db.String(500), nullable=False)
+    sort_order = db.Column(db.Integer, default=0, nullable=False)
+    width = db.Column(db.Integer)  # Pixel dimensions, when known
+    height = db.Column(db.Integer)
+    
+    product = relationship('Product', back_populates='gallery')
 
 class ProductVariant(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
     name = db.Column(db.String(100), nullable=False)  # e.g., "Size", "Color"
     value = db.Column(db.String(100), nullable=False)  # e.g., "M", "Red"
     price_adjustment = db.Column(db.Float, default=0.0)
@@ -85,26 +110,43 @@ class CartItem(db.Model):
     user = relationship('User', back_populates='cart_items')
     product = relationship('Product', back_populates='cart_items')
     variant = relationship('ProductVariant')
+    
+    @property
+    def unit_price(self):
+        """Product price plus the chosen variant's adjustment"""
+        if self.variant is None:
+            return self.product.price
+        return self.product.price + (self.variant.price_adjustment or 0)
+    
+    # One cart line per user/product/variant so add-to-cart can upsert. NULL
+    # variants are coalesced because a plain UNIQUE treats NULLs as distinct.
+    __table_args__ = (
+        db.Index('unique_user_product_variant_cart', user_id, product_id,
+                 db.func.coalesce(variant_id, 0), unique=True),
+    )
 
 class Order(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     order_number = db.Column(db.String(50), unique=True, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     total_amount = db.Column(db.Float, nullable=False)
-    status = db.Column(db.String(50), default='pending')  # pending, processing, shipped, delivered, cancelled
+    status = db.Column(db.String(50), default='pending', index=True)  # pending, processing, shipped, delivered, cancelled
     shipping_address = db.Column(db.Text, nullable=False)
     billing_address = db.Column(db.Text, nullable=False)
     payment_method = db.Column(db.String(50))
     payment_status = db.Column(db.String(50), default='pending')  # pending, paid, failed, refunded
-    date_created = db.Column(db.DateTime, default=datetime.utcnow)
+    date_created = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     date_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     user = relationship('User', back_populates='orders')
     items = relationship('OrderItem', back_populates='order', cascade='all, delete-orphan')
+    
+    # A shopper's order history, newest first
+    __table_args__ = (db.Index('ix_order_user_created', user_id, date_created),)
 
 class OrderItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Float, nullable=False)  # Price at time of purchase
@@ -123,8 +165,12 @@ class WishlistItem(db.Model):
     user = relationship('User', back_populates='wishlist_items')
     product = relationship('Product', back_populates='wishlist_items')
     
-    # Ensure a user can't add the same product to wishlist twice
-    __table_args__ = (db.UniqueConstraint('user_id', 'product_id', name='unique_user_product_wishlist'),)
+    # Ensure a user can't add the same product to wishlist twice; the second
+    # index serves the wishlist page, newest first
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'product_id', name='unique_user_product_wishlist'),
+        db.Index('ix_wishlist_item_user_added', user_id, date_added),
+    )
 
 class Waitlist(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -135,3 +181,58 @@ class Waitlist(db.Model):
     date_joined = db.Column(db.DateTime, default=datetime.utcnow)
     access_granted = db.Column(db.Boolean, default=False)
 
+
+class CacheVersion(db.Model):
+    """Generation counters that tell every worker process when a cache is stale"""
+    key = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, default=0, nullable=False)
+
+    @classmethod
+    def current(cls, key):
+        version = db.session.query(cls.version).filter_by(key=key).scalar()
+        return version or 0
+
+    @classmethod
+    def bump(cls, key):
+        """Increment a generation (caller commits)"""
+        updated = cls.query.filter_by(key=key).update({cls.version: cls.version + 1})
+        if not updated:
+            db.session.add(cls(key=key, version=1))
+
+class StoreStats(db.Model):
+    """Running totals for the admin dashboard, kept in a single row"""
+    id = db.Column(db.Integer, primary_key=True)
+    total_products = db.Column(db.Integer, default=0, nullable=False)
+    total_orders = db.Column(db.Integer, default=0, nullable=False)
+    total_users = db.Column(db.Integer, default=0, nullable=False)
+    pending_orders = db.Column(db.Integer, default=0, nullable=False)
+    date_reconciled = db.Column(db.DateTime)
+
+class SalesDaily(db.Model):
+    """Orders, units and revenue per day and order status, folded in by analytics.py"""
+    day = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.String(50), primary_key=True)
+    orders = db.Column(db.Integer, default=0, nullable=False)
+    units = db.Column(db.Integer, default=0, nullable=False)
+    revenue = db.Column(db.Float, default=0.0, nullable=False)
+
+class SalesDailyProduct(db.Model):
+    """Units and revenue per day, product and order status, folded in by analytics.py"""
+    day = db.Column(db.Date, primary_key=True)
+    # No foreign keys: sales history outlives deleted products and categories
+    product_id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(50), primary_key=True)
+    category_id = db.Column(db.Integer, index=True)
+    units = db.Column(db.Integer, default=0, nullable=False)
+    revenue = db.Column(db.Float, default=0.0, nullable=False)
+
+class RollupWatermark(db.Model):
+    """Highest source row id already folded into a rollup"""
+    name = db.Column(db.String(50), primary_key=True)
+    last_id = db.Column(db.Integer, default=0, nullable=False)
+
+class SchemaMigration(db.Model):
+    """A migration from website/migrations.py that has been applied"""
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    description = db.Column(db.String(200), nullable=False)
+    date_applied = db.Column(db.DateTime, default=datetime.utcnow)
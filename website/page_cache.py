@@ -0,0 +1,109 @@
+"""
+Rendered-HTML fragment cache for high-traffic catalog pages.
+
+The shared part of a page (everything that does not depend on who is
+looking at it) is rendered once and kept in a bounded LRU keyed on the
+route, its arguments and the version of the rows it was rendered from.
+Per-user pieces such as the nav bar and wishlist buttons are rendered on
+every request around (or spliced into) the cached fragment.
+"""
+
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+from markupsafe import Markup
+from sqlalchemy import func
+
+from . import db
+from .models import Product
+
+
+class FragmentCache:
+    """Thread-safe LRU of rendered fragments, bounded by entries and size"""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = value
+            self._size += size
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'size': self._size,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+def init_page_cache(app):
+    app.extensions['page_cache'] = FragmentCache(
+        app.config['PAGE_CACHE_MAX_ENTRIES'],
+        app.config['PAGE_CACHE_MAX_BYTES'],
+    )
+
+
+def cached_fragment(key, render):
+    """Return the cached fragment for `key`, calling render() on a miss"""
+    if not current_app.config['PAGE_CACHE_ENABLED']:
+        return Markup(render())
+    cache = current_app.extensions['page_cache']
+    fragment = cache.get(key)
+    if fragment is None:
+        fragment = Markup(render())
+        cache.set(key, fragment)
+    return fragment
+
+
+def product_version(*criteria):
+    """
+    (latest date_updated, row count) for the products matching `criteria`.
+
+    Any edit bumps date_updated and any add/delete changes the count, so the
+    pair changes whenever the rendered set of products could have.
+    """
+    latest, count = db.session.query(
+        func.max(Product.date_updated), func.count(Product.id)
+    ).filter(*criteria).one()
+    return latest, count
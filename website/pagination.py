@@ -0,0 +1,107 @@
+"""
+Keyset (cursor-based) pagination for listing queries.
+
+Instead of OFFSET, each page remembers the sort value and id of its last row
+and the next page starts strictly after that pair, so every page costs the
+same no matter how deep into the catalog the shopper goes.
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+from . import db
+from .models import Product
+
+# sort mode -> (column, descending). Product.id is always the tie-breaker so
+# cursors stay stable when several products share a price, name or timestamp.
+PRODUCT_SORTS = {
+    'newest': (Product.date_created, True),
+    'price_low': (Product.price, False),
+    'price_high': (Product.price, True),
+    'name': (Product.name, False),
+}
+
+
+class KeysetPage:
+    """One page of results plus the cursor needed to fetch the next one"""
+
+    def __init__(self, rows, per_page, next_cursor=None, cursor=None):
+        self.rows = rows
+        self.items = [row[0] for row in rows]
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.cursor = cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def is_first(self):
+        return self.cursor is None
+
+
+def encode_cursor(key, row_id):
+    if isinstance(key, datetime):
+        key = key.isoformat()
+    raw = json.dumps([key, row_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, column):
+    """Return (key, id) for a cursor, or None if it is missing or malformed"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        key, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if isinstance(getattr(column, 'type', None), db.DateTime) and key is not None:
+            key = datetime.fromisoformat(key)
+        return key, int(row_id)
+    except (ValueError, TypeError, UnicodeError):
+        return None
+
+
+def keyset_paginate(query, column, descending=False, cursor=None, per_page=24, id_column=Product.id):
+    """
+    Fetch one page of `query` ordered by (column, id_column).
+
+    Each returned row is the query's original row with the sort key appended,
+    so extra columns added by the caller (e.g. search snippets) stay available
+    through `page.rows`.
+    """
+    position = decode_cursor(cursor, column)
+    if position is not None:
+        key, last_id = position
+        if descending:
+            query = query.filter(or_(column < key, and_(column == key, id_column < last_id)))
+        else:
+            query = query.filter(or_(column > key, and_(column == key, id_column > last_id)))
+
+    if descending:
+        query = query.order_by(None).order_by(column.desc(), id_column.desc())
+    else:
+        query = query.order_by(None).order_by(column.asc(), id_column.asc())
+
+    # Ask for one extra row to learn whether another page exists
+    rows = query.add_columns(column, id_column).limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]
+        next_cursor = encode_cursor(last[-2], last[-1])
+
+    # Strip the bookkeeping columns back off before handing rows to templates
+    rows = [tuple(row[:-2]) for row in rows]
+    return KeysetPage(rows, per_page, next_cursor=next_cursor, cursor=cursor if position else None)
+
+
+def paginate_products(query, sort, cursor=None, per_page=24):
+    """Keyset-paginate a Product query using one of the storefront sort modes"""
+    column, descending = PRODUCT_SORTS.get(sort, PRODUCT_SORTS['newest'])
+    return keyset_paginate(query, column, descending=descending, cursor=cursor, per_page=per_page)
@@ -0,0 +1,112 @@
+"""
+Password hashing off the request path, with login throttling.
+
+pbkdf2 with 600,000 iterations costs a few hundred milliseconds of CPU per
+hash. Hashes therefore run in a small per-process thread pool (hashlib
+releases the GIL while hashing), capped at PASSWORD_HASH_QUEUE jobs
+running or waiting. When the pool is full, a request fails fast with
+HashingBusy instead of queueing more CPU work. Login attempts are
+throttled per client IP and per email with token buckets (in the
+RATE_LIMIT_STORAGE store, see ratelimit.py) before any lookup or hash
+happens. When PASSWORD_HASH_METHOD changes, a user's hash
+is upgraded the next time they log in successfully.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from flask import current_app, request
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing pool is full or a hash took too long"""
+
+
+class HashingPool:
+    """Bounded thread pool for password hashing and verification"""
+
+    def __init__(self, workers, max_pending, timeout):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HashingBusy() from None
+
+
+def init_passwords(app):
+    # Threads are only started on the first hash, so this costs nothing at boot
+    app.extensions['password_hashing'] = HashingPool(
+        app.config['PASSWORD_HASH_WORKERS'],
+        app.config['PASSWORD_HASH_QUEUE'],
+        app.config['PASSWORD_HASH_TIMEOUT'],
+    )
+
+
+def _pool():
+    return current_app.extensions['password_hashing']
+
+
+def hash_password(password):
+    """Hash with the configured method on the hashing pool"""
+    return _pool().run(generate_password_hash, password, current_app.config['PASSWORD_HASH_METHOD'])
+
+
+def normalized_method(method):
+    """Spell out the defaults werkzeug fills in, as they appear in stored hashes"""
+    name, *args = method.split(':')
+    if name == 'pbkdf2':
+        hash_name = args[0] if args else 'sha256'
+        iterations = args[1] if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}:{iterations}'
+    if name == 'scrypt' and not args:
+        return 'scrypt:32768:8:1'
+    return method
+
+
+def needs_rehash(pwhash):
+    method = pwhash.split('$', 1)[0]
+    return normalized_method(method) != normalized_method(current_app.config['PASSWORD_HASH_METHOD'])
+
+
+def verify_password(user, password):
+    """
+    Check `password` against the user's hash on the hashing pool.
+
+    On success, re-hashes with the configured method if the stored hash
+    used another one (caller commits).
+    """
+    if not password or not _pool().run(check_password_hash, user.password, password):
+        return False
+    if needs_rehash(user.password):
+        try:
+            user.password = hash_password(password)
+        except HashingBusy:
+            pass  # Upgrade on a later login rather than fail this one
+    return True
+
+
+def auth_retry_after(email=None):
+    """0 if this login/sign-up attempt may proceed, else seconds until the client may retry"""
+    config = current_app.config
+    if not config['LOGIN_THROTTLE_ENABLED']:
+        return 0.0
+    buckets = current_app.extensions['rate_limits']
+    wait = buckets.take(f'login-ip:{request.remote_addr}',
+                        config['LOGIN_IP_BURST'], config['LOGIN_IP_PER_MINUTE'] / 60.0)
+    if wait or not email:
+        return wait
+    return buckets.take(f'login-email:{email.strip().lower()}',
+                        config['LOGIN_EMAIL_BURST'], config['LOGIN_EMAIL_PER_MINUTE'] / 60.0)
@@ -0,0 +1,99 @@
+"""
+EXPLAIN QUERY PLAN checks for the hot storefront and admin queries.
+
+Each check builds a statement with the same shape (filters, sort and
+limit) as a query in views.py, admin.py or the modules they call, and asks
+SQLite how it would run it. A plan step that reads a whole table without
+an index (`SCAN product`) is a full scan and fails the check; a separate
+sort step (`USE TEMP B-TREE FOR ORDER BY`) is reported but allowed, since
+some sorts, such as a category listing by price, have no matching index.
+"""
+
+import re
+
+from sqlalchemy import select, func, or_, and_
+
+from .models import Product, ProductVariant, CartItem, Order, OrderItem, WishlistItem
+
+_FULL_SCAN_RE = re.compile(r'^SCAN (\S+)$')
+_TEMP_SORT = 'USE TEMP B-TREE'
+
+# Parameters go straight to the driver, so dates are given in SQLite's
+# stored text form
+_CURSOR_DATE = '2024-01-01 00:00:00.000000'
+
+
+def _newest_page(*criteria):
+    # Second page of the newest-first keyset listing: after the last row seen
+    column = Product.date_created
+    after = or_(column < _CURSOR_DATE, and_(column == _CURSOR_DATE, Product.id < 100))
+    return select(Product).where(*criteria, after).order_by(column.desc(), Product.id.desc()).limit(25)
+
+
+PLAN_CHECKS = {
+    'home: featured products': select(Product).where(
+        Product.is_featured == True, Product.is_active == True).limit(8),
+    'home: featured version': select(func.max(Product.date_updated), func.count(Product.id)).where(
+        Product.is_featured == True, Product.is_active == True),
+    'products: catalog version': select(func.max(Product.date_updated), func.count(Product.id)).where(
+        Product.is_active == True),
+    'products: newest': _newest_page(Product.is_active == True),
+    'products: by price': select(Product).where(Product.is_active == True).order_by(
+        Product.price.desc(), Product.id.desc()).limit(25),
+    'products: by name': select(Product).where(Product.is_active == True).order_by(
+        Product.name, Product.id).limit(25),
+    'products: category newest': _newest_page(Product.category_id == 1, Product.is_active == True),
+    'product detail': select(Product).where(Product.slug == 'tee', Product.is_active == True),
+    'product detail: related': select(Product).where(
+        Product.category_id == 1, Product.is_active == True, Product.id != 1).limit(4),
+    'product detail: variants': select(ProductVariant).where(ProductVariant.product_id == 1),
+    'product detail: in wishlist': select(WishlistItem).where(
+        WishlistItem.user_id == 1, WishlistItem.product_id == 1),
+    'cart': select(CartItem).where(CartItem.user_id == 1),
+    'cart count': select(func.sum(CartItem.quantity)).where(CartItem.user_id == 1),
+    'wishlist': select(WishlistItem).where(WishlistItem.user_id == 1).order_by(
+        WishlistItem.date_added.desc()),
+    'order history': select(Order).where(Order.user_id == 1).order_by(Order.date_created.desc()),
+    'order items': select(OrderItem).where(OrderItem.order_id.in_([1, 2, 3])),
+    'admin: recent orders': select(Order).order_by(Order.date_created.desc()).limit(10),
+    'admin: orders': select(Order).order_by(Order.date_created.desc()),
+    'admin: products': select(Product).order_by(Product.date_created.desc()),
+    'admin: pending orders': select(func.count(Order.id)).where(Order.status == 'pending'),
+}
+
+
+class PlanCheck:
+    """The plan SQLite chose for one checked query"""
+
+    def __init__(self, name, steps):
+        self.name = name
+        self.steps = steps
+
+    @property
+    def full_scans(self):
+        return [step for step in self.steps if _FULL_SCAN_RE.match(step)]
+
+    @property
+    def sorts(self):
+        return [step for step in self.steps if step.startswith(_TEMP_SORT)]
+
+    @property
+    def ok(self):
+        return not self.full_scans
+
+
+def explain(conn, statement):
+    """The detail column of EXPLAIN QUERY PLAN for a statement"""
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={'render_postcompile': True})
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + compiled.string, params).all()
+    return [row[-1] for row in rows]
+
+
+def verify_query_plans(engine, checks=None):
+    """PlanCheck for every query in `checks` (default PLAN_CHECKS); SQLite only"""
+    if engine.dialect.name != 'sqlite':
+        return []
+    with engine.connect() as conn:
+        return [PlanCheck(name, explain(conn, statement))
+                for name, statement in (checks or PLAN_CHECKS).items()]
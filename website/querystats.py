@@ -0,0 +1,207 @@
+"""
+Per-request SQL instrumentation.
+
+Every statement executed while handling a request is timed and fingerprinted
+(literals and IN-lists collapsed) through SQLAlchemy engine events. When the
+request finishes the totals are folded into per-endpoint statistics, repeated
+fingerprints are flagged as likely N+1 loads, and routes decorated with
+@query_budget(n) are checked against their budget. Over-budget requests are
+logged, and raise QueryBudgetExceeded when testing so regressions fail tests.
+"""
+
+import re
+import threading
+import time
+from collections import Counter
+
+from flask import g, has_request_context, current_app, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised (when testing) if a request issues more statements than its budget"""
+
+
+def query_budget(limit):
+    """Declare the maximum number of SQL statements a view may issue"""
+    def decorator(f):
+        f._query_budget = limit
+        return f
+    return decorator
+
+
+def fingerprint(statement):
+    """Normalise a SQL statement so repeats with different values compare equal"""
+    statement = _WHITESPACE_RE.sub(' ', statement).strip()
+    statement = _STRING_RE.sub('?', statement)
+    statement = _NUMBER_RE.sub('?', statement)
+    return _IN_LIST_RE.sub('(?)', statement)
+
+
+class RequestQueryLog:
+    """Statements recorded while handling a single request"""
+
+    def __init__(self):
+        self.fingerprints = Counter()
+        self.count = 0
+        self.duration = 0.0
+
+    def record(self, statement, duration):
+        self.fingerprints[fingerprint(statement)] += 1
+        self.count += 1
+        self.duration += duration
+
+    def repeated(self, threshold):
+        return {fp: n for fp, n in self.fingerprints.items() if n >= threshold}
+
+
+class EndpointStats:
+    """Running totals for one endpoint"""
+
+    def __init__(self):
+        self.requests = 0
+        self.statements = 0
+        self.db_time = 0.0
+        self.max_statements = 0
+        self.nplusone_requests = 0
+        self.over_budget_requests = 0
+        self.repeated = Counter()
+
+    def to_dict(self):
+        return {
+            'requests': self.requests,
+            'statements': self.statements,
+            'avg_statements': self.statements / self.requests if self.requests else 0,
+            'max_statements': self.max_statements,
+            'db_time_ms': round(self.db_time * 1000, 3),
+            'nplusone_requests': self.nplusone_requests,
+            'over_budget_requests': self.over_budget_requests,
+            'top_repeated': self.repeated.most_common(5),
+        }
+
+
+class QueryStats:
+    """Per-endpoint statistics shared by all requests in this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.endpoints = {}
+
+    def add(self, endpoint, log, repeated, over_budget):
+        with self._lock:
+            stats = self.endpoints.setdefault(endpoint, EndpointStats())
+            stats.requests += 1
+            stats.statements += log.count
+            stats.db_time += log.duration
+            stats.max_statements = max(stats.max_statements, log.count)
+            if repeated:
+                stats.nplusone_requests += 1
+                stats.repeated.update(repeated)
+            if over_budget:
+                stats.over_budget_requests += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {endpoint: stats.to_dict() for endpoint, stats in sorted(self.endpoints.items())}
+
+    def reset(self):
+        with self._lock:
+            self.endpoints.clear()
+
+
+def current_query_log():
+    """The query log for the active request, or None outside a request"""
+    if not has_request_context():
+        return None
+    return g.get('_query_log')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get('query_start_time')
+    if not start_times:
+        return
+    duration = time.perf_counter() - start_times.pop()
+    log = current_query_log()
+    if log is not None:
+        log.record(statement, duration)
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute
+    if context.execution_context is None or context.connection is None:
+        return
+    start_times = context.connection.info.get('query_start_time')
+    if start_times:
+        start_times.pop()
+
+
+def _start_request():
+    if current_app.config['QUERY_STATS_ENABLED']:
+        g._query_log = RequestQueryLog()
+
+
+def _finish_request(response):
+    if g.get('_stream_state') is not None:
+        # The body runs its queries after this hook; see finish_streamed_request()
+        return response
+    return _record_request(response)
+
+
+def finish_streamed_request():
+    """Record a streamed response's queries once its body has been sent"""
+    g.pop('_stream_state', None)
+    _record_request(None)
+
+
+def _record_request(response):
+    log = g.pop('_query_log', None)
+    if log is None or request.endpoint is None:
+        return response
+
+    config = current_app.config
+    endpoint = request.endpoint
+    repeated = log.repeated(config['QUERY_NPLUSONE_THRESHOLD'])
+    view = current_app.view_functions.get(endpoint)
+    budget = getattr(view, '_query_budget', None)
+    over_budget = budget is not None and log.count > budget
+
+    current_app.extensions['query_stats'].add(endpoint, log, repeated, over_budget)
+
+    for statement, times in repeated.items():
+        current_app.logger.warning('Possible N+1 in %s: %d x %s', endpoint, times, statement)
+
+    # Headers of a streamed response are long gone
+    if response is not None and config['QUERY_STATS_HEADERS']:
+        response.headers['X-Query-Count'] = str(log.count)
+        response.headers['Server-Timing'] = 'db;dur={:.2f};desc="{} queries"'.format(log.duration * 1000, log.count)
+
+    if over_budget:
+        message = f'{endpoint} issued {log.count} SQL statements (budget {budget})'
+        if config['QUERY_BUDGET_STRICT'] or current_app.testing:
+            raise QueryBudgetExceeded(message)
+        current_app.logger.warning(message)
+
+    return response
+
+
+def init_query_stats(app):
+    """Hook statement timing into SQLAlchemy and the request lifecycle"""
+    app.extensions['query_stats'] = QueryStats()
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
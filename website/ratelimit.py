@@ -0,0 +1,256 @@
+"""
+Token-bucket rate limiting.
+
+A bucket holds up to `burst` tokens and refills at `rate` tokens per
+second; each attempt takes one. Attempts are allowed while tokens remain,
+so short bursts pass and sustained floods are held to the refill rate.
+Buckets are keyed by strings such as 'login-ip:1.2.3.4' and live in one of
+two stores, picked by RATE_LIMIT_STORAGE:
+
+- `memory://`: a bounded in-process LRU. Each worker process counts on
+  its own, so N workers let N times the limit through.
+- `sqlite:///ratelimit.db` (the default, relative to the instance folder):
+  one small SQLite file shared by every worker on the host. Each attempt is
+  a single upsert, so limits hold across processes.
+
+Views declare policies with @rate_limit(...) and blueprints with
+rate_limit_blueprint(...); a before_request hook checks them and answers
+with 429 and Retry-After once a bucket is empty.
+"""
+
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import request, session, jsonify
+from flask_login import current_user
+from werkzeug.exceptions import TooManyRequests
+
+log = logging.getLogger(__name__)
+
+
+class TokenBucketStore:
+    """Thread-safe token buckets, bounded by number of keys"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, burst, rate, now=None):
+        """
+        Take a token from `key`'s bucket.
+
+        Returns 0.0 when the attempt is allowed, otherwise the seconds until
+        a token will be available (nothing is taken in that case).
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = burst
+            else:
+                tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                self._buckets.move_to_end(key)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                wait = 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (1 - tokens) / rate
+            while len(self._buckets) > self.max_entries:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+# Upserts the bucket and takes a token in one statement. SET expressions
+# all see the old row, so `allowed` and `tokens` agree on the refill.
+_TAKE_SQL = """
+INSERT INTO token_bucket (key, tokens, stamp, allowed) VALUES (:key, :burst - 1, :now, 1)
+ON CONFLICT (key) DO UPDATE SET
+    tokens = min(:burst, tokens + max(:now - stamp, 0) * :rate)
+        - (min(:burst, tokens + max(:now - stamp, 0) * :rate) >= 1),
+    allowed = min(:burst, tokens + max(:now - stamp, 0) * :rate) >= 1,
+    stamp = max(:now, stamp)
+RETURNING tokens, allowed
+"""
+
+
+class SQLiteBucketStore:
+    """Token buckets in a SQLite file shared by every worker process on the host"""
+
+    # Takes between sweeps of buckets idle for longer than max_idle
+    PRUNE_EVERY = 4096
+
+    def __init__(self, path, max_idle, timeout=0.05):
+        self.path = path
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self._local = threading.local()
+        self._takes = 0
+
+    def _connection(self):
+        # One connection per thread, reopened after a fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                               check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=OFF')  # Losing buckets in a crash only resets limits
+        conn.execute('CREATE TABLE IF NOT EXISTS token_bucket ('
+                     'key TEXT PRIMARY KEY, tokens REAL NOT NULL, stamp REAL NOT NULL, '
+                     'allowed INTEGER NOT NULL) WITHOUT ROWID')
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def take(self, key, burst, rate, now=None):
+        """Same contract as TokenBucketStore.take(); fails open if the file stays locked"""
+        # Wall-clock time, because monotonic clocks aren't comparable across processes
+        now = time.time() if now is None else now
+        try:
+            conn = self._connection()
+            tokens, allowed = conn.execute(_TAKE_SQL, {
+                'key': key, 'burst': burst, 'rate': rate, 'now': now}).fetchone()
+            self._takes += 1
+            if self._takes % self.PRUNE_EVERY == 0:
+                conn.execute('DELETE FROM token_bucket WHERE stamp < ?', (now - self.max_idle,))
+        except sqlite3.Error:
+            log.warning('Rate limit store %s unavailable; allowing request', self.path, exc_info=True)
+            return 0.0
+        return 0.0 if allowed else (1 - tokens) / rate
+
+    def clear(self):
+        self._connection().execute('DELETE FROM token_bucket')
+
+
+def create_store(config, instance_path):
+    """The bucket store named by RATE_LIMIT_STORAGE"""
+    storage = config['RATE_LIMIT_STORAGE']
+    if storage == 'memory://':
+        return TokenBucketStore(config['RATE_LIMIT_MAX_KEYS'])
+    if storage.startswith('sqlite:///'):
+        path = os.path.join(instance_path, storage[len('sqlite:///'):])
+        return SQLiteBucketStore(path, config['RATE_LIMIT_MAX_IDLE'])
+    raise ValueError(f'Unsupported RATE_LIMIT_STORAGE: {storage!r}')
+
+
+def _ip_key(req):
+    return f'ip:{req.remote_addr}'
+
+
+def _session_key(req):
+    # A random id kept in the signed session cookie; clients that drop
+    # cookies get a new one, so pair session policies with an IP policy
+    key = session.get('_rate_key')
+    if key is None:
+        key = session['_rate_key'] = secrets.token_hex(8)
+    return f'session:{key}'
+
+
+def _user_key(req):
+    if current_user.is_authenticated:
+        return f'user:{current_user.get_id()}'
+    return _ip_key(req)
+
+
+KEY_FUNCTIONS = {'ip': _ip_key, 'session': _session_key, 'user': _user_key}
+
+
+class RatePolicy:
+    """`burst` attempts at once, refilled at `per_minute`, per IP, session or user"""
+
+    __slots__ = ('burst', 'rate', 'key', 'methods', 'scope', 'json')
+
+    def __init__(self, burst, per_minute, key='ip', methods=('POST',), scope=None, json=False):
+        if key not in KEY_FUNCTIONS:
+            raise ValueError(f'Unknown rate limit key: {key!r}')
+        self.burst = burst
+        self.rate = per_minute / 60.0
+        self.key = key
+        self.methods = frozenset(methods)
+        self.scope = scope
+        self.json = json
+
+    def bucket(self, req):
+        return f'{self.scope or req.endpoint}:{KEY_FUNCTIONS[self.key](req)}'
+
+
+def rate_limit(burst, per_minute, key='ip', methods=('POST',), scope=None, json=False):
+    """
+    Limit a view to `burst` attempts, refilled at `per_minute`, per `key`.
+
+    Views sharing a `scope` share buckets; json=True answers with a JSON
+    body instead of an HTML error page. Stack the decorator to apply
+    several policies.
+    """
+    policy = RatePolicy(burst, per_minute, key, methods, scope, json)
+
+    def decorator(f):
+        f._rate_limits = (policy,) + getattr(f, '_rate_limits', ())
+        return f
+    return decorator
+
+
+def rate_limit_blueprint(blueprint, burst, per_minute, key='ip', methods=('POST',), scope=None):
+    """Apply a policy to every route of the blueprint (on top of any per-view policies)"""
+    policy = RatePolicy(burst, per_minute, key, methods, scope or blueprint.name)
+    blueprint._rate_limits = getattr(blueprint, '_rate_limits', ()) + (policy,)
+    return blueprint
+
+
+def too_many_requests(policy, wait):
+    seconds = max(1, int(wait + 0.999))
+    message = f'Too many requests. Please try again in {seconds} seconds.'
+    if policy.json or request.is_json:
+        return jsonify({'success': False, 'message': message}), 429, {'Retry-After': str(seconds)}
+    raise TooManyRequests(message, retry_after=seconds)
+
+
+class RateLimiter:
+    """before_request hook checking the policies of each endpoint against a store"""
+
+    def __init__(self, app, store):
+        self.app = app
+        self.store = store
+        self._policies = {}
+
+    def policies(self, endpoint):
+        """The view's policies followed by its blueprint's, resolved once per endpoint"""
+        policies = self._policies.get(endpoint)
+        if policies is None:
+            policies = getattr(self.app.view_functions.get(endpoint), '_rate_limits', ())
+            blueprint = endpoint.rpartition('.')[0] if endpoint else ''
+            if blueprint:
+                policies += getattr(self.app.blueprints.get(blueprint), '_rate_limits', ())
+            self._policies[endpoint] = policies
+        return policies
+
+    def check(self):
+        if not self.app.config['RATE_LIMIT_ENABLED']:
+            return None
+        req = request._get_current_object()
+        for policy in self.policies(req.endpoint):
+            if req.method in policy.methods:
+                wait = self.store.take(policy.bucket(req), policy.burst, policy.rate)
+                if wait:
+                    return too_many_requests(policy, wait)
+        return None
+
+
+def init_rate_limits(app):
+    # The SQLite file is opened on the first limited request, not here
+    store = create_store(app.config, app.instance_path)
+    app.extensions['rate_limits'] = store
+    app.extensions['rate_limiter'] = limiter = RateLimiter(app, store)
+    app.before_request(limiter.check)
@@ -0,0 +1,57 @@
+"""
+Read/write session routing for read-only storefront traffic.
+
+Catalog pages only ever SELECT, but by default they share the engine (and
+its connection pool) with checkout and add-to-cart. Views marked with
+@read_only, or every route of a blueprint passed to read_only_blueprint(),
+have their queries routed to a separate `read_only` bind instead. That is
+a replica when READ_ONLY_DATABASE_URI / DATABASE_READ_URL is set, otherwise
+a second pool on the same SQLite file whose connections run with
+`PRAGMA query_only`. Under WAL those readers see the last committed data
+without waiting on the writer, and a busy checkout can't exhaust the pool
+the catalog draws from.
+
+Writing from a read-only view fails (SQLite raises `attempt to write a
+readonly database`); anything that writes must stay unmarked.
+"""
+
+from flask import g, current_app, request, has_request_context
+from flask_sqlalchemy.session import Session
+
+READ_ONLY_BIND = 'read_only'
+
+
+class RoutingSession(Session):
+    """Session that sends read-only requests to the read-only bind"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context() and g.get('_read_only'):
+            engine = self._db.engines.get(READ_ONLY_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_only(f):
+    """Route every query a view makes to the read-only bind"""
+    f._read_only = True
+    return f
+
+
+def _mark_read_only():
+    g._read_only = True
+
+
+def read_only_blueprint(blueprint):
+    """Route every query made by the blueprint's views to the read-only bind"""
+    blueprint.before_request(_mark_read_only)
+    return blueprint
+
+
+def _start_request():
+    view = current_app.view_functions.get(request.endpoint)
+    g._read_only = getattr(view, '_read_only', False)
+
+
+def init_read_only_routing(app):
+    app.before_request(_start_request)
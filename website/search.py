@@ -0,0 +1,149 @@
+"""
+Full-text product search backed by an SQLite FTS5 index.
+
+The `product_fts` virtual table mirrors the searchable text columns of
+`product` keyed by product id (the FTS rowid). Admin writes keep it in sync
+through index_product()/remove_product(), and storefront searches join
+against it to get ranked matches with highlighted snippets instead of
+running LIKE '%...%' over the whole product table.
+"""
+
+import re
+
+from markupsafe import Markup, escape
+from sqlalchemy import text, literal_column, func, table, column, false, bindparam
+
+from . import db
+from .models import Product
+
+FTS_TABLE = 'product_fts'
+SEARCH_COLUMNS = ('name', 'description', 'colorway', 'fabric_type', 'product_details')
+
+# bm25 weights in SEARCH_COLUMNS order: a hit in the name counts most
+RANK_WEIGHTS = (10.0, 4.0, 2.0, 2.0, 1.0)
+
+# Control characters can't appear in form text, so they are safe markers
+# for snippet() to wrap matches in before we HTML-escape the snippet.
+_MATCH_START = '\x02'
+_MATCH_END = '\x03'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+product_fts = table(FTS_TABLE, column('rowid'), column('rank'))
+
+
+def search_available():
+    """FTS5 is SQLite-only; other databases fall back to LIKE matching"""
+    return db.engine.dialect.name == 'sqlite'
+
+
+def ensure_search_index():
+    """Create the FTS table if needed and backfill it from existing products"""
+    if not search_available():
+        return
+    columns = ', '.join(SEARCH_COLUMNS)
+    db.session.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        f"{columns}, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    ))
+    weights = ', '.join(str(w) for w in RANK_WEIGHTS)
+    db.session.execute(text(
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', 'bm25({weights})')"
+    ))
+    indexed = db.session.execute(text(f"SELECT count(*) FROM {FTS_TABLE}")).scalar()
+    if not indexed and Product.query.count():
+        rebuild_search_index()
+    db.session.commit()
+
+
+def rebuild_search_index():
+    """Repopulate the whole index from the product table"""
+    columns = ', '.join(SEARCH_COLUMNS)
+    db.session.execute(text(f"DELETE FROM {FTS_TABLE}"))
+    db.session.execute(text(
+        f"INSERT INTO {FTS_TABLE}(rowid, {columns}) SELECT id, {columns} FROM product"
+    ))
+
+
+def index_product(product):
+    """Add or refresh one product in the index (call before committing)"""
+    if not search_available():
+        return
+    remove_product(product.id)
+    params = {name: getattr(product, name) or '' for name in SEARCH_COLUMNS}
+    params['rowid'] = product.id
+    placeholders = ', '.join(f':{name}' for name in SEARCH_COLUMNS)
+    db.session.execute(text(
+        f"INSERT INTO {FTS_TABLE}(rowid, {', '.join(SEARCH_COLUMNS)}) VALUES (:rowid, {placeholders})"
+    ), params)
+
+
+def index_products(product_ids):
+    """Add newly inserted products to the index in one statement (call before committing)"""
+    if not search_available() or not product_ids:
+        return
+    columns = ', '.join(SEARCH_COLUMNS)
+    db.session.execute(text(
+        f"INSERT INTO {FTS_TABLE}(rowid, {columns}) SELECT id, {columns} FROM product WHERE id IN :ids"
+    ).bindparams(bindparam('ids', expanding=True)), {'ids': list(product_ids)})
+
+
+def remove_products(product_ids):
+    """Drop several products from the index in one statement (call before committing)"""
+    if not search_available() or not product_ids:
+        return
+    db.session.execute(text(
+        f"DELETE FROM {FTS_TABLE} WHERE rowid IN :ids"
+    ).bindparams(bindparam('ids', expanding=True)), {'ids': list(product_ids)})
+
+
+def remove_product(product_id):
+    """Drop one product from the index (call before committing)"""
+    if not search_available():
+        return
+    db.session.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :rowid"), {'rowid': product_id})
+
+
+def build_match_expression(search):
+    """
+    Turn free-form shopper input into a safe FTS5 query.
+
+    Every word becomes a quoted prefix term, so FTS syntax characters in the
+    input can't produce query errors and partially typed words still match.
+    """
+    tokens = _TOKEN_RE.findall(search)
+    return ' '.join('"{}"*'.format(token) for token in tokens)
+
+
+def search_products(query, search):
+    """
+    Restrict a Product query to full-text matches for `search`.
+
+    Returns (query, rank_column, snippet_column). rank_column sorts best
+    matches first when ordered ascending; snippet_column should be added to
+    the query and passed through highlight() for display. If the input has
+    no searchable words the query matches nothing.
+    """
+    if not search_available():
+        # No ranking without FTS, so "relevance" degrades to name order
+        pattern = Product.name.contains(search) | Product.description.contains(search)
+        return query.filter(pattern), Product.name, literal_column("''")
+
+    match = build_match_expression(search)
+    if not match:
+        return query.filter(false()), Product.id, literal_column("''")
+
+    fts = literal_column(FTS_TABLE)
+    snippet = func.snippet(fts, -1, _MATCH_START, _MATCH_END, '…', 16)
+    query = query.join(product_fts, product_fts.c.rowid == Product.id)
+    query = query.filter(fts.op('MATCH')(match))
+    rank = product_fts.c.rank
+    return query, rank, snippet
+
+
+def highlight(snippet):
+    """HTML-escape an FTS snippet and wrap the matched terms in <mark>"""
+    if not snippet:
+        return None
+    escaped = str(escape(snippet))
+    return Markup(escaped.replace(_MATCH_START, '<mark>').replace(_MATCH_END, '</mark>'))
@@ -0,0 +1,91 @@
+"""
+Incrementally maintained totals for the admin dashboard.
+
+Instead of four COUNT(*) scans per dashboard load, the totals live in one
+StoreStats row that the code paths creating or removing users, products
+and orders adjust in their own transaction (`total = total + 1`, so
+concurrent writers never lose an update). reconcile() recounts from the
+source tables to correct any drift from writes made outside the app; run
+it periodically with `python reconcile_stats.py` or from the dashboard.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import select, update, func
+
+from . import db
+from .models import StoreStats, Product, Order, User
+
+STATS_ID = 1
+COUNTERS = ('total_products', 'total_orders', 'total_users', 'pending_orders')
+
+
+def _true_counts():
+    """Scalar subqueries that count each total from its source table"""
+    return {
+        'total_products': select(func.count(Product.id)).scalar_subquery(),
+        'total_orders': select(func.count(Order.id)).scalar_subquery(),
+        'total_users': select(func.count(User.id)).scalar_subquery(),
+        'pending_orders': select(func.count(Order.id)).where(Order.status == 'pending').scalar_subquery(),
+    }
+
+
+def adjust(**deltas):
+    """
+    Add deltas to the stored totals, e.g. adjust(total_orders=1).
+
+    Runs in the caller's transaction, so the totals commit (or roll back)
+    together with the change they count. The caller commits.
+    """
+    stats = StoreStats.__table__
+    values = {name: stats.c[name] + delta for name, delta in deltas.items() if delta}
+    if values:
+        db.session.execute(update(stats).where(stats.c.id == STATS_ID).values(**values))
+
+
+def order_status_changed(old_status, new_status):
+    """Keep pending_orders in step with an order's status change"""
+    if old_status == new_status:
+        return
+    if old_status == 'pending':
+        adjust(pending_orders=-1)
+    elif new_status == 'pending':
+        adjust(pending_orders=1)
+
+
+def reconcile():
+    """
+    Overwrite the stored totals with fresh counts and commit.
+
+    The counts are taken inside the UPDATE itself so no increment made by a
+    concurrent writer can slip in between counting and storing. Returns how
+    far each total had drifted.
+    """
+    row = get_stats(create=False)
+    before = {name: getattr(row, name) if row else 0 for name in COUNTERS}
+    stats = StoreStats.__table__
+    values = dict(_true_counts(), date_reconciled=datetime.utcnow())
+    updated = db.session.execute(update(stats).where(stats.c.id == STATS_ID).values(**values)).rowcount
+    if not updated:
+        counts = db.session.execute(select(*(
+            column.label(name) for name, column in _true_counts().items()
+        ))).one()
+        db.session.add(StoreStats(id=STATS_ID, date_reconciled=values['date_reconciled'], **counts._asdict()))
+    db.session.commit()
+
+    row = get_stats(create=False)
+    return {name: getattr(row, name) - before[name] for name in COUNTERS}
+
+
+def get_stats(create=True):
+    """The dashboard totals row, creating it from a full count if missing"""
+    stats = db.session.get(StoreStats, STATS_ID, populate_existing=True)
+    if stats is None and create:
+        reconcile()
+        stats = db.session.get(StoreStats, STATS_ID)
+    return stats
+
+
+def ensure_store_stats():
+    """Create the totals row on first start so requests never have to"""
+    get_stats()
@@ -0,0 +1,151 @@
+"""
+Streaming template rendering for long listing pages.
+
+render_template() builds the whole page in memory before the first byte is
+sent, so time-to-first-byte and memory per request grow with the number of
+rows. stream_template() renders with Jinja's generate() instead, so output
+leaves while the template is still running. Three things decide when a
+chunk goes out:
+- `{{ stream_flush() }}` in base.html sends the head and nav before the
+  view's queries run
+- a RowStream sends whatever has been rendered each time it fetches its
+  next chunk of STREAM_QUERY_CHUNK rows (yield_per)
+- otherwise output is sent in STREAM_CHUNK_BYTES pieces
+
+When the client accepts gzip, chunks are compressed incrementally with a
+sync flush after each one, so compression never holds output back.
+
+The request context stays open until the body has been sent, so templates
+can use url_for, current_user and lazy loads as usual. The session cookie,
+however, is saved before the body is generated, so templates must not
+change the session: flashed messages are popped up front and passed in as
+`flashed_messages`. Query statistics and budgets are checked after the
+last chunk (see querystats.py). A failure mid-stream can't change the
+status code any more; the client sees a truncated page and the error is
+logged.
+"""
+
+import zlib
+from itertools import islice
+
+from flask import current_app, g, request, render_template, stream_with_context, get_flashed_messages, Response
+from markupsafe import Markup
+
+from .querystats import finish_streamed_request
+
+# Never appears in rendered output; split out by _coalesce()
+FLUSH_MARKER = '\x00stream-flush\x00'
+
+
+def stream_flush():
+    """Template global: send everything rendered so far (a no-op unless streaming)"""
+    return Markup(FLUSH_MARKER) if g.get('_stream_state') is not None else ''
+
+
+def request_flush():
+    state = g.get('_stream_state')
+    if state is not None:
+        state['flush'] = True
+
+
+class RowStream:
+    """
+    Query results fetched `chunk_size` rows at a time as a template iterates.
+
+    Truthy when there is at least one row (which costs the first fetch), so
+    `{% if rows %}` works. Can be iterated once.
+    """
+
+    def __init__(self, query, chunk_size=None):
+        self.query = query
+        self.chunk_size = chunk_size
+        self._rows = None
+        self._head = []
+
+    def _fetch(self):
+        chunk_size = self.chunk_size or current_app.config['STREAM_QUERY_CHUNK']
+        for i, row in enumerate(self.query.yield_per(chunk_size)):
+            if i % chunk_size == 0:
+                request_flush()  # A chunk just arrived: send what's rendered before the rows
+            yield row
+
+    def _start(self):
+        if self._rows is None:
+            self._rows = self._fetch()
+            self._head = list(islice(self._rows, 1))
+
+    def __bool__(self):
+        self._start()
+        return bool(self._head)
+
+    def __iter__(self):
+        self._start()
+        head, self._head = self._head, []
+        yield from head
+        yield from self._rows
+
+
+def _coalesce(events, state, chunk_bytes):
+    """Join Jinja's many small output events into chunks worth a write"""
+    buffer = []
+    size = 0
+    for text in events:
+        if FLUSH_MARKER in text:
+            *parts, text = text.split(FLUSH_MARKER)
+            buffer.extend(parts)
+            state['flush'] = True
+        if state['flush'] or size + len(text) >= chunk_bytes:
+            buffer.append(text)
+            chunk = ''.join(buffer)
+            buffer, size = [], 0
+            state['flush'] = False
+            if chunk:
+                yield chunk
+        else:
+            buffer.append(text)
+            size += len(text)
+    if buffer:
+        yield ''.join(buffer)
+
+
+def gzip_chunks(chunks, level):
+    """gzip a stream of text, flushing the compressor after every chunk"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8')) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_template(template_name, **context):
+    """A Response that renders `template_name` as it is sent (render_template when streaming is off)"""
+    app = current_app._get_current_object()
+    config = app.config
+    if not config['STREAMING_ENABLED']:
+        return Response(render_template(template_name, **context), mimetype='text/html')
+
+    template = app.jinja_env.get_or_select_template(template_name)
+    # The session cookie is saved before the body is generated, so anything
+    # that changes the session (popping flashes) must happen now
+    context.setdefault('flashed_messages', get_flashed_messages(with_categories=True))
+    app.update_template_context(context)
+    state = g._stream_state = {'flush': False}
+    compress = config['STREAM_GZIP'] and request.accept_encodings['gzip']
+
+    def generate():
+        chunks = _coalesce(template.generate(context), state, config['STREAM_CHUNK_BYTES'])
+        if compress:
+            chunks = gzip_chunks(chunks, config['STREAM_GZIP_LEVEL'])
+        yield from chunks
+        finish_streamed_request()
+
+    response = Response(stream_with_context(generate()), mimetype='text/html')
+    if compress:
+        response.content_encoding = 'gzip'
+        response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_streaming(app):
+    app.add_template_global(stream_flush)
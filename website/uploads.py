@@ -0,0 +1,301 @@
+"""
+Product image uploads and their resized derivatives.
+
+Uploaded originals are stored in UPLOAD_FOLDER under their content hash
+(`<sha256 prefix>.<ext>`), so re-uploading the same file is free and every
+URL can be cached forever. Resizing is CPU-heavy, so it never runs on the
+request thread. The upload returns as soon as the original is on disk, and
+a background pool writes one derivative per IMAGE_SIZES entry. Each
+derivative is written as a JPEG (PNG when the image has transparency) and,
+where Pillow supports it, as a WebP.
+
+A `<hash>.json` marker is written last. Until it exists, templates keep
+serving the original. Writing it also bumps date_updated on the products
+that use the image, so page caches and ETags in every worker pick up the
+smaller URLs.
+
+Pillow is optional: without it, image fields still accept URLs, but
+uploads are refused.
+
+Derivatives missing after a crash are rebuilt with:
+
+    flask --app main build-images
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import update, select, or_
+
+from . import db
+from .models import Product, ProductImage
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # Pillow is optional; see requirements.txt
+    Image = None
+
+log = logging.getLogger(__name__)
+
+# Pillow format -> stored extension
+FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp', 'GIF': 'gif'}
+
+_NAME_RE = re.compile(r'^([0-9a-f]{32})\.(?:jpg|png|webp|gif)$')
+
+
+class UploadError(ValueError):
+    """Raised for files that can't be accepted as product images"""
+
+
+class ImageVariants:
+    """URLs and pixel size of one derivative size, for a <picture> element"""
+
+    __slots__ = ('src', 'srcset', 'webp', 'webp_srcset', 'width', 'height')
+
+    def __init__(self, src, srcset, webp, webp_srcset, width, height):
+        self.src = src
+        self.srcset = srcset
+        self.webp = webp
+        self.webp_srcset = webp_srcset
+        self.width = width
+        self.height = height
+
+
+class ImageStore:
+    """Content-hashed originals plus derivatives built on a background pool"""
+
+    def __init__(self, app, folder, url_prefix):
+        self.app = app
+        self.folder = folder
+        self.url_prefix = url_prefix
+        self.sizes = app.config['IMAGE_SIZES']
+        self.quality = app.config['IMAGE_QUALITY']
+        self.max_bytes = app.config['IMAGE_MAX_BYTES']
+        self.max_pixels = app.config['IMAGE_MAX_PIXELS']
+        self._executor = ThreadPoolExecutor(max_workers=app.config['IMAGE_WORKERS'],
+                                            thread_name_prefix='image-derivatives')
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._markers = {}
+
+    def _path(self, name):
+        return os.path.join(self.folder, name)
+
+    def save(self, upload):
+        """
+        Store an uploaded FileStorage and queue its derivatives.
+
+        Returns (url, width, height) of the original.
+        """
+        if Image is None:
+            raise UploadError('Image uploads need Pillow (pip install Pillow).')
+        data = upload.stream.read(self.max_bytes + 1)
+        if len(data) > self.max_bytes:
+            raise UploadError(f'Images must be under {self.max_bytes // (1024 * 1024)} MB.')
+        try:
+            # Only reads the header; the full decode happens on the pool
+            with Image.open(io.BytesIO(data)) as image:
+                fmt, (width, height) = image.format, image.size
+        except (OSError, Image.DecompressionBombError):
+            raise UploadError(f'{upload.filename or "The file"} is not a supported image.') from None
+        if fmt not in FORMATS:
+            raise UploadError('Please upload a JPEG, PNG, WebP or GIF image.')
+        if width * height > self.max_pixels:
+            raise UploadError('That image has too many pixels.')
+
+        digest = hashlib.sha256(data).hexdigest()[:32]
+        name = f'{digest}.{FORMATS[fmt]}'
+        path = self._path(name)
+        if not os.path.exists(path):
+            os.makedirs(self.folder, exist_ok=True)
+            _write_atomic(path, data)
+        url = self.url_prefix + name
+        self.submit(digest, name, url)
+        return url, width, height
+
+    def submit(self, digest, name, url):
+        """Queue derivatives for an original unless they exist or are queued"""
+        with self._lock:
+            if digest in self._pending or os.path.exists(self._path(f'{digest}.json')):
+                return self._pending.get(digest)
+            future = self._pending[digest] = self._executor.submit(self._build, digest, name, url)
+        future.add_done_callback(lambda _: self._forget(digest))
+        return future
+
+    def _forget(self, digest):
+        with self._lock:
+            self._pending.pop(digest, None)
+
+    def _build(self, digest, name, url):
+        try:
+            marker = build_derivatives(self._path(name), self.folder, digest, self.sizes, self.quality)
+        except Exception as e:
+            log.exception('Could not build derivatives for %s', name)
+            marker = {'error': str(e)}
+        _write_atomic(self._path(f'{digest}.json'), json.dumps(marker).encode())
+        with self.app.app_context():
+            _touch_products(url)
+
+    def marker(self, digest):
+        """The derivative marker for an original, or None while it's being built"""
+        marker = self._markers.get(digest)
+        if marker is None:
+            try:
+                with open(self._path(f'{digest}.json')) as f:
+                    marker = json.load(f)
+            except (OSError, ValueError):
+                return None
+            self._markers[digest] = marker  # Content-addressed, so never stale
+        return marker
+
+    def variants(self, url, size):
+        """ImageVariants for an uploaded image's `size`, or None to use `url` as is"""
+        if not url or not url.startswith(self.url_prefix):
+            return None
+        match = _NAME_RE.match(url[len(self.url_prefix):])
+        if match is None:
+            return None
+        digest = match.group(1)
+        marker = self.marker(digest)
+        if marker is None or 'error' in marker or size not in marker['sizes']:
+            return None
+
+        names = list(marker['sizes'])
+        larger = names[names.index(size) + 1] if names.index(size) + 1 < len(names) else None
+        width, height = marker['sizes'][size]
+        if larger and marker['sizes'][larger][0] <= width:
+            larger = None  # The original wasn't big enough for a sharper 2x
+
+        def url_for(name, ext):
+            return f'{self.url_prefix}{digest}-{name}.{ext}'
+
+        def srcset(ext):
+            if larger is None:
+                return url_for(size, ext)
+            return f'{url_for(size, ext)} 1x, {url_for(larger, ext)} 2x'
+
+        fallback = marker['format']
+        webp = marker.get('webp')
+        return ImageVariants(
+            url_for(size, fallback), srcset(fallback),
+            url_for(size, 'webp') if webp else None, srcset('webp') if webp else None,
+            width, height,
+        )
+
+    def originals(self):
+        """(digest, name) of every stored original"""
+        if not os.path.isdir(self.folder):
+            return []
+        return [(m.group(1), m.group(0)) for m in map(_NAME_RE.match, sorted(os.listdir(self.folder))) if m]
+
+
+def build_derivatives(path, folder, digest, sizes, quality):
+    """Write every size of one original and return its marker"""
+    with Image.open(path) as image:
+        largest = max(sizes.values())
+        image.draft('RGB', (largest, largest * 4))  # JPEG: decode at a reduced scale when possible
+        image = ImageOps.exif_transpose(image)
+        alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        image = image.convert('RGBA' if alpha else 'RGB')
+    fallback = 'png' if alpha else 'jpg'
+    webp = features.check('webp')
+
+    marker = {'format': fallback, 'webp': webp, 'sizes': {}}
+    # Largest first, each resized from the previous one
+    current = image
+    for name, width in sorted(sizes.items(), key=lambda item: -item[1]):
+        if current.width > width:
+            current = current.resize((width, max(1, round(current.height * width / current.width))),
+                                     Image.LANCZOS)
+        _save_image(current, os.path.join(folder, f'{digest}-{name}.{fallback}'), quality)
+        if webp:
+            _save_image(current, os.path.join(folder, f'{digest}-{name}.webp'), quality)
+        marker['sizes'][name] = current.size
+    # Smallest first, which is the order variants() steps up through for 2x
+    marker['sizes'] = {name: marker['sizes'][name] for name in sorted(sizes, key=sizes.get)}
+    return marker
+
+
+def _save_image(image, path, quality):
+    buffer = io.BytesIO()
+    ext = path.rsplit('.', 1)[1]
+    if ext == 'jpg':
+        image.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    elif ext == 'png':
+        image.save(buffer, 'PNG', optimize=True)
+    else:
+        image.save(buffer, 'WEBP', quality=quality, method=4)
+    _write_atomic(path, buffer.getvalue())
+
+
+def _write_atomic(path, data):
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _touch_products(url):
+    """Bump the pages showing an image so cached HTML switches to the derivatives"""
+    try:
+        db.session.execute(update(Product).where(or_(
+            Product.image_url == url,
+            Product.id.in_(select(ProductImage.product_id).where(ProductImage.url == url))
+        )).values(date_updated=datetime.utcnow()))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        log.exception('Could not refresh products using %s', url)
+
+
+def init_uploads(app):
+    folder = app.config['UPLOAD_FOLDER']
+    if not os.path.isabs(folder):
+        folder = os.path.join(os.path.dirname(app.root_path), folder)
+    relative = os.path.relpath(folder, app.static_folder).replace(os.sep, '/')
+    if relative.startswith('..'):
+        raise ValueError('UPLOAD_FOLDER must be inside the static folder')
+    # Pool threads start on the first upload, so this costs nothing at boot
+    store = ImageStore(app, folder, f'{app.static_url_path}/{relative}/')
+    app.extensions['uploads'] = store
+    app.add_template_global(store.variants, 'image_variants')
+    app.cli.add_command(build_images_command)
+
+
+def save_upload(upload):
+    return current_app.extensions['uploads'].save(upload)
+
+
+def form_uploads(files, fields):
+    """
+    Save the non-empty file inputs among `fields`.
+
+    Returns {field: (url, width, height)}; raises UploadError.
+    """
+    saved = {}
+    for field in fields:
+        upload = files.get(field)
+        if upload and upload.filename:
+            saved[field] = save_upload(upload)
+    return saved
+
+
+@click.command('build-images')
+@with_appcontext
+def build_images_command():
+    """Build missing derivatives for every uploaded product image."""
+    store = current_app.extensions['uploads']
+    futures = [store.submit(digest, name, store.url_prefix + name) for digest, name in store.originals()]
+    futures = [future for future in futures if future is not None]
+    wait(futures)
+    click.echo(f'OK: Built derivatives for {len(futures)} images')
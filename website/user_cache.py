@@ -0,0 +1,161 @@
+"""
+Per-process cache of logged-in user snapshots for Flask-Login.
+
+load_user runs on every authenticated request, but almost every page only
+needs the visitor's id, name, email and admin flag. Those are cached as
+UserSnapshot objects in a bounded LRU with a TTL, so most requests don't
+touch the user table at all. When a view needs anything else (relationships,
+the password hash) the snapshot loads the full User row for that request.
+
+Changes to the cached columns made through the ORM (a promotion by
+create_admin.py, an edit, a delete) drop the entry here and bump the `users`
+generation in cache_version. Every worker checks that generation at most
+every USER_CACHE_CHECK_INTERVAL seconds and starts over when it has moved.
+The TTL bounds how stale a snapshot can get after a write made outside the
+ORM.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, has_app_context
+from flask_login import UserMixin
+from sqlalchemy import event, inspect, select, update, insert, func
+
+from . import db
+from .models import User, CacheVersion
+
+CACHE_KEY = 'users'
+SNAPSHOT_COLUMNS = ('id', 'email', 'first_name', 'last_name', 'is_admin')
+
+
+class UserSnapshot(UserMixin):
+    """The columns every page needs; anything else is read from the User row"""
+
+    __slots__ = SNAPSHOT_COLUMNS
+
+    def __init__(self, row):
+        for name in SNAPSHOT_COLUMNS:
+            setattr(self, name, getattr(row, name))
+
+    @property
+    def record(self):
+        """The full User instance, loaded once per request by the session"""
+        return db.session.get(User, self.id)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.record, name)
+
+
+class UserCache:
+    """Thread-safe LRU of UserSnapshots with a TTL and a shared generation"""
+
+    def __init__(self, max_entries, ttl, check_interval):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = None
+        self._checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            due = now - self._checked_at >= self.check_interval
+            if entry is not None and now - entry[1] < self.ttl and not due:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # The shared generation rides along with the row, so a miss or a due
+        # check costs one query either way
+        generation = select(CacheVersion.version).where(CacheVersion.key == CACHE_KEY).scalar_subquery()
+        row = db.session.query(
+            *(getattr(User, name) for name in SNAPSHOT_COLUMNS),
+            func.coalesce(generation, 0).label('generation')
+        ).filter(User.id == user_id).first()
+        if row is None:
+            return None
+        snapshot = UserSnapshot(row)
+        with self._lock:
+            if row.generation != self._generation:
+                self._entries.clear()
+                self._generation = row.generation
+            self._checked_at = now
+            self._entries[user_id] = (snapshot, now)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return snapshot
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._checked_at = 0.0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+def init_user_cache(app):
+    app.extensions['user_cache'] = UserCache(
+        app.config['USER_CACHE_MAX_ENTRIES'],
+        app.config['USER_CACHE_TTL'],
+        app.config['USER_CACHE_CHECK_INTERVAL'],
+    )
+
+
+def load_user_snapshot(user_id):
+    """Flask-Login user for an id: a cached snapshot, or the User row when caching is off"""
+    if not current_app.config['USER_CACHE_ENABLED']:
+        return db.session.get(User, user_id)
+    return current_app.extensions['user_cache'].get(user_id)
+
+
+def _bump_generation(connection):
+    # Runs inside the flush, so it commits or rolls back with the user change
+    versions = CacheVersion.__table__
+    updated = connection.execute(update(versions).where(versions.c.key == CACHE_KEY).values(
+        version=versions.c.version + 1)).rowcount
+    if not updated:
+        connection.execute(insert(versions).values(key=CACHE_KEY, version=1))
+
+
+def _forget(connection, user):
+    _bump_generation(connection)
+    if has_app_context() and 'user_cache' in current_app.extensions:
+        current_app.extensions['user_cache'].invalidate(user.id)
+
+
+def _user_updated(mapper, connection, user):
+    state = inspect(user)
+    if any(state.attrs[name].history.has_changes() for name in SNAPSHOT_COLUMNS):
+        _forget(connection, user)
+
+
+def _user_deleted(mapper, connection, user):
+    _forget(connection, user)
+
+
+event.listen(User, 'after_update', _user_updated)
+event.listen(User, 'after_delete', _user_deleted)
@@ -1,13 +1,32 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, session
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, session, current_app, abort
 from flask_login import login_required, current_user
 from . import db
-from .models import Product, Category, CartItem, Order, OrderItem, ProductVariant, Waitlist, WishlistItem
-from datetime import datetime
-import uuid
-import json
+from .models import Product, CartItem, Order, OrderItem, Waitlist, WishlistItem
+from .pagination import paginate_products, keyset_paginate
+from .search import search_products, highlight
+from .querystats import query_budget
+from .routing import read_only
+from .ratelimit import rate_limit, rate_limit_blueprint
+from .category_cache import get_category_tree
+from .page_cache import cached_fragment, product_version
+from .http_cache import Validators
+from .streaming import stream_template
+from .images import listing_images
+from .checkout import place_order, CheckoutError
+from .cart import add_cart_item, add_wishlist_item, cart_count
+from markupsafe import Markup
+from sqlalchemy.orm import joinedload, selectinload
+from functools import wraps
 
 views = Blueprint('views', __name__)
 
+# Every storefront POST, per user (per IP when logged out); the busiest
+# views add their own tighter policies below
+rate_limit_blueprint(views, burst=60, per_minute=120, key='user')
+
+# Marker left in fragments/product_detail.html for the per-user buttons
+PRODUCT_ACTIONS_SLOT = '<!--product-actions-->'
+
 def check_access():
     """Check if user has access to the site"""
     has_access = session.get('has_landing_access', False)
@@ -16,19 +35,34 @@ def check_access():
     return has_access
 
 @views.route('/')
+@query_budget(6)
+@read_only
 def home():
     # Check if user has access (either logged in as admin or has entered access code)
     if not check_access():
         return redirect(url_for('views.landing'))
     
-    featured_products = Product.query.filter_by(is_featured=True, is_active=True).limit(8).all()
-    categories = Category.query.all()
-    return render_template('home.html', 
-                         featured_products=featured_products, 
-                         categories=categories,
-                         user=current_user)
+    tree = get_category_tree()
+    featured_version = product_version(Product.is_featured == True, Product.is_active == True)
+    
+    validators = Validators(featured_version[0], featured_version, tree.generation)
+    if validators.is_fresh():
+        return validators.not_modified()
+    
+    # Everything below the nav is the same for every visitor, so it is rendered
+    # once per catalog version and served from the fragment cache
+    def render():
+        featured_products = Product.query.filter_by(is_featured=True, is_active=True).limit(8).all()
+        return render_template('fragments/home.html',
+                             featured_products=featured_products,
+                             secondary_images=listing_images([p.id for p in featured_products]),
+                             categories=tree.categories)
+    
+    content = cached_fragment(('views.home', featured_version, tree.generation), render)
+    return validators.apply(render_template('home.html', content=content, user=current_user))
 
 @views.route('/landing', methods=['GET', 'POST'])
+@rate_limit(burst=10, per_minute=5)
 def landing():
     from . import LANDING_ACCESS_CODE
     
@@ -44,6 +78,8 @@ def landing():
     return render_template('landing.html', user=current_user)
 
 @views.route('/join-waitlist', methods=['POST'])
+@rate_limit(burst=5, per_minute=2, json=True)
+@rate_limit(burst=3, per_minute=1, key='session', json=True)
 def join_waitlist():
     try:
         name = request.form.get('name', '').strip()
@@ -86,61 +122,68 @@ def check_access():
     return has_access
 
 @views.route('/products')
+@query_budget(6)
+@read_only
 def products():
     if not check_access():
         return redirect(url_for('views.landing'))
     
     category_id = request.args.get('category', type=int)
     search = request.args.get('search', '')
-    sort = request.args.get('sort', 'newest')  # newest, price_low, price_high, name
+    # newest, price_low, price_high, name (plus relevance when searching)
+    sort = request.args.get('sort', 'relevance' if search else 'newest')
     
-    query = Product.query.filter_by(is_active=True)
+    criteria = [Product.is_active == True]
     
     if category_id:
-        query = query.filter_by(category_id=category_id)
-    
-    if search:
-        query = query.filter(Product.name.contains(search) | Product.description.contains(search))
-    
-    # Sorting
-    if sort == 'price_low':
-        query = query.order_by(Product.price.asc())
-    elif sort == 'price_high':
-        query = query.order_by(Product.price.desc())
-    elif sort == 'name':
-        query = query.order_by(Product.name.asc())
-    else:  # newest
-        query = query.order_by(Product.date_created.desc())
-    
-    products = query.all()
-    categories = Category.query.all()
-    
-    return render_template('products.html', 
-                         products=products, 
-                         categories=categories,
+        criteria.append(Product.category_id == category_id)
+    
+    query = Product.query.filter(*criteria)
+    
+    # Answer repeat visits with 304 before running the listing query. Built
+    # before stream_template(), which pops the flashes Validators looks at
+    tree = get_category_tree()
+    catalog_version = product_version(*criteria)
+    validators = Validators(catalog_version[0], catalog_version, tree.generation)
+    if validators.is_fresh():
+        return validators.not_modified()
+    
+    per_page = request.args.get('per_page', current_app.config['PRODUCTS_PER_PAGE'], type=int)
+    per_page = max(1, min(per_page, current_app.config['PRODUCTS_MAX_PER_PAGE']))
+    cursor = request.args.get('cursor')
+    
+    # Called from the template once the header and filters have been sent
+    def load_listing():
+        snippets = {}
+        if search:
+            matches, rank, snippet = search_products(query, search)
+            matches = matches.add_columns(snippet)
+            if sort == 'relevance':
+                page = keyset_paginate(matches, rank, cursor=cursor, per_page=per_page)
+            else:
+                page = paginate_products(matches, sort, cursor=cursor, per_page=per_page)
+            snippets = {product.id: highlight(text) for product, text in page.rows}
+        else:
+            page = paginate_products(query, sort, cursor=cursor, per_page=per_page)
+        return page.items, page, snippets, listing_images([p.id for p in page.items])
+    
+    return validators.apply(stream_template('products.html', 
+                         load_listing=load_listing,
+                         categories=tree.categories,
                          current_category=category_id,
                          search=search,
                          sort=sort,
-                         user=current_user)
+                         user=current_user))
 
 @views.route('/product/<slug>')
+@query_budget(6)
+@read_only
 def product_detail(slug):
     if not check_access():
         return redirect(url_for('views.landing'))
     
     product = Product.query.filter_by(slug=slug, is_active=True).first_or_404()
-    related_products = Product.query.filter_by(
-        category_id=product.category_id, 
-        is_active=True
-    ).filter(Product.id != product.id).limit(4).all()
-    
-    # Parse product images JSON
-    product_images = []
-    if product.images:
-        try:
-            product_images = json.loads(product.images)
-        except:
-            product_images = []
+    related_version = product_version(Product.category_id == product.category_id, Product.is_active == True)
     
     # Check if product is in user's wishlist
     in_wishlist = False
@@ -148,46 +191,62 @@ def product_detail(slug):
         wishlist_item = WishlistItem.query.filter_by(user_id=current_user.id, product_id=product.id).first()
         in_wishlist = wishlist_item is not None
     
-    return render_template('product_detail.html', 
+    # related_version covers this product too, so its timestamp is the page's
+    validators = Validators(
+        related_version[0],
+        product.date_updated, product.inventory, related_version, in_wishlist
+    )
+    if validators.is_fresh():
+        return validators.not_modified()
+    
+    def render():
+        related_products = Product.query.filter_by(
+            category_id=product.category_id, 
+            is_active=True
+        ).filter(Product.id != product.id).limit(4).all()
+        
+        return render_template('fragments/product_detail.html',
+                             product=product,
+                             related_products=related_products,
+                             product_images=product.gallery)
+    
+    key = ('views.product_detail', product.id, product.date_updated, product.inventory, related_version)
+    content = cached_fragment(key, render)
+    
+    # The cart/wishlist buttons depend on the visitor, so they are rendered per
+    # request and dropped into the placeholder left in the shared fragment
+    actions = render_template('fragments/product_actions.html',
+                            product=product,
+                            in_wishlist=in_wishlist,
+                            user=current_user)
+    content = content.replace(PRODUCT_ACTIONS_SLOT, Markup(actions))
+    
+    return validators.apply(render_template('product_detail.html', 
                          product=product, 
-                         related_products=related_products,
-                         product_images=product_images,
-                         in_wishlist=in_wishlist,
-                         user=current_user)
+                         content=content,
+                         user=current_user))
 
 @views.route('/cart')
 @login_required
+@query_budget(3)
 def cart():
-    cart_items = CartItem.query.filter_by(user_id=current_user.id).all()
-    total = sum(item.product.price * item.quantity for item in cart_items)
+    cart_items = CartItem.query.options(
+        joinedload(CartItem.product), joinedload(CartItem.variant)
+    ).filter_by(user_id=current_user.id).all()
+    total = sum(item.unit_price * item.quantity for item in cart_items)
     return render_template('cart.html', cart_items=cart_items, total=total, user=current_user)
 
 @views.route('/add-to-cart', methods=['POST'])
 @login_required
+@rate_limit(burst=30, per_minute=60, key='user', scope='cart')
 def add_to_cart():
-    product_id = request.form.get('product_id')
-    quantity = int(request.form.get('quantity', 1))
+    product_id = request.form.get('product_id', type=int)
+    quantity = max(1, request.form.get('quantity', 1, type=int))
     variant_id = request.form.get('variant_id', type=int)
     
-    product = Product.query.get_or_404(product_id)
-    
-    # Check if item already in cart
-    existing_item = CartItem.query.filter_by(
-        user_id=current_user.id,
-        product_id=product_id,
-        variant_id=variant_id
-    ).first()
-    
-    if existing_item:
-        existing_item.quantity += quantity
-    else:
-        cart_item = CartItem(
-            user_id=current_user.id,
-            product_id=product_id,
-            quantity=quantity,
-            variant_id=variant_id
-        )
-        db.session.add(cart_item)
+    # Insert or increment in one statement; None means no such active product
+    if add_cart_item(current_user.id, product_id, quantity, variant_id) is None:
+        abort(404)
     
     db.session.commit()
     flash('Item added to cart!', category='success')
@@ -229,61 +288,43 @@ def remove_from_cart(cart_item_id):
 
 @views.route('/checkout', methods=['GET', 'POST'])
 @login_required
+@rate_limit(burst=5, per_minute=6, key='user')
 def checkout():
-    cart_items = CartItem.query.filter_by(user_id=current_user.id).all()
-    
-    if not cart_items:
-        flash('Your cart is empty.', category='error')
-        return redirect(url_for('views.cart'))
-    
     if request.method == 'POST':
         shipping_address = request.form.get('shipping_address')
         billing_address = request.form.get('billing_address')
         payment_method = request.form.get('payment_method')
         
-        total_amount = sum(item.product.price * item.quantity for item in cart_items)
-        
-        # Create order
-        order_number = f"STAT-{uuid.uuid4().hex[:8].upper()}"
-        order = Order(
-            order_number=order_number,
-            user_id=current_user.id,
-            total_amount=total_amount,
-            shipping_address=shipping_address,
-            billing_address=billing_address,
-            payment_method=payment_method,
-            status='pending',
-            payment_status='pending'
-        )
-        db.session.add(order)
-        db.session.flush()
-        
-        # Create order items
-        for cart_item in cart_items:
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=cart_item.product_id,
-                quantity=cart_item.quantity,
-                price=cart_item.product.price,
-                variant_id=cart_item.variant_id
-            )
-            db.session.add(order_item)
-        
-        # Clear cart
-        for cart_item in cart_items:
-            db.session.delete(cart_item)
+        # Reserves stock and writes the order in one short transaction
+        try:
+            order = place_order(current_user.id, shipping_address, billing_address, payment_method)
+        except CheckoutError as e:
+            flash(str(e), category='error')
+            for failure in e.failures:
+                flash(failure.message, category='error')
+            return redirect(url_for('views.cart'))
         
-        db.session.commit()
-        flash(f'Order placed successfully! Order #: {order_number}', category='success')
+        flash(f'Order placed successfully! Order #: {order.order_number}', category='success')
         return redirect(url_for('views.order_confirmation', order_id=order.id))
     
-    total = sum(item.product.price * item.quantity for item in cart_items)
+    cart_items = CartItem.query.options(
+        joinedload(CartItem.product), joinedload(CartItem.variant)
+    ).filter_by(user_id=current_user.id).all()
+    
+    if not cart_items:
+        flash('Your cart is empty.', category='error')
+        return redirect(url_for('views.cart'))
+    
+    total = sum(item.unit_price * item.quantity for item in cart_items)
     return render_template('checkout.html', cart_items=cart_items, total=total, user=current_user)
 
 @views.route('/order/<int:order_id>')
 @login_required
+@query_budget(4)
 def order_confirmation(order_id):
-    order = Order.query.get_or_404(order_id)
+    order = Order.query.options(
+        selectinload(Order.items).joinedload(OrderItem.product)
+    ).get_or_404(order_id)
     
     if order.user_id != current_user.id:
         flash('Unauthorized access.', category='error')
@@ -293,45 +334,101 @@ def order_confirmation(order_id):
 
 @views.route('/orders')
 @login_required
+@query_budget(4)
 def orders():
-    user_orders = Order.query.filter_by(user_id=current_user.id).order_by(Order.date_created.desc()).all()
+    # One query for the orders, one for all of their items and products
+    user_orders = Order.query.options(
+        selectinload(Order.items).joinedload(OrderItem.product)
+    ).filter_by(user_id=current_user.id).order_by(Order.date_created.desc()).all()
     return render_template('orders.html', orders=user_orders, user=current_user)
 
 @views.route('/wishlist')
 @login_required
+@query_budget(3)
 def wishlist():
     if not check_access():
         flash('You need access to view the wishlist.', category='error')
         return redirect(url_for('views.landing'))
     
-    wishlist_items = WishlistItem.query.filter_by(user_id=current_user.id).order_by(WishlistItem.date_added.desc()).all()
+    wishlist_items = WishlistItem.query.options(
+        joinedload(WishlistItem.product)
+    ).filter_by(user_id=current_user.id).order_by(WishlistItem.date_added.desc()).all()
     return render_template('wishlist.html', wishlist_items=wishlist_items, user=current_user)
 
 @views.route('/add-to-wishlist', methods=['POST'])
 @login_required
+@rate_limit(burst=30, per_minute=60, key='user', scope='wishlist')
 def add_to_wishlist():
     if not check_access():
         flash('You need access to add items to wishlist.', category='error')
         return redirect(url_for('views.landing'))
     
-    product_id = request.form.get('product_id')
-    product = Product.query.get_or_404(product_id)
-    
-    # Check if already in wishlist
-    existing = WishlistItem.query.filter_by(user_id=current_user.id, product_id=product_id).first()
-    if existing:
+    product_id = request.form.get('product_id', type=int)
+    added = add_wishlist_item(current_user.id, product_id)
+    if added is None:
+        abort(404)
+    if not added:
         flash('Product is already in your wishlist!', category='info')
         return redirect(request.referrer or url_for('views.wishlist'))
     
-    wishlist_item = WishlistItem(
-        user_id=current_user.id,
-        product_id=product_id
-    )
-    db.session.add(wishlist_item)
     db.session.commit()
     flash('Added to wishlist!', category='success')
     return redirect(request.referrer or url_for('views.wishlist'))
 
+def api_login_required(f):
+    """Like login_required, but answers JSON callers with 401 instead of a redirect"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not current_user.is_authenticated:
+            return jsonify({'success': False, 'message': 'Please log in.'}), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
+def _json_int(data, key, default=None):
+    try:
+        return int(data.get(key, default))
+    except (TypeError, ValueError):
+        return default
+
+@views.route('/api/cart', methods=['POST'])
+@api_login_required
+@rate_limit(burst=30, per_minute=60, key='user', scope='cart', json=True)
+def api_add_to_cart():
+    """JSON add-to-cart so the front end can update without a page reload"""
+    data = request.get_json(silent=True) or request.form
+    product_id = _json_int(data, 'product_id')
+    quantity = max(1, _json_int(data, 'quantity', 1))
+    variant_id = _json_int(data, 'variant_id')
+    
+    line_quantity = add_cart_item(current_user.id, product_id, quantity, variant_id)
+    if line_quantity is None:
+        return jsonify({'success': False, 'message': 'Product not found.'}), 404
+    
+    db.session.commit()
+    return jsonify({
+        'success': True,
+        'message': 'Item added to cart!',
+        'quantity': line_quantity,
+        'cart_count': cart_count(current_user.id)
+    })
+
+@views.route('/api/wishlist', methods=['POST'])
+@api_login_required
+@rate_limit(burst=30, per_minute=60, key='user', scope='wishlist', json=True)
+def api_add_to_wishlist():
+    """JSON add-to-wishlist so the front end can update without a page reload"""
+    if not check_access():
+        return jsonify({'success': False, 'message': 'You need access to add items to wishlist.'}), 403
+    
+    data = request.get_json(silent=True) or request.form
+    added = add_wishlist_item(current_user.id, _json_int(data, 'product_id'))
+    if added is None:
+        return jsonify({'success': False, 'message': 'Product not found.'}), 404
+    
+    db.session.commit()
+    message = 'Added to wishlist!' if added else 'Product is already in your wishlist!'
+    return jsonify({'success': True, 'added': added, 'message': message})
+
 @views.route('/remove-from-wishlist/<int:wishlist_item_id>')
 @login_required
 def remove_from_wishlist(wishlist_item_id):